@@ -1,14 +1,42 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
-import psycopg2
-from datetime import datetime
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
 import logging
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from apscheduler.schedulers.background import BackgroundScheduler
 from config import config
+from services.rate_limiter import get_rate_limiter
+from services.http_client import get_http_session, get_http_stats
+from services.stats_cache import StatsCache
+from services.detail_cache import get_detail_cache
+from services import exporter
+from services.jobs import JobManager
+from services.alert_engine import AlertEngine, missing_alert_columns
+from services.response_cache import get_response_cache
+from services.price_events import format_sse, get_price_events, watch_product_changes
+from services.structured_logging import ProductTrace, configure_logging
+from services import metrics
+from scrapers import amazon_parser
+from services.comparator_refresh import refresh_all_comparator_prices
+from services.refresh_scheduler import (
+    RefreshPolicy, RefreshScheduler, load_engagement, load_last_refreshed, load_price_volatility
+)
+from database.mongodb import get_mongodb
+from database.postgres import get_postgres_pool, get_postgres_stats
+from database.write_batcher import WriteBatcher
+from database.price_history import (
+    PriceHistoryRecorder, get_price_history_store, expand_points, compact_price_history,
+    configured_storage, STORAGE_DOCUMENTS, STORAGE_TIMESERIES
+)
+from database.indexes import ensure_indexes, find_collection_scans
+from database.pagination import PaginationError, paginate, parse_fields, parse_limit
+from database.work_leases import WorkLeaseManager, utc_now
 
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -24,326 +52,828 @@ app.register_blueprint(products_bp, url_prefix='/api')
 
 # MongoDB
 try:
-    mongo_client = MongoClient(config.MONGO_URI)
-    mongo_db = mongo_client[config.MONGO_DB]
+    mongo_db = get_mongodb()
+    # Misma conexión; las lecturas de los endpoints de consulta pueden ir a secundarios
+    mongo_read_db = get_mongodb(read_only=True)
     logger.info("✅ Conectado a MongoDB")
 except Exception as e:
-    logger.error(f"❌ Error conectando a MongoDB: {e}")
+    logger.error("❌ Error conectando a MongoDB: %s", e)
     mongo_db = None
+    mongo_read_db = None
 
-# PostgreSQL
-def get_postgres_connection():
+# Caché de /stats, mantenida también por las escrituras de ingesta
+stats_cache = StatsCache(ttl=config.STATS_CACHE_TTL)
+
+# Caché de /products/<id>; las escrituras de ingesta la invalidan
+detail_cache = get_detail_cache()
+
+def track_write_result(collection, counts):
+    """Ajustar los contadores de /stats con el resultado de una escritura"""
+    if collection == 'products':
+        stats_cache.increment('total_products', counts.get('upserted', 0))
+    if 'seconds' in counts:
+        metrics.observe_stage('mongo_bulk_write', counts['seconds'])
+
+def count_price_point():
+    """Contar en /stats un punto de histórico ya escrito"""
+    stats_cache.increment('total_price_records')
+
+def history_writes(product_data):
+    """Escrituras del histórico como (colección, operación, on_success)
+
+    El punto nuevo se cuenta al confirmarse su escritura, no al encolarlo.
+    """
+    operations = price_history_recorder.build_writes(product_data)
+    return [
+        (collection, operation, count_price_point if operations.new_point and i == len(operations) - 1 else None)
+        for i, (collection, operation) in enumerate(operations)
+    ]
+
+# Histórico de precios (motor configurable: documents / buckets / timeseries)
+price_history_storage = configured_storage()
+price_history_recorder = None
+price_history_read_store = None
+if mongo_db is not None:
+    price_history_store = get_price_history_store(
+        mongo_db,
+        price_history_storage,
+        config.PRICE_HISTORY_BUCKET,
+        config.PRICE_HISTORY_BUCKET_MAX_POINTS
+    )
+    if price_history_storage == STORAGE_TIMESERIES:
+        try:
+            price_history_store.ensure_collection()
+        except Exception as e:
+            logger.error("❌ Error creando colección time-series: %s", e)
+    price_history_read_store = get_price_history_store(
+        mongo_read_db,
+        price_history_storage,
+        config.PRICE_HISTORY_BUCKET,
+        config.PRICE_HISTORY_BUCKET_MAX_POINTS
+    )
+    price_history_recorder = PriceHistoryRecorder(
+        mongo_db, mode=config.PRICE_HISTORY_MODE, store=price_history_store,
+        max_heads=config.PRICE_HISTORY_MAX_HEADS
+    )
+    logger.info("📈 Histórico de precios: storage=%s mode=%s", price_history_storage, config.PRICE_HISTORY_MODE)
+
+def bootstrap_indexes():
+    """Crear los índices que falten e informar de consultas sin índice"""
     try:
-        conn = psycopg2.connect(
-            host=config.POSTGRES_HOST,
-            port=config.POSTGRES_PORT,
-            database=config.POSTGRES_DB,
-            user=config.POSTGRES_USER,
-            password=config.POSTGRES_PASSWORD
-        )
-        return conn
+        ensure_indexes(mongo_db, price_history_storage)
+        scans = find_collection_scans(mongo_db, price_history_storage)
+        if scans:
+            logger.warning("⚠️ %s formas de consulta siguen haciendo COLLSCAN", len(scans))
     except Exception as e:
-        logger.error(f"❌ Error conectando a PostgreSQL: {e}")
-        return None
+        logger.error("❌ Error provisionando índices: %s", e)
+
+if mongo_db is not None and config.MONGO_ENSURE_INDEXES:
+    # En segundo plano para no retrasar el arranque del servicio
+    threading.Thread(target=bootstrap_indexes, name='index-bootstrap', daemon=True).start()
+
+# PostgreSQL (pool compartido)
+postgres_pool = get_postgres_pool()
+
+# Cambios de precio/stock difundidos a los clientes (SSE / long-poll)
+price_events = get_price_events()
+if mongo_db is not None and config.EVENTS_SOURCE == 'change_stream':
+    threading.Thread(
+        target=watch_product_changes, args=(mongo_db, price_events, threading.Event()),
+        name='products-change-stream', daemon=True
+    ).start()
+
+def prime_price_events(external_ids):
+    """Cargar en una consulta el precio/stock guardado de los productos aún no vistos"""
+    unknown = list(set(external_ids) - price_events.known('amazon', external_ids))
+    if not unknown:
+        return
+    cursor = mongo_db.products.find(
+        {'external_id': {'$in': unknown}},
+        {'external_id': 1, 'current_price': 1, 'stock_status': 1, '_id': 0}
+    )
+    price_events.prime('amazon', {
+        doc['external_id']: (doc.get('current_price'), doc.get('stock_status')) for doc in cursor
+    })
+
+# Alertas de precio/stock evaluadas al guardar cada producto
+def alerts_schema_ok():
+    """Comprobar que la tabla `alerts` es la del servicio analytics"""
+    try:
+        missing = missing_alert_columns(postgres_pool)
+    except Exception as e:
+        # PostgreSQL aún no disponible: el motor reintenta al recargar
+        logger.warning("⚠️ No se pudo comprobar el esquema de alertas: %s", e)
+        return True
+    if missing:
+        logger.warning("⚠️ Alertas desactivadas: a la tabla alerts le faltan las columnas %s", ', '.join(missing))
+        return False
+    return True
+
+alert_engine = None
+if config.ALERTS_ENABLED and mongo_db is not None and alerts_schema_ok():
+    alert_engine = AlertEngine(
+        postgres_pool, mongo_db,
+        refresh_seconds=config.ALERTS_REFRESH_SECONDS,
+        full_reload_seconds=config.ALERTS_FULL_RELOAD_SECONDS,
+        flush_size=config.ALERTS_FLUSH_SIZE
+    )
 
 # ===================================
 # SCRAPER DE PRODUCTOS CON RAPIDAPI
 # ===================================
 
+# Pool compartido de las consultas multi-país sueltas (API); los hilos se
+# crean bajo demanda y se reutilizan entre peticiones
+country_executor = ThreadPoolExecutor(max_workers=config.INGESTION_MAX_WORKERS, thread_name_prefix='country-fanout')
+
 class ProductScraper:
-    def __init__(self, rapidapi_key=None):
+    def __init__(self, rapidapi_key=None, max_workers=None, rate_limiter=None, session=None, countries=None,
+                 use_cache=True):
         self.rapidapi_key = rapidapi_key
-        self.rapidapi_url = "https://real-time-amazon-data.p.rapidapi.com/product-details"
+        # False en las peticiones explícitas de precios frescos: no se sirven
+        # respuestas de la caché de RapidAPI (las nuevas sí se guardan)
+        self.use_cache = use_cache
+        # El primero es el del documento principal de products; el resto se guarda en product_offers
+        self.countries = [amazon_parser.normalize_country(c) for c in (countries or config.INGESTION_COUNTRIES)]
+        self.session = session or get_http_session()
+        # Batcher de escrituras activo durante una ejecución masiva
+        self.write_batcher = None
+        # external_id -> momento de la llamada original de los servidos desde la caché
+        self.cached_at = {}
+        self.max_workers = max_workers or config.INGESTION_MAX_WORKERS
+        # Limitador compartido entre todas las instancias (scheduler + manual)
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.rapidapi_url = f"{config.RAPIDAPI_BASE_URL}/product-details"
         self.headers = {
             "x-rapidapi-key": self.rapidapi_key if self.rapidapi_key else "",
             "x-rapidapi-host": "real-time-amazon-data.p.rapidapi.com"
         }
     
-    def get_amazon_product(self, asin, country='ES'):
+    def get_amazon_product(self, asin, country='ES', trace=None):
         """Obtener datos reales de Amazon usando RapidAPI"""
+        trace = trace or ProductTrace(asin)
         try:
-            import requests
-            
             # Parámetros correctos para la API
             querystring = {
                 "asin": asin,
-                "country": country
+                "country": amazon_parser.api_country(country)
             }
             
-            logger.info(f"🔍 Obteniendo datos de Amazon API para: {asin}")
-            logger.info(f"🔑 API Key configurada: {'SÍ' if self.rapidapi_key else 'NO'}")
-            logger.info(f"🌐 URL: {self.rapidapi_url}")
-            logger.info(f"📋 Params: {querystring}")
+            logger.debug("🔍 Obteniendo datos de Amazon API para %s (%s)", asin, country)
             
-            response = requests.get(
-                self.rapidapi_url,
-                headers=self.headers,
-                params=querystring,
-                timeout=15
-            )
+            cache = get_response_cache()
+            if cache is not None and self.use_cache:
+                cached = cache.get(asin, country)
+                if cached is not None:
+                    # Respuesta reciente: se re-parsea sin gastar cuota. Es una
+                    # observación de `fetched_at`, no de ahora (ver update_product_in_db)
+                    payload, fetched_at = cached
+                    trace.set(cache='hit', cache_age_seconds=round(time.time() - fetched_at, 1))
+                    with trace.stage('parse'):
+                        product = self.parse_amazon_data(payload, asin, country)
+                    if product is not None:
+                        product['last_updated'] = product['cached_at'] = datetime.fromtimestamp(fetched_at)
+                    return product
             
-            logger.info(f"📊 Status code: {response.status_code}")
+            for attempt in range(config.RAPIDAPI_MAX_RETRIES + 1):
+                # El token-bucket sustituye a la espera fija entre productos
+                with trace.stage('rate_limit_wait'):
+                    self.rate_limiter.acquire()
+                
+                with trace.stage('fetch'):
+                    response = self.session.get(
+                        self.rapidapi_url,
+                        headers=self.headers,
+                        params=querystring,
+                        timeout=config.HTTP_TIMEOUT
+                    )
+                trace.set(status_code=response.status_code, attempts=attempt + 1)
+                metrics.RAPIDAPI_RESPONSES.labels(status=str(response.status_code)).inc()
+                
+                logger.debug("📊 Status code %s para %s", response.status_code, asin)
+                
+                if response.status_code == 429:
+                    # Límite alcanzado: frenar a todos los workers y reintentar
+                    retry_after = self._parse_retry_after(response)
+                    self.rate_limiter.on_throttled(retry_after)
+                    logger.warning(
+                        "⚠️ Error 429: Límite de requests alcanzado (intento %d/%d, nueva tasa %.2f req/s)",
+                        attempt + 1, config.RAPIDAPI_MAX_RETRIES + 1, self.rate_limiter.rate
+                    )
+                    continue
+                
+                if response.status_code == 200:
+                    self.rate_limiter.on_success()
+                    with trace.stage('parse'):
+                        data = response.json()
+                        product = self.parse_amazon_data(data, asin, country)
+                    if cache is not None and data.get('status') == 'OK':
+                        cache.put(asin, country, response.content)
+                    return product
+                elif response.status_code == 403:
+                    logger.error(
+                        "❌ Error 403 para %s: verifica que estés suscrito a la API en RapidAPI (API Key: %s): %s",
+                        asin, 'configurada' if self.rapidapi_key else 'NO CONFIGURADA', response.text[:200]
+                    )
+                    return None
+                else:
+                    logger.error("❌ Error API %s para %s: %s", response.status_code, asin, response.text[:500])
+                    return None
             
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"✅ Respuesta recibida de la API")
-                return self.parse_amazon_data(data, asin)
-            elif response.status_code == 403:
-                logger.error(f"❌ Error 403: {response.text}")
-                logger.error("⚠️ Verifica que estés suscrito a la API en RapidAPI")
-                logger.error(f"⚠️ API Key: {self.rapidapi_key[:20] if self.rapidapi_key else 'NO CONFIGURADA'}...")
-                return None
-            elif response.status_code == 429:
-                logger.error(f"❌ Error 429: Límite de requests alcanzado")
-                return None
-            else:
-                logger.error(f"❌ Error API: {response.status_code}")
-                logger.error(f"📄 Respuesta: {response.text[:500]}")
-                return None
+            logger.error("❌ Error 429: reintentos agotados para %s", asin)
+            return None
                 
-        except Exception as e:
-            logger.error(f"❌ Error obteniendo producto: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            metrics.RAPIDAPI_RESPONSES.labels(status='error').inc()
+            logger.exception("❌ Error obteniendo producto %s", asin)
             return None
     
-    def parse_amazon_data(self, data, asin):
-        """Parsear respuesta de la API de RapidAPI"""
-        try:
-            if 'data' not in data:
-                logger.error(f"❌ Respuesta sin campo 'data'")
-                logger.error(f"📄 Respuesta completa: {str(data)[:500]}")
-                return None
-            
-            product_data = data['data']
-            
-            # Obtener título
-            title = product_data.get('product_title', 'Sin título')
-            logger.info(f"📦 Producto: {title[:50]}...")
-            
-            # Extraer precio
-            price = None
-            price_str = product_data.get('product_price', '')
-            
-            if price_str:
-                try:
-                    # Limpiar precio: "59,99 €" -> 59.99
-                    price_clean = ''.join(c for c in str(price_str) if c.isdigit() or c in '.,')
-                    
-                    # Si tiene coma europea, convertir
-                    if ',' in price_clean and '.' in price_clean:
-                        # Formato europeo: 1.234,56 -> 1234.56
-                        price_clean = price_clean.replace('.', '').replace(',', '.')
-                    elif ',' in price_clean:
-                        # Solo coma: 59,99 -> 59.99
-                        price_clean = price_clean.replace(',', '.')
-                    
-                    price = float(price_clean)
-                    logger.info(f"💰 Precio: {price}€")
-                except Exception as e:
-                    logger.warning(f"⚠️ Error parseando precio '{price_str}': {e}")
+    def _fetch_country(self, asin, country):
+        """Consulta de un país con su propia traza (se integra luego en la del producto)"""
+        trace = ProductTrace(asin)
+        return self.get_amazon_product(asin, country, trace=trace), trace
+    
+    def get_amazon_product_multi(self, asin, countries, trace=None):
+        """Consultar un ASIN en varios países a la vez (bajo el rate limit compartido)
+
+        Para consultas sueltas (API); las ejecuciones masivas reparten los
+        pares (producto, país) en su propio pool. Devuelve {país: producto o None}.
+        """
+        countries = list(dict.fromkeys(amazon_parser.normalize_country(c) for c in countries))
+        futures = {country: country_executor.submit(self._fetch_country, asin, country) for country in countries}
+        offers = {}
+        for country, future in futures.items():
+            offers[country], country_trace = future.result()
+            if trace is not None:
+                trace.absorb(country_trace, country)
+        return offers
+    
+    @staticmethod
+    def offer_fields(product_data):
+        """Campos de product_offers a partir de un producto parseado"""
+        return {
+            'price': product_data.get('current_price'),
+            'currency': product_data.get('currency'),
+            'stock_status': product_data.get('stock_status'),
+            'title': product_data.get('title'),
+            'url': product_data.get('url'),
+            'last_updated': product_data.get('last_updated')
+        }
+    
+    def update_offers_in_db(self, asin, offers):
+        """Guardar la oferta de cada país en product_offers y su serie de price_history"""
+        if mongo_db is None:
+            return False
+        writes = []
+        for country, product_data in offers.items():
+            if product_data is None:
+                continue
+            writes.append(('product_offers', UpdateOne(
+                {'external_id': asin, 'country': country},
+                {'$set': self.offer_fields(product_data)},
+                upsert=True
+            ), None))
+            # La serie del país por defecto la escribe update_product_in_db
+            if (country != self.countries[0] and product_data.get('current_price')
+                    and product_data.get('cached_at') is None):
+                writes.extend(history_writes(product_data))
+        
+        batcher = self.write_batcher
+        for collection, operation, on_success in writes:
+            if batcher is not None:
+                batcher.add(collection, operation, key=asin, on_success=on_success)
             else:
-                logger.warning(f"⚠️ No se encontró precio en la respuesta")
-            
-            # Extraer rating
-            rating = None
-            rating_str = product_data.get('product_star_rating', '')
-            if rating_str:
-                try:
-                    # "4,5 de 5 estrellas" -> 4.5
-                    rating_num = str(rating_str).split()[0].replace(',', '.')
-                    rating = float(rating_num)
-                    logger.info(f"⭐ Rating: {rating}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Error parseando rating '{rating_str}': {e}")
-            
-            # Extraer número de reviews
-            review_count = 0
-            reviews_str = product_data.get('product_num_ratings', 0)
-            try:
-                # Limpiar y convertir: "12.450" -> 12450
-                review_clean = str(reviews_str).replace('.', '').replace(',', '')
-                review_count = int(review_clean) if review_clean.isdigit() else 0
-                logger.info(f"📝 Reviews: {review_count}")
-            except Exception as e:
-                logger.warning(f"⚠️ Error parseando reviews '{reviews_str}': {e}")
-            
-            # Extraer marca
-            brand = 'Amazon'
-            product_info = product_data.get('product_information', {})
-            if isinstance(product_info, dict):
-                brand = product_info.get('Brand', 'Amazon')
-            logger.info(f"🏷️ Marca: {brand}")
-            
-            # Disponibilidad
-            availability = product_data.get('product_availability', '')
-            in_stock = bool(availability and 'stock' in str(availability).lower())
-            logger.info(f"📦 Stock: {'En stock' if in_stock else 'No disponible'}")
-            
-            # Imagen
-            image_url = product_data.get('product_photo', '')
-            
-            parsed = {
-                'external_id': asin,
-                'title': title[:500],
-                'brand': brand[:100],
-                'category': 'electronics',
-                'current_price': price,
-                'currency': 'EUR',
-                'marketplace': 'amazon',
-                'rating': rating,
-                'review_count': review_count,
-                'stock_status': 'in_stock' if in_stock else 'out_of_stock',
-                'image_url': image_url,
-                'last_updated': datetime.now(),
-                'url': f"https://www.amazon.es/dp/{asin}"
-            }
-            
-            logger.info(f"✅ Producto parseado correctamente")
-            
-            return parsed
-            
+                mongo_db[collection].bulk_write([operation])
+                if on_success is not None:
+                    on_success()
+        if detail_cache is not None:
+            detail_cache.invalidate('product', asin)
+        return True
+    
+    @staticmethod
+    def _parse_retry_after(response):
+        """Segundos indicados en la cabecera Retry-After (si existe)"""
+        value = response.headers.get('Retry-After')
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
+    
+    def parse_amazon_data(self, data, asin, country='ES'):
+        """Parsear respuesta de la API de RapidAPI (parser compartido)"""
+        try:
+            return amazon_parser.parse_amazon_data(data, asin, country)
         except Exception as e:
-            logger.error(f"❌ Error parseando datos: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error("❌ Error parseando datos de %s: %s", asin, e)
             return None
     
     def update_product_in_db(self, product_data):
-        """Actualizar producto en MongoDB"""
+        """Actualizar producto en MongoDB
+
+        Un producto servido desde la caché de RapidAPI (`cached_at`) ya se
+        registró cuando se obtuvo: solo se actualiza el documento, sin nuevo
+        punto de histórico, eventos ni alertas.
+        """
         try:
             if mongo_db is None:
                 logger.error("❌ MongoDB no disponible")
                 return False
             
+            external_id = product_data['external_id']
+            cached = product_data.get('cached_at') is not None
+            writes = []
+            
             # Actualizar o insertar producto
-            result = mongo_db.products.update_one(
-                {'external_id': product_data['external_id']},
-                {'$set': product_data},
+            writes.append(('products', UpdateOne(
+                {'external_id': external_id},
+                {'$set': {k: v for k, v in product_data.items() if k != 'cached_at'}},
                 upsert=True
-            )
-            
-            logger.info(f"💾 Producto guardado en MongoDB")
+            ), None))
             
             # Guardar historial de precios solo si hay precio
-            if product_data.get('current_price'):
-                price_history = {
-                    'product_id': product_data['external_id'],
-                    'price': product_data['current_price'],
-                    'currency': product_data['currency'],
-                    'timestamp': datetime.now(),
-                    'marketplace': product_data['marketplace']
-                }
-                mongo_db.price_history.insert_one(price_history)
-                
-                logger.info(f"📈 Historial de precio guardado: {product_data['current_price']}€")
+            if cached:
+                logger.debug("♻️ Producto %s desde la caché, sin nuevo punto de historial", external_id)
+            elif product_data.get('current_price'):
+                writes.extend(history_writes(product_data))
             else:
-                logger.warning(f"⚠️ Producto sin precio, no se guarda historial")
+                logger.debug("⚠️ Producto %s sin precio, no se guarda historial", external_id)
+            
+            batcher = self.write_batcher
+            if batcher is not None:
+                # Dentro de una ejecución masiva: se envía en el próximo flush
+                for collection, operation, on_success in writes:
+                    batcher.add(collection, operation, key=external_id, on_success=on_success)
+                logger.debug("💾 Producto %s encolado para escritura en lote", external_id)
+            else:
+                for collection, operation, on_success in writes:
+                    result = mongo_db[collection].bulk_write([operation])
+                    track_write_result(collection, {"upserted": result.upserted_count})
+                    if on_success is not None:
+                        on_success()
+                logger.debug("💾 Producto %s guardado en MongoDB", external_id)
+            
+            if detail_cache is not None:
+                detail_cache.invalidate('product', external_id)
+            
+            if config.EVENTS_SOURCE == 'ingestion' and not cached:
+                price_events.observe(
+                    product_data['marketplace'], external_id,
+                    product_data.get('current_price'), product_data.get('stock_status'),
+                    title=product_data.get('title'), currency=product_data.get('currency')
+                )
+            
+            if alert_engine is not None and not cached:
+                alert_engine.observe(product_data)
+                if batcher is None:
+                    alert_engine.flush()
+            
+            stats_cache.add_value('marketplaces', product_data.get('marketplace'))
+            stats_cache.add_value('categories', product_data.get('category'))
             
             return True
             
-        except Exception as e:
-            logger.error(f"❌ Error guardando en DB: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("❌ Error guardando en DB %s", product_data.get('external_id'))
             return False
     
+    @staticmethod
+    def get_tracked_product_ids():
+        """external_id de los productos Amazon activos en PostgreSQL"""
+        with metrics.stage_timer('postgres_query'), postgres_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                # Obtener productos activos de PostgreSQL
+                cursor.execute("""
+                    SELECT DISTINCT external_id, marketplace 
+                    FROM tracked_products 
+                    WHERE active = true AND marketplace = 'amazon'
+                """)
+                return [external_id for external_id, _ in cursor.fetchall()]
+    
     def update_all_tracked_products(self):
-        """Actualizar todos los productos trackeados desde PostgreSQL"""
+        """Actualizar todos los productos trackeados desde PostgreSQL. Devuelve el resumen de la ejecución"""
         try:
-            conn = get_postgres_connection()
-            if not conn:
-                logger.error("❌ No se pudo conectar a PostgreSQL")
-                return
+            external_ids = self.get_tracked_product_ids()
             
-            cursor = conn.cursor()
+            logger.info("📊 Encontrados %d productos para actualizar", len(external_ids))
             
-            # Obtener productos activos de PostgreSQL
-            cursor.execute("""
-                SELECT DISTINCT external_id, marketplace 
-                FROM tracked_products 
-                WHERE active = true AND marketplace = 'amazon'
-            """)
+            return self.refresh_products(external_ids)
             
-            products = cursor.fetchall()
-            cursor.close()
-            conn.close()
-            
-            logger.info(f"📊 Encontrados {len(products)} productos para actualizar")
-            
-            success_count = 0
-            error_count = 0
+        except Exception:
+            logger.exception("❌ Error actualizando productos")
+            return None
+    
+    def refresh_product(self, external_id):
+        """Obtener y guardar un producto. Devuelve True si se actualizó"""
+        # Un único registro por producto con los tiempos de cada etapa
+        trace = ProductTrace(external_id)
+        
+        if len(self.countries) > 1:
+            offers = self.get_amazon_product_multi(external_id, self.countries, trace=trace)
+        else:
+            offers = {self.countries[0]: self.get_amazon_product(external_id, self.countries[0], trace=trace)}
+        return self.store_product(external_id, offers, trace)
+    
+    def store_product(self, external_id, offers, trace):
+        """Guardar el producto (país principal) y las ofertas del resto de países"""
+        product_data = offers.get(self.countries[0])
+        if len(offers) > 1:
+            offers_found = sum(1 for offer in offers.values() if offer)
+            trace.set(offers_found=offers_found)
+        else:
+            offers = None
+        
+        if not product_data:
+            return self._finish_trace(trace, 'fetch_failed')
+        
+        with trace.stage('mongo_write'):
+            saved = self.update_product_in_db(product_data)
+            if saved and offers is not None:
+                self.update_offers_in_db(external_id, offers)
+        if not saved:
+            return self._finish_trace(trace, 'write_failed')
+        
+        if product_data.get('cached_at') is not None:
+            # El planificador cuenta el refresco desde la llamada original
+            self.cached_at[external_id] = product_data['cached_at']
+        trace.set(price=product_data.get('current_price'), batched=self.write_batcher is not None)
+        return self._finish_trace(trace, 'ok')
+    
+    def _refresh_each(self, executor, external_ids):
+        """(external_id, ok) de cada producto según termina"""
+        futures = {
+            executor.submit(self.refresh_product, external_id): external_id
+            for external_id in external_ids
+        }
+        for future in as_completed(futures):
+            try:
+                ok = future.result()
+            except Exception as e:
+                logger.error("❌ Error refrescando %s: %s", futures[future], e)
+                ok = False
+            yield futures[future], ok
+    
+    def _fan_out(self, executor, external_ids):
+        """Varios países: una tarea por (producto, país) en el pool de la ejecución
+
+        Así el número de hilos sigue siendo max_workers. Cada producto se
+        guarda cuando han terminado todos sus países.
+        """
+        futures = {
+            executor.submit(self._fetch_country, external_id, country): (external_id, country)
+            for external_id in external_ids
+            for country in self.countries
+        }
+        pending = {}
+        for future in as_completed(futures):
+            external_id, country = futures[future]
+            entry = pending.setdefault(external_id, {'offers': {}, 'trace': None})
+            try:
+                product, country_trace = future.result()
+            except Exception as e:
+                logger.error("❌ Error consultando %s (%s): %s", external_id, country, e)
+                product, country_trace = None, ProductTrace(external_id)
+            if entry['trace'] is None:
+                entry['trace'] = ProductTrace(external_id)
+            entry['trace'].absorb(country_trace, country)
+            entry['offers'][country] = product
+            if len(entry['offers']) < len(self.countries):
+                continue
             
-            for external_id, marketplace in products:
-                logger.info(f"{'='*60}")
-                logger.info(f"🔄 Actualizando producto: {external_id}")
-                logger.info(f"{'='*60}")
-                
-                product_data = self.get_amazon_product(external_id)
-                
-                if product_data:
-                    if self.update_product_in_db(product_data):
-                        success_count += 1
-                        logger.info(f"✅ Producto actualizado exitosamente")
+            del pending[external_id]
+            try:
+                ok = self.store_product(external_id, entry['offers'], entry['trace'])
+            except Exception as e:
+                logger.error("❌ Error guardando %s: %s", external_id, e)
+                ok = False
+            yield external_id, ok
+    
+    @staticmethod
+    def _finish_trace(trace, outcome):
+        """Emitir el registro del producto y sus métricas. True si se actualizó"""
+        trace.emit(logger, outcome)
+        metrics.observe_trace(trace, outcome)
+        return outcome == 'ok'
+    
+    def refresh_products(self, external_ids, on_product=None):
+        """Refrescar productos en paralelo respetando el rate limit compartido
+
+        `on_product(ok)` se llama al terminar cada producto (progreso de trabajos).
+        """
+        started = time.monotonic()
+        succeeded = set()
+        error_count = 0
+        self.cached_at = {}
+        
+        batcher = None
+        if mongo_db is not None:
+            batcher = WriteBatcher(
+                mongo_db,
+                max_batch_size=config.MONGO_WRITE_BATCH_SIZE,
+                max_latency=config.MONGO_WRITE_BATCH_LATENCY,
+                on_result=track_write_result
+            )
+        self.write_batcher = batcher
+        
+        if price_history_recorder is not None and price_history_recorder.change_only:
+            price_history_recorder.prime(external_ids)
+        
+        if mongo_db is not None and config.EVENTS_SOURCE == 'ingestion':
+            try:
+                prime_price_events(external_ids)
+            except Exception as e:
+                logger.warning("⚠️ No se pudo cargar el estado previo de precios: %s", e)
+        
+        if alert_engine is not None:
+            try:
+                alert_engine.refresh()
+            except Exception as e:
+                logger.warning("⚠️ No se pudieron recargar las alertas: %s", e)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingestion') as executor:
+                if len(self.countries) > 1:
+                    results = self._fan_out(executor, external_ids)
+                else:
+                    results = self._refresh_each(executor, external_ids)
+                for external_id, ok in results:
+                    if ok:
+                        succeeded.add(external_id)
                     else:
                         error_count += 1
-                        logger.error(f"❌ Error guardando en DB")
-                else:
-                    error_count += 1
-                    logger.error(f"❌ No se pudo obtener datos del producto")
-                
-                # Esperar entre requests
-                import time
-                logger.info(f"⏳ Esperando 3 segundos antes del siguiente producto...")
-                time.sleep(3)
-            
-            logger.info(f"{'='*60}")
-            logger.info(f"✅ Actualización completada")
-            logger.info(f"📊 Éxitos: {success_count} | Errores: {error_count}")
-            logger.info(f"{'='*60}")
-            
-        except Exception as e:
-            logger.error(f"❌ Error actualizando productos: {e}")
-            import traceback
-            traceback.print_exc()
+                    if on_product is not None:
+                        on_product(ok)
+        finally:
+            self.write_batcher = None
+            if batcher is not None:
+                batcher.close()
+                # Una lectura entre la invalidación y el flush pudo cachear el estado anterior
+                if detail_cache is not None:
+                    detail_cache.invalidate_many('product', external_ids)
+            if alert_engine is not None:
+                alert_engine.flush()
+        
+        # Productos cuya escritura en lote falló cuentan como error
+        if batcher is not None:
+            failed_writes = succeeded & batcher.failed_keys
+            succeeded -= failed_writes
+            error_count += len(failed_writes)
+        success_count = len(succeeded)
+        
+        elapsed = time.monotonic() - started
+        throughput = len(external_ids) / elapsed if elapsed > 0 else 0.0
+        metrics.observe_run('amazon', elapsed, len(external_ids))
+        
+        logger.info(
+            "✅ Actualización completada en %.1fs (%.2f productos/s) | Éxitos: %d | Errores: %d",
+            elapsed, throughput, success_count, error_count,
+            extra={
+                "event": "refresh_run",
+                "products": len(external_ids),
+                "succeeded": success_count,
+                "failed": error_count,
+                "duration_ms": round(elapsed * 1000, 2),
+                "products_per_second": round(throughput, 2),
+                "write_batches": batcher.stats if batcher is not None else None,
+                "rate_limiter": self.rate_limiter.stats(),
+                "http_pool": get_http_stats()
+            }
+        )
+        
+        return {
+            "success": success_count,
+            "errors": error_count,
+            "elapsed_seconds": round(elapsed, 3),
+            "products_per_second": round(throughput, 3),
+            "refreshed_ids": sorted(succeeded),
+            "cached_at": {external_id: at for external_id, at in self.cached_at.items() if external_id in succeeded}
+        }
 
 # ===================================
 # SCHEDULER PARA ACTUALIZACIÓN AUTOMÁTICA
 # ===================================
 
+# Modo distribuido: las réplicas se reparten cada ejecución con leases en MongoDB
+work_leases = None
+if config.INGESTION_MODE == 'distributed':
+    if mongo_db is not None:
+        work_leases = WorkLeaseManager(
+            mongo_db,
+            worker_id=config.INGESTION_WORKER_ID or None,
+            lease_seconds=config.INGESTION_LEASE_SECONDS,
+            batch_size=config.INGESTION_LEASE_BATCH_SIZE,
+            retention_hours=config.INGESTION_LEASE_RETENTION_HOURS
+        )
+        logger.info("🧩 Ingesta distribuida - worker %s", work_leases.worker_id)
+    else:
+        logger.warning("⚠️ INGESTION_MODE=distributed requiere MongoDB: se usa el modo local")
+
 def update_prices_job():
     """Job para actualizar precios automáticamente"""
-    logger.info("="*50)
-    logger.info("🔄 INICIANDO ACTUALIZACIÓN AUTOMÁTICA DE PRECIOS")
-    logger.info("="*50)
+    logger.info("🔄 Iniciando actualización automática de precios")
     
     try:
         scraper = ProductScraper(config.RAPIDAPI_KEY)  # <-- CAMBIO AQUÍ
-        scraper.update_all_tracked_products()
-        
-        logger.info("="*50)
-        logger.info("✅ ACTUALIZACIÓN COMPLETADA")
-        logger.info("="*50)
+        if work_leases is not None:
+            # Una ejecución por hora natural, compartida por todas las réplicas
+            # En UTC: todas las réplicas calculan el mismo run_id sea cual sea su TZ
+            run_id = utc_now().strftime('hourly:%Y-%m-%dT%H')
+            work_leases.process_run(run_id, ProductScraper.get_tracked_product_ids, scraper.refresh_products)
+        else:
+            scraper.update_all_tracked_products()
         
+    except Exception:
+        logger.exception("❌ Error en job de actualización")
+
+# Cola de prioridad para el refresco adaptativo
+refresh_scheduler = RefreshScheduler(RefreshPolicy(
+    base_interval=config.REFRESH_BASE_INTERVAL_MINUTES * 60,
+    min_interval=config.REFRESH_MIN_INTERVAL_MINUTES * 60,
+    max_interval=config.REFRESH_MAX_INTERVAL_MINUTES * 60,
+    volatility_weight=config.REFRESH_VOLATILITY_WEIGHT,
+    follower_weight=config.REFRESH_FOLLOWER_WEIGHT,
+    alert_weight=config.REFRESH_ALERT_WEIGHT
+))
+_refresh_signals_loaded_at = None
+
+def rebuild_refresh_queue():
+    """Recargar productos trackeados y señales (volatilidad, seguidores, alertas)"""
+    global _refresh_signals_loaded_at
+    external_ids = ProductScraper.get_tracked_product_ids()
+    
+    signals = {}
+    try:
+        signals.update(load_engagement(postgres_pool))
     except Exception as e:
-        logger.error(f"❌ Error en job de actualización: {e}")
+        logger.warning("⚠️ Sin seguidores/alertas para priorizar: %s", e)
+    try:
+        since = datetime.now() - timedelta(days=config.REFRESH_VOLATILITY_DAYS)
+        for external_id, changes_per_day in load_price_volatility(price_history_read_store, since).items():
+            signals.setdefault(external_id, {})['changes_per_day'] = changes_per_day
+    except Exception as e:
+        logger.warning("⚠️ Sin volatilidad de precios para priorizar: %s", e)
+    
+    refresh_scheduler.rebuild(external_ids, load_last_refreshed(mongo_read_db, external_ids), signals)
+    _refresh_signals_loaded_at = time.monotonic()
+
+def adaptive_refresh_job():
+    """Refrescar solo los productos vencidos, los más atrasados primero"""
+    try:
+        if (_refresh_signals_loaded_at is None
+                or time.monotonic() - _refresh_signals_loaded_at >= config.REFRESH_SIGNALS_MINUTES * 60):
+            rebuild_refresh_queue()
+        
+        # Presupuesto por tick: lo que permite el rate limit en el intervalo del tick
+        budget = config.REFRESH_MAX_PER_TICK or max(1, int(config.RAPIDAPI_RATE_LIMIT * config.REFRESH_TICK_SECONDS))
+        if work_leases is not None:
+            distributed_refresh_tick(budget)
+            return
+        due = refresh_scheduler.pop_due(budget)
+        if not due:
+            return
+        
+        refreshed = set()
+        cached_at = {}
+        try:
+            scraper = ProductScraper(config.RAPIDAPI_KEY)
+            summary = scraper.refresh_products(due)
+            refreshed = set(summary.get("refreshed_ids", []))
+            cached_at = summary.get("cached_at", {})
+        finally:
+            for external_id in due:
+                refresh_scheduler.reschedule(external_id, external_id in refreshed, now=cached_at.get(external_id))
+        
+    except Exception:
+        logger.exception("❌ Error en el refresco adaptativo")
+
+def distributed_refresh_tick(budget):
+    """Un tick adaptativo repartido entre réplicas
+
+    La primera réplica del tick siembra los vencidos de su cola (descartando los
+    que otra ya refrescó) con presupuesto para todas las réplicas activas; todas
+    procesan lotes hasta vaciar la ejecución.
+    """
+    seeded = []
+    
+    def load_due():
+        workers = work_leases.active_workers(config.REFRESH_TICK_SECONDS * 3)
+        due = refresh_scheduler.pop_due(budget * workers)
+        pending = refresh_scheduler.drop_refreshed_elsewhere(due, load_last_refreshed(mongo_db, due)) if due else []
+        seeded.extend(pending)
+        return pending
+    
+    run_id = f"tick:{int(time.time() // config.REFRESH_TICK_SECONDS)}"
+    scraper = ProductScraper(config.RAPIDAPI_KEY)
+    result = None
+    try:
+        result = work_leases.process_run(run_id, load_due, scraper.refresh_products)
+    finally:
+        refreshed = set(result["refreshed_ids"]) if result else set()
+        processed = set(result["processed_ids"]) if result else set(seeded)
+        cached_at = result["cached_at"] if result else {}
+        for external_id in processed:
+            refresh_scheduler.reschedule(external_id, external_id in refreshed, now=cached_at.get(external_id))
+        # Los sembrados que procesaron otras réplicas salen de vuelo; si fallaron,
+        # vuelven a vencer con la siguiente reconstrucción de la cola
+        for external_id in seeded:
+            if external_id not in processed:
+                refresh_scheduler.reschedule(external_id, True)
+
+# Trabajos lanzados desde la API (POST /update-prices)
+jobs = JobManager(history_size=config.JOBS_HISTORY_SIZE)
+
+def run_manual_update(job):
+    """Cuerpo del trabajo de actualización manual"""
+    external_ids = ProductScraper.get_tracked_product_ids()
+    job.start(len(external_ids))
+    logger.info("📊 Encontrados %d productos para actualizar", len(external_ids))
+    # Quien lanza una actualización manual quiere precios de ahora
+    scraper = ProductScraper(config.RAPIDAPI_KEY, use_cache=False)
+    summary = scraper.refresh_products(external_ids, on_product=job.record)
+    summary.pop("refreshed_ids", None)
+    summary.pop("cached_at", None)
+    return summary
 
 # Inicializar scheduler
 scheduler = BackgroundScheduler()
-# Actualizar cada 1 hora
-scheduler.add_job(update_prices_job, 'interval', hours=1, id='update_prices')
-scheduler.start()
+if config.REFRESH_STRATEGY == 'adaptive':
+    scheduler.add_job(
+        adaptive_refresh_job, 'interval', seconds=config.REFRESH_TICK_SECONDS,
+        id='update_prices', max_instances=1, coalesce=True
+    )
+elif work_leases is not None:
+    # En punto: todas las réplicas se suman a la misma ejecución horaria
+    scheduler.add_job(update_prices_job, 'cron', minute=0, id='update_prices', max_instances=1)
+else:
+    # Actualizar cada 1 hora
+    scheduler.add_job(update_prices_job, 'interval', hours=1, id='update_prices')
+
+def comparator_refresh_job():
+    """Job para regenerar los precios de todo el catálogo del comparador"""
+    try:
+        refresh_all_comparator_prices(mongo_db, config.COMPARATOR_REFRESH_CHUNK_SIZE)
+    except Exception as e:
+        logger.error("❌ Error en el refresco masivo del comparador: %s", e)
+
+if mongo_db is not None and config.COMPARATOR_REFRESH_HOURS > 0:
+    scheduler.add_job(
+        comparator_refresh_job, 'interval',
+        hours=config.COMPARATOR_REFRESH_HOURS, id='comparator_refresh'
+    )
 
-logger.info("⏰ Scheduler iniciado - Actualizaciones cada 1 hora")
+def compact_price_history_job():
+    """Job para colapsar tramos de precios repetidos en price_history"""
+    try:
+        compact_price_history(mongo_db, recorder=price_history_recorder)
+    except Exception as e:
+        logger.error("❌ Error compactando price_history: %s", e)
+
+if (mongo_db is not None and config.PRICE_HISTORY_COMPACTION_HOURS > 0
+        and price_history_storage == STORAGE_DOCUMENTS):
+    scheduler.add_job(
+        compact_price_history_job, 'interval',
+        hours=config.PRICE_HISTORY_COMPACTION_HOURS, id='compact_price_history'
+    )
+if config.SCHEDULER_ENABLED:
+    scheduler.start()
+    logger.info("⏰ Scheduler iniciado - refresco %s", config.REFRESH_STRATEGY)
+else:
+    logger.info("⏸️ Scheduler desactivado (SCHEDULER_ENABLED=False)")
 
 # ===================================
 # RUTAS / ENDPOINTS
 # ===================================
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Plantilla de la ruta (p.ej. /products/<product_id>) para no disparar la cardinalidad
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.REQUEST_SECONDS.labels(
+            method=request.method, route=route, status=str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    body, content_type = metrics.render_metrics()
+    return Response(body, content_type=content_type)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     mongo_status = "OK" if mongo_db is not None else "ERROR"
-    postgres_status = "OK" if get_postgres_connection() is not None else "ERROR"
+    try:
+        with postgres_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        postgres_status = "OK"
+    except Exception as e:
+        logger.error("❌ Error conectando a PostgreSQL: %s", e)
+        postgres_status = "ERROR"
     rapidapi_configured = "OK" if config.RAPIDAPI_KEY else "NOT_CONFIGURED"
     
     return jsonify({
@@ -352,11 +882,17 @@ def health_check():
         "timestamp": datetime.now().isoformat(),
         "databases": {
             "mongodb": mongo_status,
-            "postgresql": postgres_status
+            "postgresql": postgres_status,
+            "postgresql_pool": get_postgres_stats()
         },
+        "alerts": alert_engine.stats() if alert_engine is not None else None,
+        "price_events": price_events.stats(),
+        "rapidapi_cache": get_response_cache().stats() if config.RAPIDAPI_CACHE_ENABLED else None,
+        "detail_cache": detail_cache.stats() if detail_cache is not None else None,
         "scraper": {
             "type": "RapidAPI - Real-Time Amazon Data",
             "rapidapi": rapidapi_configured,
+            "http_pool": get_http_stats(),
             "scheduler": "RUNNING" if scheduler.running else "STOPPED"
         }
     }), 200
@@ -371,31 +907,85 @@ def index():
             "health": "/health",
             "products": "/products",
             "stats": "/stats",
-            "update_now": "/update-prices (POST)"
+            "export": "/export/price-history",
+            "metrics": "/metrics",
+            "refresh_schedule": "/refresh-schedule",
+            "update_now": "/update-prices (POST)",
+            "update_status": "/update-prices/<job_id>",
+            "price_events": "/events/prices (SSE)",
+            "price_events_poll": "/events/prices/poll"
         }
     }), 200
 
+@app.route('/refresh-schedule', methods=['GET'])
+def refresh_schedule():
+    """Estado de la cola de refresco adaptativo"""
+    try:
+        upcoming = int(request.args.get('upcoming', 10))
+    except ValueError:
+        return jsonify({"success": False, "error": "upcoming debe ser un entero"}), 400
+    if upcoming < 0:
+        return jsonify({"success": False, "error": "upcoming no puede ser negativo"}), 400
+    upcoming = min(upcoming, 100)
+    try:
+        if request.args.get('rebuild', 'false').lower() == 'true':
+            rebuild_refresh_queue()
+        return jsonify({
+            "success": True,
+            "strategy": config.REFRESH_STRATEGY,
+            "ingestion_mode": "distributed" if work_leases is not None else "local",
+            "schedule": refresh_scheduler.stats(upcoming=upcoming),
+            "distributed": {
+                "worker_id": work_leases.worker_id,
+                "last_run": work_leases.run_status(work_leases.last_run_id) if work_leases.last_run_id else None
+            } if work_leases is not None else None
+        }), 200
+    except Exception as e:
+        logger.error("Error obteniendo la cola de refresco: %s", e)
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/update-prices', methods=['POST'])
 def manual_update():
-    """Endpoint para forzar actualización manual"""
+    """Endpoint para forzar actualización manual (trabajo en segundo plano)"""
     logger.info("🔄 Actualización manual solicitada")
     
     try:
-        scraper = ProductScraper(config.RAPIDAPI_KEY)  # <-- CAMBIO AQUÍ
-        scraper.update_all_tracked_products()
+        # Peticiones simultáneas se pliegan en el mismo trabajo
+        job, created = jobs.submit('update-prices', 'update-prices:all', run_manual_update)
         
         return jsonify({
             "success": True,
-            "message": "Actualización iniciada correctamente"
-        }), 200
+            "message": "Actualización iniciada correctamente" if created else "Actualización ya en curso",
+            "job_id": job.id,
+            "deduplicated": not created,
+            "status_url": f"/update-prices/{job.id}",
+            "job": job.snapshot()
+        }), 202
         
     except Exception as e:
-        logger.error(f"Error en actualización manual: {e}")
+        logger.error("Error en actualización manual: %s", e)
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
+@app.route('/update-prices/<job_id>', methods=['GET'])
+def manual_update_status(job_id):
+    """Progreso, éxitos/errores y ETA de una actualización manual"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Trabajo no encontrado"}), 404
+    return jsonify({"success": True, "job": job.snapshot()}), 200
+
+@app.route('/update-prices', methods=['GET'])
+def manual_update_history():
+    """Últimas actualizaciones manuales"""
+    try:
+        limit = parse_limit(request.args.get('limit'), 20, config.JOBS_HISTORY_SIZE)
+    except PaginationError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "jobs": jobs.recent('update-prices', limit)}), 200
+
 @app.route('/products', methods=['GET'])
 def get_products():
     try:
@@ -404,7 +994,9 @@ def get_products():
         
         marketplace = request.args.get('marketplace')
         category = request.args.get('category')
-        limit = int(request.args.get('limit', 20))
+        limit = parse_limit(request.args.get('limit'), 20, config.PAGINATION_MAX_LIMIT)
+        sort = [('_id', 1)]
+        projection = parse_fields(request.args.get('fields'), sort)
         
         query_filter = {}
         if marketplace:
@@ -412,7 +1004,10 @@ def get_products():
         if category:
             query_filter['category'] = category
         
-        products = list(mongo_db.products.find(query_filter).limit(limit))
+        products, next_cursor = paginate(
+            mongo_read_db.products, query_filter, sort, limit,
+            cursor=request.args.get('cursor'), projection=projection
+        )
         
         for product in products:
             product['_id'] = str(product['_id'])
@@ -420,11 +1015,73 @@ def get_products():
         return jsonify({
             "success": True,
             "count": len(products),
-            "products": products
+            "products": products,
+            "next_cursor": next_cursor
+        }), 200
+        
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error obteniendo productos: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/products/<product_id>/countries', methods=['GET', 'POST'])
+def compare_product_countries(product_id):
+    """Precio de un ASIN en varios países de Amazon
+
+    GET lee las ofertas guardadas en product_offers (sin llamadas a la API).
+    POST consulta todos los países en paralelo (gasta cuota de RapidAPI),
+    guarda cada oferta y devuelve la comparación.
+    """
+    try:
+        if mongo_db is None:
+            return jsonify({"error": "MongoDB no disponible"}), 503
+        
+        requested = request.args.get('countries')
+        countries = [c.strip() for c in requested.split(',') if c.strip()] if requested else config.AMAZON_COMPARE_COUNTRIES
+        countries = [amazon_parser.normalize_country(c) for c in countries]
+        unknown = [c for c in countries if c not in amazon_parser.LOCALES]
+        if unknown:
+            return jsonify({"error": f"Países no soportados: {', '.join(unknown)}"}), 400
+        
+        started = time.perf_counter()
+        if request.method == 'GET':
+            offers = {
+                doc['country']: doc for doc in mongo_read_db.product_offers.find(
+                    {'external_id': product_id, 'country': {'$in': countries}}, {'_id': 0}
+                )
+            }
+        else:
+            scraper = ProductScraper(config.RAPIDAPI_KEY, use_cache=False)
+            results = scraper.get_amazon_product_multi(product_id, countries)
+            if results.get(scraper.countries[0]) is not None:
+                scraper.update_product_in_db(results[scraper.countries[0]])
+            scraper.update_offers_in_db(product_id, results)
+            offers = {
+                country: {'external_id': product_id, 'country': country, **scraper.offer_fields(product)}
+                for country, product in results.items() if product is not None
+            }
+        
+        # Sin conversión de divisa: el más barato se calcula dentro de cada moneda
+        cheapest = {}
+        for offer in offers.values():
+            if offer.get('price') is None or offer.get('stock_status') != 'in_stock':
+                continue
+            best = cheapest.get(offer['currency'])
+            if best is None or offer['price'] < best['price']:
+                cheapest[offer['currency']] = {'country': offer['country'], 'price': offer['price']}
+        
+        return jsonify({
+            "success": True,
+            "external_id": product_id,
+            "offers": [offers[c] for c in countries if c in offers],
+            "missing": [c for c in countries if c not in offers],
+            "cheapest_by_currency": cheapest,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
         }), 200
         
     except Exception as e:
-        logger.error(f"Error obteniendo productos: {e}")
+        logger.error("Error comparando países de %s: %s", product_id, e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/products/<product_id>', methods=['GET'])
@@ -433,25 +1090,40 @@ def get_product_detail(product_id):
         if mongo_db is None:
             return jsonify({"error": "MongoDB no disponible"}), 503
         
-        product = mongo_db.products.find_one({"external_id": product_id})
+        country = amazon_parser.normalize_country(request.args.get('country'))
+        expand = request.args.get('expand', 'false').lower() == 'true'
+        variant = f"{country}:{int(expand)}"
+        
+        # Acierto: cuerpo ya serializado, sin consultas a MongoDB
+        token = None
+        read_db, history_store = mongo_read_db, price_history_read_store
+        if detail_cache is not None:
+            body = detail_cache.get('product', product_id, variant)
+            if body is not None:
+                return app.response_class(body, status=200, mimetype='application/json', headers={'X-Cache': 'HIT'})
+            token = detail_cache.token()
+            # Lo que se cachea se lee del primario: un secundario con retraso
+            # dejaría datos anteriores a la última invalidación durante todo el TTL
+            read_db, history_store = mongo_db, price_history_store
+        
+        product = read_db.products.find_one({"external_id": product_id})
         
         if not product:
             return jsonify({"error": "Producto no encontrado"}), 404
         
         product['_id'] = str(product['_id'])
         
-        price_history = list(
-            mongo_db.price_history
-            .find({"product_id": product_id})
-            .sort("timestamp", -1)
-            .limit(30)
-        )
+        price_history = history_store.recent(product_id, 30, country)
+        
+        # En modo 'changes' cada documento es un tramo; expand=true lo desglosa por muestra
+        if expand:
+            price_history = expand_points(price_history, limit=30)
         
         for entry in price_history:
             entry['_id'] = str(entry['_id'])
         
         reviews = list(
-            mongo_db.reviews
+            read_db.reviews
             .find({"product_id": product_id})
             .sort("date", -1)
             .limit(10)
@@ -460,40 +1132,187 @@ def get_product_detail(product_id):
         for review in reviews:
             review['_id'] = str(review['_id'])
         
-        return jsonify({
+        response = jsonify({
             "success": True,
             "product": product,
             "price_history": price_history,
             "reviews": reviews
-        }), 200
+        })
+        if detail_cache is not None:
+            detail_cache.put('product', product_id, variant, response.get_data(), token)
+            response.headers['X-Cache'] = 'MISS'
+        return response, 200
         
     except Exception as e:
-        logger.error(f"Error obteniendo detalle del producto: {e}")
+        logger.error("Error obteniendo detalle del producto: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def compute_stats(approximate=False):
+    """Calcular estadísticas exactas o a partir de metadatos de colección"""
+    if approximate:
+        # estimated_document_count lee los metadatos, no escanea la colección
+        return {
+            "total_products": mongo_read_db.products.estimated_document_count(),
+            "total_price_records": price_history_read_store.estimate_points(),
+            "total_reviews": mongo_read_db.reviews.estimated_document_count(),
+            "marketplaces": list(mongo_read_db.products.distinct("marketplace")),
+            "categories": list(mongo_read_db.products.distinct("category"))
+        }
+    
+    return {
+        "total_products": mongo_read_db.products.count_documents({}),
+        "total_price_records": price_history_read_store.count_points(),
+        "total_reviews": mongo_read_db.reviews.count_documents({}),
+        "marketplaces": list(mongo_read_db.products.distinct("marketplace")),
+        "categories": list(mongo_read_db.products.distinct("category"))
+    }
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
     try:
         if mongo_db is None:
             return jsonify({"error": "MongoDB no disponible"}), 503
         
-        stats = {
-            "total_products": mongo_db.products.count_documents({}),
-            "total_price_records": mongo_db.price_history.count_documents({}),
-            "total_reviews": mongo_db.reviews.count_documents({}),
-            "marketplaces": list(mongo_db.products.distinct("marketplace")),
-            "categories": list(mongo_db.products.distinct("category"))
-        }
+        approximate = request.args.get('approximate', 'false').lower() == 'true'
+        if request.args.get('refresh', 'false').lower() == 'true':
+            stats_cache.invalidate()
+        
+        stats, meta = stats_cache.get(compute_stats, approximate=approximate)
         
         return jsonify({
             "success": True,
-            "stats": stats
+            "stats": stats,
+            "cache": meta
         }), 200
         
     except Exception as e:
-        logger.error(f"Error obteniendo estadísticas: {e}")
+        logger.error("Error obteniendo estadísticas: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/export/price-history', methods=['GET'])
+def export_price_history():
+    """Exportar histórico en streaming (NDJSON o CSV, opcionalmente gzip)"""
+    try:
+        if mongo_db is None:
+            return jsonify({"error": "MongoDB no disponible"}), 503
+        
+        source = request.args.get('source', exporter.SOURCE_PRICE_HISTORY)
+        fmt = request.args.get('format', 'ndjson')
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+        
+        if source not in exporter.CSV_COLUMNS:
+            return jsonify({"error": f"source no válido: {source}"}), 400
+        if fmt not in exporter.FORMATS:
+            return jsonify({"error": f"format no válido: {fmt}"}), 400
+        
+        try:
+            query = exporter.build_query(
+                source,
+                product_id=request.args.get('product_id'),
+                marketplace=request.args.get('marketplace'),
+                start=exporter.parse_datetime(request.args.get('from')),
+                end=exporter.parse_datetime(request.args.get('to')),
+                country=amazon_parser.normalize_country(request.args['country']) if request.args.get('country') else None
+            )
+        except ValueError as e:
+            return jsonify({"error": f"Fecha no válida: {e}"}), 400
+        
+        stream = exporter.export_stream(
+            mongo_read_db, source, fmt, query,
+            history_store=price_history_read_store, compress=compress
+        )
+        
+        filename = f"{source}.{fmt}" + (".gz" if compress else "")
+        mimetype = 'application/gzip' if compress else (
+            'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        )
+        return Response(
+            stream_with_context(stream),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+        
+    except Exception as e:
+        logger.error("Error exportando histórico: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def _event_filters():
+    """product_id y marketplace repetibles o separados por comas"""
+    def values(name):
+        return {value for arg in request.args.getlist(name) for value in arg.split(',') if value}
+    return values('product_id') or None, values('marketplace') or None
+
+def _last_event_id(default=0):
+    try:
+        return int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id', default))
+    except ValueError:
+        return default
+
+@app.route('/events/prices', methods=['GET'])
+def price_events_stream():
+    """Server-sent events con los cambios de precio/stock (filtrables por producto o marketplace)
+
+    Cada stream abierto ocupa un hilo del servidor mientras dura la conexión:
+    con `python app.py` (servidor de desarrollo, un hilo por petición) cada
+    cliente conectado es un hilo. Para muchos clientes, servir con un worker
+    asíncrono (p. ej. gunicorn con gevent) o usar /events/prices/poll.
+    """
+    product_ids, marketplaces = _event_filters()
+    last_id = _last_event_id()
+    subscription = price_events.subscribe(product_ids, marketplaces)
+    
+    def stream():
+        sent = last_id
+        try:
+            yield "retry: 5000\n\n"
+            # Reanudación: lo publicado mientras el cliente estaba desconectado
+            for event in price_events.since(last_id, subscription) if last_id else []:
+                sent = event['id']
+                yield format_sse(event)
+            while True:
+                event = subscription.get(config.EVENTS_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif event['id'] > sent:
+                    sent = event['id']
+                    yield format_sse(event)
+        finally:
+            price_events.unsubscribe(subscription)
+    
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/events/prices/poll', methods=['GET'])
+def price_events_poll():
+    """Long-poll: devuelve los eventos posteriores a `since` o espera al siguiente"""
+    product_ids, marketplaces = _event_filters()
+    try:
+        since = int(request.args.get('since', 0) or 0)
+        timeout = float(request.args.get('timeout', config.EVENTS_LONG_POLL_TIMEOUT))
+    except ValueError:
+        return jsonify({"success": False, "error": "since debe ser un entero y timeout un número"}), 400
+    # `not timeout >= 0` también descarta NaN
+    if since < 0 or not timeout >= 0:
+        return jsonify({"success": False, "error": "since y timeout no pueden ser negativos"}), 400
+    since = _last_event_id(since)
+    timeout = min(timeout, config.EVENTS_LONG_POLL_TIMEOUT)
+    
+    subscription = price_events.subscribe(product_ids, marketplaces)
+    try:
+        # Sin `since` se espera al próximo evento en lugar de devolver el histórico
+        events = price_events.since(since, subscription) if since else []
+        if not events:
+            event = subscription.get(timeout)
+            events = [event] if event is not None and event['id'] > since else []
+    finally:
+        price_events.unsubscribe(subscription)
+    
+    last_id = events[-1]['id'] if events else max(since, price_events.stats()['last_event_id'])
+    return jsonify({"success": True, "events": events, "last_event_id": last_id}), 200
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint no encontrado"}), 404
@@ -509,7 +1328,7 @@ def internal_error(error):
 if __name__ == '__main__':
     logger.info("="*50)
     logger.info("🐍 Data Ingestion Service (Python/Flask)")
-    logger.info(f"🚀 Iniciando en puerto {config.PORT}")
+    logger.info("🚀 Iniciando en puerto %s", config.PORT)
     logger.info("🔑 RapidAPI: " + ("CONFIGURADA ✅" if config.RAPIDAPI_KEY else "NO CONFIGURADA ❌"))
     logger.info("="*50)
     
@@ -0,0 +1,170 @@
+"""Benchmark: parser de respuestas de Amazon (corpus de formatos + throughput)
+
+Comprueba primero el corpus de formatos de precio/rating/reviews y después
+mide respuestas por segundo del parser compartido frente al parseo anterior
+(recorrido carácter a carácter, replace encadenados y ~8 logs INFO por producto).
+
+Uso: python benchmarks/amazon_parser_bench.py --responses 200000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from scrapers.amazon_parser import (
+    parse_amazon_batch, parse_in_stock, parse_price, parse_rating, parse_review_count
+)
+# El corpus vive con los tests (pytest tests/); aquí se repasa antes de medir
+from tests.test_amazon_parser import PRICE_CORPUS, RATING_CORPUS, REVIEWS_CORPUS, STOCK_CORPUS
+
+PRICE_SAMPLES = ["59,99 €", "1.234,56 €", "$1,234.56", "£19.99", "24,95 €", "1 299,00 €", "7,50 €"]
+
+
+def check_corpus() -> list:
+    """Casos del corpus que no dan el resultado esperado"""
+    failures = []
+    for value, country, expected in PRICE_CORPUS:
+        got = parse_price(value, country)
+        if got != expected:
+            failures.append({"field": "price", "input": value, "country": country, "expected": expected, "got": got})
+    for value, expected in RATING_CORPUS:
+        got = parse_rating(value)
+        if got != expected:
+            failures.append({"field": "rating", "input": value, "expected": expected, "got": got})
+    for value, expected in REVIEWS_CORPUS:
+        got = parse_review_count(value)
+        if got != expected:
+            failures.append({"field": "review_count", "input": value, "expected": expected, "got": got})
+    for value, expected in STOCK_CORPUS:
+        got = parse_in_stock(value)
+        if got != expected:
+            failures.append({"field": "in_stock", "input": value, "expected": expected, "got": got})
+    return failures
+
+
+legacy_logger = logging.getLogger('amazon_parser_bench.legacy')
+
+
+def _legacy_parse(data, asin):
+    """Parseo anterior de app.py, con sus logs por producto, como referencia"""
+    product_data = data['data']
+    title = product_data.get('product_title', 'Sin título')
+    legacy_logger.info(f"📦 Producto: {title[:50]}...")
+
+    price = None
+    price_str = product_data.get('product_price', '')
+    if price_str:
+        try:
+            price_clean = ''.join(c for c in str(price_str) if c.isdigit() or c in '.,')
+            if ',' in price_clean and '.' in price_clean:
+                price_clean = price_clean.replace('.', '').replace(',', '.')
+            elif ',' in price_clean:
+                price_clean = price_clean.replace(',', '.')
+            price = float(price_clean)
+            legacy_logger.info(f"💰 Precio: {price}€")
+        except Exception as e:
+            legacy_logger.warning(f"⚠️ Error parseando precio '{price_str}': {e}")
+
+    rating = None
+    rating_str = product_data.get('product_star_rating', '')
+    if rating_str:
+        try:
+            rating = float(str(rating_str).split()[0].replace(',', '.'))
+            legacy_logger.info(f"⭐ Rating: {rating}")
+        except Exception as e:
+            legacy_logger.warning(f"⚠️ Error parseando rating '{rating_str}': {e}")
+
+    review_clean = str(product_data.get('product_num_ratings', 0)).replace('.', '').replace(',', '')
+    review_count = int(review_clean) if review_clean.isdigit() else 0
+    legacy_logger.info(f"📝 Reviews: {review_count}")
+
+    brand = 'Amazon'
+    product_info = product_data.get('product_information', {})
+    if isinstance(product_info, dict):
+        brand = product_info.get('Brand', 'Amazon')
+    legacy_logger.info(f"🏷️ Marca: {brand}")
+
+    availability = product_data.get('product_availability', '')
+    in_stock = bool(availability and 'stock' in str(availability).lower())
+    legacy_logger.info(f"📦 Stock: {'En stock' if in_stock else 'No disponible'}")
+
+    parsed = {
+        'external_id': asin,
+        'title': title[:500],
+        'brand': brand[:100],
+        'category': 'electronics',
+        'current_price': price,
+        'currency': 'EUR',
+        'marketplace': 'amazon',
+        'rating': rating,
+        'review_count': review_count,
+        'stock_status': 'in_stock' if in_stock else 'out_of_stock',
+        'image_url': product_data.get('product_photo', ''),
+        'last_updated': datetime.now(),
+        'url': f"https://www.amazon.es/dp/{asin}"
+    }
+    legacy_logger.info("✅ Producto parseado correctamente")
+    return parsed
+
+
+def _responses(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    responses = []
+    for i in range(count):
+        responses.append(({
+            "status": "OK",
+            "data": {
+                "product_title": f"Producto de prueba {i} con un título bastante largo",
+                "product_price": rng.choice(PRICE_SAMPLES),
+                "product_star_rating": f"{rng.randint(10, 50) / 10:.1f}".replace('.', ',') + " de 5 estrellas",
+                "product_num_ratings": f"{rng.randint(0, 99)}.{rng.randint(0, 999):03d}",
+                "product_availability": rng.choice(["En stock", "Sin stock", "Disponible"]),
+                "product_information": {"Brand": "Marca"},
+                "product_photo": "https://m.media-amazon.com/images/I/foto.jpg"
+            }
+        }, f"B{i:09d}"))
+    return responses
+
+
+def run(responses: int) -> dict:
+    failures = check_corpus()
+    batch = _responses(responses)
+
+    start = time.perf_counter()
+    for data, asin in batch:
+        _legacy_parse(data, asin)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = parse_amazon_batch(batch, 'ES')
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "benchmark": "amazon_parser",
+        "responses": responses,
+        "corpus_cases": len(PRICE_CORPUS) + len(RATING_CORPUS) + len(REVIEWS_CORPUS) + len(STOCK_CORPUS),
+        "corpus_failures": failures,
+        "parsed": sum(1 for item in parsed if item is not None),
+        "legacy_seconds": round(legacy_seconds, 4),
+        "batch_seconds": round(batch_seconds, 4),
+        "legacy_responses_per_second": round(responses / legacy_seconds, 1),
+        "batch_responses_per_second": round(responses / batch_seconds, 1),
+        "speedup": round(legacy_seconds / batch_seconds, 2)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--responses', type=int, default=200000)
+    args = parser.parse_args()
+
+    # Mismo nivel que el servicio (INFO); la salida de logs se descarta
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+    result = run(args.responses)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(1 if result["corpus_failures"] else 0)
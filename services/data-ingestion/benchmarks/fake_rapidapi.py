@@ -0,0 +1,187 @@
+"""Servidor local que imita el endpoint product-details de RapidAPI
+
+Respuestas deterministas por ASIN con latencia configurable e inyección de
+errores 429 (con Retry-After), para medir la ingesta sin gastar cuota.
+
+Uso: python benchmarks/fake_rapidapi.py --port 8089 --latency-ms 120 --rate-429 0.05
+     RAPIDAPI_BASE_URL=http://127.0.0.1:8089 python app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+BRANDS = ['Amazon', 'Logitech', 'Samsung', 'Sony', 'Xiaomi', 'Philips', 'Anker', 'Bosch']
+NOUNS = ['Altavoz inteligente', 'Ratón inalámbrico', 'Auriculares Bluetooth', 'Cargador USB-C',
+         'Teclado mecánico', 'Monitor 27"', 'Cepillo eléctrico', 'Batería externa']
+
+COUNTRY_FORMATS = {
+    'ES': ('{} €', ',', 'EUR', 'amazon.es', 'En stock'),
+    'DE': ('{} €', ',', 'EUR', 'amazon.de', 'Auf Lager'),
+    'FR': ('{} €', ',', 'EUR', 'amazon.fr', 'En stock'),
+    'IT': ('{} €', ',', 'EUR', 'amazon.it', 'Disponibilità immediata'),
+    'US': ('${}', '.', 'USD', 'amazon.com', 'In Stock'),
+    'UK': ('£{}', '.', 'GBP', 'amazon.co.uk', 'In stock'),
+    'GB': ('£{}', '.', 'GBP', 'amazon.co.uk', 'In stock'),
+}
+
+
+def _format_price(value: float, country: str) -> str:
+    template, decimal, _, _, _ = COUNTRY_FORMATS.get(country, COUNTRY_FORMATS['ES'])
+    number = f"{value:,.2f}"
+    if decimal == ',':
+        # 1,234.56 -> 1.234,56
+        number = number.replace(',', '_').replace('.', ',').replace('_', '.')
+    return template.format(number)
+
+
+def product_payload(asin: str, country: str = 'ES', price_drift: float = 0.0) -> Dict:
+    """Respuesta realista de product-details, estable para un mismo ASIN"""
+    seed = int(hashlib.md5(asin.encode()).hexdigest()[:12], 16)
+    rng = random.Random(seed)
+    country = country.upper() if country.upper() in COUNTRY_FORMATS else 'ES'
+    _, _, currency, domain, in_stock_text = COUNTRY_FORMATS[country]
+
+    base_price = round(rng.uniform(9, 1500), 2)
+    price = round(base_price * (1 + price_drift), 2)
+    available = rng.random() > 0.1
+    rating = round(rng.uniform(3.0, 5.0), 1)
+    ratings = rng.randint(0, 250000)
+    brand = rng.choice(BRANDS)
+    title = f"{brand} {rng.choice(NOUNS)} modelo {rng.randint(100, 9999)} - edición {rng.randint(2019, 2025)}"
+
+    return {
+        "status": "OK",
+        "request_id": f"fake-{asin}-{int(time.time() * 1000)}",
+        "parameters": {"asin": asin, "country": country},
+        "data": {
+            "asin": asin,
+            "product_title": title,
+            "product_price": _format_price(price, country),
+            "product_original_price": _format_price(round(price * 1.2, 2), country),
+            "currency": currency,
+            "country": country,
+            "product_star_rating": f"{rating}".replace('.', ',') if country in ('ES', 'DE', 'FR', 'IT') else f"{rating}",
+            "product_num_ratings": ratings,
+            "product_url": f"https://www.{domain}/dp/{asin}",
+            "product_photo": f"https://m.media-amazon.com/images/I/{asin}.jpg",
+            "product_photos": [f"https://m.media-amazon.com/images/I/{asin}-{i}.jpg" for i in range(5)],
+            "product_availability": in_stock_text if available else "No disponible",
+            "is_best_seller": rng.random() < 0.05,
+            "is_amazon_choice": rng.random() < 0.1,
+            "is_prime": rng.random() < 0.7,
+            "sales_volume": f"{rng.randint(1, 50)}K+ comprados el mes pasado",
+            "about_product": [f"Característica {i}: " + "lorem ipsum " * 12 for i in range(6)],
+            "product_information": {
+                "Brand": brand,
+                "Número de modelo del producto": f"M{rng.randint(1000, 99999)}",
+                "Peso del producto": f"{rng.randint(50, 5000)} g",
+                "ASIN": asin
+            },
+            "product_details": {"Fabricante": brand, "Dimensiones": "10 x 10 x 5 cm"},
+            "category_path": [{"id": str(rng.randint(1, 10**9)), "name": "Electrónica"}]
+        }
+    }
+
+
+class FakeRapidAPIState:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_429: float = 0.0,
+                 retry_after: float = 1.0, price_change_rate: float = 0.0, seed: int = 42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.price_change_rate = price_change_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "200": 0, "429": 0, "404": 0}
+
+    def decide(self) -> Tuple[bool, float, float]:
+        """(responder 429, latencia en segundos, variación de precio)"""
+        with self._lock:
+            self.counts["requests"] += 1
+            throttle = self._rng.random() < self.rate_429
+            latency = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            drift = self._rng.uniform(-0.1, 0.1) if self._rng.random() < self.price_change_rate else 0.0
+        return throttle, latency, drift
+
+    def count(self, status: int):
+        with self._lock:
+            self.counts[str(status)] = self.counts.get(str(status), 0) + 1
+
+
+def _make_handler(state: FakeRapidAPIState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status: int, body: Dict, headers: Dict = None):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+            state.count(status)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/product-details':
+                self._send(404, {"status": "ERROR", "message": "Not found"})
+                return
+            params = parse_qs(url.query)
+            asin = params.get('asin', [''])[0]
+            country = params.get('country', ['ES'])[0]
+
+            throttle, latency, drift = state.decide()
+            if latency:
+                time.sleep(latency)
+            if throttle:
+                self._send(429, {"message": "Too many requests"}, {"Retry-After": str(state.retry_after)})
+                return
+            self._send(200, product_payload(asin, country, drift))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_server(host: str = '127.0.0.1', port: int = 0, **options):
+    """Arrancar el servidor en un hilo. Devuelve (server, state, base_url)"""
+    state = FakeRapidAPIState(**options)
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-rapidapi', daemon=True).start()
+    return server, state, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Probabilidad de responder 429')
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--price-change-rate', type=float, default=0.0,
+                        help='Probabilidad de que el precio de una respuesta varíe')
+    args = parser.parse_args()
+
+    server, state, base_url = start_fake_server(
+        args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429, retry_after=args.retry_after, price_change_rate=args.price_change_rate
+    )
+    print(f"Fake RapidAPI escuchando en {base_url}/product-details")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(state.counts))
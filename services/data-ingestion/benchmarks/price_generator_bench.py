@@ -0,0 +1,68 @@
+"""Benchmark: generación de precios por producto vs por lotes (NumPy)
+
+Uso: python benchmarks/price_generator_bench.py --products 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from services.price_generator import PriceGenerator
+
+CATEGORIES = ["shoes", "clothing", "electronics"]
+
+
+def _strip_timestamps(rows):
+    return [[{k: v for k, v in price.items() if k != "lastUpdated"} for price in row] for row in rows]
+
+
+def run(products: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    names = [f"Producto {i} modelo {rng.randint(1, 10**6)}" for i in range(products)]
+    base_prices = [round(rng.uniform(5, 500), 2) for _ in range(products)]
+    categories = [rng.choice(CATEGORIES) for _ in range(products)]
+
+    generator = PriceGenerator()
+
+    start = time.perf_counter()
+    per_item = [
+        generator.generate_prices_for_product(name, price, category)
+        for name, price, category in zip(names, base_prices, categories)
+    ]
+    per_item_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = generator.generate_prices_batch(names, base_prices, categories)
+    batch_seconds = time.perf_counter() - start
+
+    # Solo el núcleo NumPy (sin construir diccionarios)
+    start = time.perf_counter()
+    generator.generate_price_matrix(names, base_prices)
+    matrix_seconds = time.perf_counter() - start
+
+    identical = _strip_timestamps(per_item) == _strip_timestamps(batch)
+
+    return {
+        "benchmark": "price_generator",
+        "products": products,
+        "per_item_seconds": round(per_item_seconds, 4),
+        "batch_seconds": round(batch_seconds, 4),
+        "matrix_seconds": round(matrix_seconds, 4),
+        "per_item_products_per_second": round(products / per_item_seconds, 1),
+        "batch_products_per_second": round(products / batch_seconds, 1),
+        "speedup": round(per_item_seconds / batch_seconds, 2),
+        "identical_output": identical
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=100000)
+    args = parser.parse_args()
+
+    result = run(args.products)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["identical_output"] else 1)
@@ -0,0 +1,309 @@
+"""Suite de benchmarks de ingesta sin cuota de RapidAPI
+
+Ejecuta contra el servidor falso de benchmarks/fake_rapidapi.py:
+  - ingestion:       ProductScraper.update_all_tracked_products (fetch + parse + escrituras)
+  - comparator:      rutas /api/comparator/* con el cliente de pruebas de Flask
+                     y el refresco masivo del catálogo
+  - price_generator: benchmarks/price_generator_bench.py
+  - amazon_parser:   benchmarks/amazon_parser_bench.py
+
+MongoDB: --mongo-uri mongodb://... para un servidor local o mongomock:// (por
+defecto) para una base de datos en memoria: la suite inyecta un cliente de
+mongomock (pip install mongomock) antes de importar app. Los productos trackeados salen de
+PostgreSQL solo con --postgres; si no, se sirven desde una lista en memoria.
+
+Uso: python benchmarks/suite.py --products 500 --latency-ms 80 --rate-429 0.02 -o bench.json
+     python benchmarks/suite.py --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _latency_summary(seconds):
+    millis = [value * 1000 for value in seconds]
+    return {
+        "count": len(millis),
+        "p50_ms": round(_percentile(millis, 50), 3),
+        "p95_ms": round(_percentile(millis, 95), 3),
+        "mean_ms": round(statistics.fmean(millis), 3) if millis else 0.0
+    }
+
+
+class StaticTrackedProducts:
+    """Sustituto en memoria del pool PostgreSQL para la consulta de productos trackeados"""
+
+    def __init__(self, external_ids):
+        self.rows = [(external_id, 'amazon') for external_id in external_ids]
+
+    @contextmanager
+    def connection(self, timeout=None):
+        yield self
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+# ===================================
+# BENCHMARKS
+# ===================================
+
+def bench_ingestion(app_module, fake_state, products, use_postgres):
+    external_ids = [f"B{index:09d}" for index in range(products)]
+    if not use_postgres:
+        app_module.postgres_pool = StaticTrackedProducts(external_ids)
+
+    scraper = app_module.ProductScraper('benchmark')
+    before = dict(fake_state.counts)
+    started = time.perf_counter()
+    summary = scraper.update_all_tracked_products() or {}
+    elapsed = time.perf_counter() - started
+
+    requests_made = fake_state.counts["requests"] - before["requests"]
+    throttled = fake_state.counts.get("429", 0) - before.get("429", 0)
+    return {
+        "products": summary.get("success", 0) + summary.get("errors", 0),
+        "success": summary.get("success", 0),
+        "errors": summary.get("errors", 0),
+        "elapsed_seconds": round(elapsed, 3),
+        "products_per_second": round(products / elapsed, 2) if elapsed > 0 else 0.0,
+        "api_requests": requests_made,
+        "api_429": throttled,
+        "rate_limiter": scraper.rate_limiter.stats()
+    }
+
+
+def bench_comparator(app_module, products, chunk_size):
+    from services.comparator_refresh import refresh_all_comparator_prices
+
+    client = app_module.app.test_client()
+    timings = {"create": [], "list_page": [], "detail": [], "refresh_one": []}
+    product_ids = []
+
+    for index in range(products):
+        payload = {
+            "sku": f"BENCH-{index:07d}",
+            "name": f"Producto comparador {index}",
+            "brand": "Marca",
+            "category": ("shoes", "clothing", "electronics")[index % 3],
+            "basePrice": 10 + (index % 490)
+        }
+        started = time.perf_counter()
+        response = client.post('/api/comparator/products', json=payload)
+        timings["create"].append(time.perf_counter() - started)
+        if response.status_code == 201:
+            product_ids.append(payload["sku"])
+
+    cursor = None
+    pages = 0
+    while True:
+        url = '/api/comparator/products?limit=50' + (f'&cursor={cursor}' if cursor else '')
+        started = time.perf_counter()
+        body = client.get(url).get_json() or {}
+        timings["list_page"].append(time.perf_counter() - started)
+        pages += 1
+        cursor = body.get("nextCursor")
+        if not cursor:
+            break
+
+    for product_id in product_ids[:200]:
+        started = time.perf_counter()
+        client.get(f'/api/comparator/products/{product_id}')
+        timings["detail"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        client.post(f'/api/comparator/products/{product_id}/refresh-prices')
+        timings["refresh_one"].append(time.perf_counter() - started)
+
+    bulk = refresh_all_comparator_prices(app_module.mongo_db, chunk_size)
+
+    result = {name: _latency_summary(values) for name, values in timings.items()}
+    result.update({
+        "products": len(product_ids),
+        "pages": pages,
+        "bulk_refresh": {
+            "status": bulk.get("status"),
+            "processed": bulk.get("processed"),
+            "elapsed_seconds": bulk.get("elapsedSeconds"),
+            "products_per_second": bulk.get("productsPerSecond")
+        }
+    })
+    return result
+
+
+# ===================================
+# REGRESIONES
+# ===================================
+
+# (ruta dentro del resultado, True si más alto es mejor)
+REGRESSION_METRICS = [
+    (("ingestion", "products_per_second"), True),
+    (("comparator", "bulk_refresh", "products_per_second"), True),
+    (("comparator", "create", "p95_ms"), False),
+    (("comparator", "list_page", "p95_ms"), False),
+    (("price_generator", "batch_products_per_second"), True),
+    (("amazon_parser", "batch_responses_per_second"), True),
+]
+
+
+def _lookup(results, path):
+    value = results
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results, baseline, tolerance):
+    """Métricas que empeoran más de `tolerance` (fracción) respecto a la línea base"""
+    regressions = []
+    for path, higher_is_better in REGRESSION_METRICS:
+        current = _lookup(results["benchmarks"], path)
+        previous = _lookup(baseline.get("benchmarks", {}), path)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append({
+                "metric": ".".join(path),
+                "baseline": previous,
+                "current": current,
+                "change": round(change, 4)
+            })
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=300, help='Productos trackeados (ingesta)')
+    parser.add_argument('--comparator-products', type=int, default=1000)
+    parser.add_argument('--generator-products', type=int, default=20000)
+    parser.add_argument('--parser-responses', type=int, default=50000)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=100.0, help='RAPIDAPI_RATE_LIMIT (req/s)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--mongo-uri', default='mongomock://')
+    parser.add_argument('--mongo-db', default='smartshop_bench')
+    parser.add_argument('--postgres', action='store_true', help='Leer los productos trackeados de PostgreSQL')
+    parser.add_argument('--only', nargs='*', choices=['ingestion', 'comparator', 'price_generator', 'amazon_parser'])
+    parser.add_argument('--baseline', help='JSON de una ejecución anterior para detectar regresiones')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('-o', '--output', help='Fichero JSON de salida (por defecto stdout)')
+    args = parser.parse_args()
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    sys.path.append(os.path.dirname(__file__))
+    from fake_rapidapi import start_fake_server
+
+    server, fake_state, base_url = start_fake_server(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_429=args.rate_429, retry_after=0.2
+    )
+
+    # La configuración se lee al importar config.py: hay que fijarla antes de importar app
+    os.environ.update({
+        'RAPIDAPI_BASE_URL': base_url,
+        'RAPIDAPI_KEY': 'benchmark',
+        'RAPIDAPI_RATE_LIMIT': str(args.rate_limit),
+        'RAPIDAPI_BURST': str(max(1, int(args.rate_limit))),
+        'INGESTION_MAX_WORKERS': str(args.workers),
+        'MONGO_URI': args.mongo_uri,
+        'MONGO_DB': args.mongo_db,
+        'MONGO_ENSURE_INDEXES': 'True' if not args.mongo_uri.startswith('mongomock://') else 'False',
+        'SCHEDULER_ENABLED': 'False',
+        # Cada ejecución debe llegar al servidor falso
+        'RAPIDAPI_CACHE_ENABLED': 'False',
+        # Sin PostgreSQL no hay alertas que evaluar
+        'ALERTS_ENABLED': 'True' if args.postgres else 'False',
+        'COMPARATOR_REFRESH_HOURS': '0',
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+    })
+
+    if args.mongo_uri.startswith('mongomock://'):
+        # MongoDB en memoria: el servicio usa el cliente inyectado en lugar de conectarse
+        import mongomock
+        from database.mongodb import set_mongodb_client
+        set_mongodb_client(mongomock.MongoClient())
+
+    import app as app_module
+    import amazon_parser_bench
+    import price_generator_bench
+
+    selected = set(args.only or ['ingestion', 'comparator', 'price_generator', 'amazon_parser'])
+    benchmarks = {}
+    if 'ingestion' in selected:
+        benchmarks["ingestion"] = bench_ingestion(app_module, fake_state, args.products, args.postgres)
+    if 'comparator' in selected:
+        benchmarks["comparator"] = bench_comparator(app_module, args.comparator_products, 500)
+    if 'price_generator' in selected:
+        benchmarks["price_generator"] = price_generator_bench.run(args.generator_products)
+    if 'amazon_parser' in selected:
+        benchmarks["amazon_parser"] = amazon_parser_bench.run(args.parser_responses)
+    server.shutdown()
+
+    results = {
+        "suite": "data-ingestion",
+        "generated_at": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+        "fake_rapidapi": fake_state.counts,
+        "benchmarks": benchmarks
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as handle:
+            results["regressions"] = compare(results, json.load(handle), args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+    if benchmarks.get("price_generator", {}).get("identical_output") is False:
+        exit_code = 1
+    if benchmarks.get("amazon_parser", {}).get("corpus_failures"):
+        exit_code = 1
+
+    output = json.dumps(results, indent=2, ensure_ascii=False, default=str)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
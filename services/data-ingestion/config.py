@@ -9,9 +9,93 @@ class Config:
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5000))
     
+    # Logging
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    # 'text' (formato clásico) o 'json' (un registro estructurado por línea)
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+    LOG_ASYNC = os.getenv('LOG_ASYNC', 'True') == 'True'
+    # Fracción de registros de éxito por producto que se emiten (errores siempre)
+    LOG_SUCCESS_SAMPLE_RATE = float(os.getenv('LOG_SUCCESS_SAMPLE_RATE', 1.0))
+    
     # MongoDB
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://mongodb:27017')
     MONGO_DB = os.getenv('MONGO_DB', 'smartshop')
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    # Lista separada por comas en orden de preferencia, p.ej. 'zstd,snappy,zlib'
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+    MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+    # Endpoints de solo lectura (listados, detalle, stats, exportación)
+    MONGO_READ_ONLY_PREFERENCE = os.getenv('MONGO_READ_ONLY_PREFERENCE', 'secondaryPreferred')
+    MONGO_WRITE_BATCH_SIZE = int(os.getenv('MONGO_WRITE_BATCH_SIZE', 500))
+    MONGO_WRITE_BATCH_LATENCY = float(os.getenv('MONGO_WRITE_BATCH_LATENCY', 2.0))
+    MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', 'True') == 'True'
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 60))
+    # Caché en memoria del detalle de producto (respuestas ya serializadas)
+    DETAIL_CACHE_ENABLED = os.getenv('DETAIL_CACHE_ENABLED', 'True') == 'True'
+    DETAIL_CACHE_TTL = float(os.getenv('DETAIL_CACHE_TTL', 30))
+    DETAIL_CACHE_MAX_ENTRIES = int(os.getenv('DETAIL_CACHE_MAX_ENTRIES', 2000))
+    DETAIL_CACHE_MAX_BYTES = int(os.getenv('DETAIL_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
+    # Paginación de listados (el comparador solo pagina si se pide limit o cursor)
+    PAGINATION_DEFAULT_LIMIT = int(os.getenv('PAGINATION_DEFAULT_LIMIT', 50))
+    PAGINATION_MAX_LIMIT = int(os.getenv('PAGINATION_MAX_LIMIT', 200))
+    
+    # Trabajos en segundo plano lanzados desde la API (estado consultable)
+    JOBS_HISTORY_SIZE = int(os.getenv('JOBS_HISTORY_SIZE', 50))
+    
+    # Scheduler (desactivable para benchmarks y ejecuciones puntuales)
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'True') == 'True'
+    
+    # Refresco de precios: 'fixed' (todo cada hora, por defecto) o 'adaptive' (cola de prioridad, opt-in)
+    REFRESH_STRATEGY = os.getenv('REFRESH_STRATEGY', 'fixed')
+    REFRESH_TICK_SECONDS = int(os.getenv('REFRESH_TICK_SECONDS', 60))
+    # 0 = según RAPIDAPI_RATE_LIMIT * REFRESH_TICK_SECONDS
+    REFRESH_MAX_PER_TICK = int(os.getenv('REFRESH_MAX_PER_TICK', 0))
+    REFRESH_BASE_INTERVAL_MINUTES = float(os.getenv('REFRESH_BASE_INTERVAL_MINUTES', 360))
+    REFRESH_MIN_INTERVAL_MINUTES = float(os.getenv('REFRESH_MIN_INTERVAL_MINUTES', 15))
+    REFRESH_MAX_INTERVAL_MINUTES = float(os.getenv('REFRESH_MAX_INTERVAL_MINUTES', 1440))
+    REFRESH_VOLATILITY_WEIGHT = float(os.getenv('REFRESH_VOLATILITY_WEIGHT', 1.0))
+    REFRESH_FOLLOWER_WEIGHT = float(os.getenv('REFRESH_FOLLOWER_WEIGHT', 0.5))
+    REFRESH_ALERT_WEIGHT = float(os.getenv('REFRESH_ALERT_WEIGHT', 1.0))
+    REFRESH_VOLATILITY_DAYS = int(os.getenv('REFRESH_VOLATILITY_DAYS', 7))
+    REFRESH_SIGNALS_MINUTES = int(os.getenv('REFRESH_SIGNALS_MINUTES', 15))
+    
+    # Alertas evaluadas durante la ingesta (opt-in: usa la tabla alerts de services/analytics/init-db.sql)
+    ALERTS_ENABLED = os.getenv('ALERTS_ENABLED', 'False') == 'True'
+    ALERTS_REFRESH_SECONDS = float(os.getenv('ALERTS_REFRESH_SECONDS', 30))
+    ALERTS_FULL_RELOAD_SECONDS = float(os.getenv('ALERTS_FULL_RELOAD_SECONDS', 600))
+    ALERTS_FLUSH_SIZE = int(os.getenv('ALERTS_FLUSH_SIZE', 100))
+    
+    # Eventos de cambios de precio (SSE / long-poll)
+    # Fuente: 'ingestion' (escrituras de este proceso) o 'change_stream' (MongoDB con replica set)
+    EVENTS_SOURCE = os.getenv('EVENTS_SOURCE', 'ingestion')
+    EVENTS_HISTORY_SIZE = int(os.getenv('EVENTS_HISTORY_SIZE', 1000))
+    EVENTS_SUBSCRIBER_QUEUE = int(os.getenv('EVENTS_SUBSCRIBER_QUEUE', 500))
+    # Último precio/stock recordado por producto (LRU) para detectar cambios
+    EVENTS_STATE_MAX_PRODUCTS = int(os.getenv('EVENTS_STATE_MAX_PRODUCTS', 100000))
+    EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_LONG_POLL_TIMEOUT = float(os.getenv('EVENTS_LONG_POLL_TIMEOUT', 25))
+    
+    # Refresco masivo del comparador: cada cuántas horas (0 = solo bajo demanda)
+    COMPARATOR_REFRESH_HOURS = int(os.getenv('COMPARATOR_REFRESH_HOURS', 0))
+    COMPARATOR_REFRESH_CHUNK_SIZE = int(os.getenv('COMPARATOR_REFRESH_CHUNK_SIZE', 1000))
+    COMPARATOR_REFRESH_MAX_CHUNK_SIZE = int(os.getenv('COMPARATOR_REFRESH_MAX_CHUNK_SIZE', 5000))
+    
+    # Histórico de precios: 'full' (un documento por observación) o 'changes' (solo cambios)
+    PRICE_HISTORY_MODE = os.getenv('PRICE_HISTORY_MODE', 'full')
+    PRICE_HISTORY_COMPACTION_HOURS = int(os.getenv('PRICE_HISTORY_COMPACTION_HOURS', 0))
+    # Series (producto, país) cuyo último punto se mantiene en memoria en modo 'changes'
+    PRICE_HISTORY_MAX_HEADS = int(os.getenv('PRICE_HISTORY_MAX_HEADS', 100000))
+    # Motor: 'documents' (price_history), 'buckets' (price_history_buckets) o 'timeseries' (price_history_ts)
+    PRICE_HISTORY_STORAGE = os.getenv('PRICE_HISTORY_STORAGE', 'documents')
+    # El servicio analytics (Node) lee y escribe `price_history` directamente:
+    # mientras sea True solo se admite 'documents' y los otros motores se ignoran
+    PRICE_HISTORY_SHARED_WITH_ANALYTICS = os.getenv('PRICE_HISTORY_SHARED_WITH_ANALYTICS', 'True') == 'True'
+    PRICE_HISTORY_BUCKET = os.getenv('PRICE_HISTORY_BUCKET', 'day')
+    PRICE_HISTORY_BUCKET_MAX_POINTS = int(os.getenv('PRICE_HISTORY_BUCKET_MAX_POINTS', 1000))
     
     # PostgreSQL
     POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'postgres')
@@ -19,9 +103,46 @@ class Config:
     POSTGRES_DB = os.getenv('POSTGRES_DB', 'smartshop')
     POSTGRES_USER = os.getenv('POSTGRES_USER', 'admin')
     POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'admin123')
+    POSTGRES_POOL_MIN = int(os.getenv('POSTGRES_POOL_MIN', 1))
+    POSTGRES_POOL_MAX = int(os.getenv('POSTGRES_POOL_MAX', 5))
+    POSTGRES_POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', 5.0))
+    POSTGRES_POOL_VALIDATE_AFTER = float(os.getenv('POSTGRES_POOL_VALIDATE_AFTER', 30.0))
+    POSTGRES_CONNECT_TIMEOUT = int(os.getenv('POSTGRES_CONNECT_TIMEOUT', 5))
     
     # RapidAPI
     RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY', '')
+    # Sustituible por un servidor local (benchmarks/fake_rapidapi.py)
+    RAPIDAPI_BASE_URL = os.getenv('RAPIDAPI_BASE_URL', 'https://real-time-amazon-data.p.rapidapi.com')
+    RAPIDAPI_RATE_LIMIT = float(os.getenv('RAPIDAPI_RATE_LIMIT', 5))
+    RAPIDAPI_BURST = int(os.getenv('RAPIDAPI_BURST', 10))
+    RAPIDAPI_MAX_RETRIES = int(os.getenv('RAPIDAPI_MAX_RETRIES', 3))
+    # Caché local (SQLite) de respuestas product-details (opt-in: sirve datos de hasta TTL
+    # segundos a los refrescos programados; las actualizaciones manuales no la leen)
+    RAPIDAPI_CACHE_ENABLED = os.getenv('RAPIDAPI_CACHE_ENABLED', 'False') == 'True'
+    RAPIDAPI_CACHE_PATH = os.getenv('RAPIDAPI_CACHE_PATH', '/tmp/smartshop/rapidapi_cache.sqlite3')
+    RAPIDAPI_CACHE_TTL = float(os.getenv('RAPIDAPI_CACHE_TTL', 600))
+    RAPIDAPI_CACHE_MAX_ENTRIES = int(os.getenv('RAPIDAPI_CACHE_MAX_ENTRIES', 50000))
+    
+    # Ingesta concurrente
+    INGESTION_MAX_WORKERS = int(os.getenv('INGESTION_MAX_WORKERS', 8))
+    # Países de Amazon: los que refresca la ingesta y los de la comparación entre países
+    INGESTION_COUNTRIES = [c.strip().upper() for c in os.getenv('INGESTION_COUNTRIES', 'ES').split(',') if c.strip()]
+    AMAZON_COMPARE_COUNTRIES = [
+        c.strip().upper() for c in os.getenv('AMAZON_COMPARE_COUNTRIES', 'ES,DE,FR,IT,UK').split(',') if c.strip()
+    ]
+    # 'local' (cada réplica refresca todo) o 'distributed' (lotes repartidos con leases en MongoDB)
+    INGESTION_MODE = os.getenv('INGESTION_MODE', 'local')
+    INGESTION_WORKER_ID = os.getenv('INGESTION_WORKER_ID', '')
+    INGESTION_LEASE_SECONDS = float(os.getenv('INGESTION_LEASE_SECONDS', 300))
+    INGESTION_LEASE_BATCH_SIZE = int(os.getenv('INGESTION_LEASE_BATCH_SIZE', 50))
+    INGESTION_LEASE_RETENTION_HOURS = float(os.getenv('INGESTION_LEASE_RETENTION_HOURS', 48))
+    
+    # Cliente HTTP (pool keep-alive)
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 4))
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', max(INGESTION_MAX_WORKERS, 10)))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 15))
     
     @property
     def POSTGRES_URI(self):
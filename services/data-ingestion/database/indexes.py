@@ -0,0 +1,186 @@
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+logger = logging.getLogger(__name__)
+
+# ===================================
+# ÍNDICES REQUERIDOS POR EL SERVICIO
+# ===================================
+# Cada entrada: colección -> lista de (claves, opciones)
+
+REQUIRED_INDEXES: Dict[str, List] = {
+    'products': [
+        ([('external_id', 1)], {}),
+        ([('marketplace', 1), ('category', 1), ('_id', 1)], {}),
+        ([('category', 1), ('_id', 1)], {}),
+    ],
+    'price_history': [
+        ([('product_id', 1), ('timestamp', -1)], {}),
+        # Una serie por (asin, país)
+        ([('product_id', 1), ('country', 1), ('timestamp', -1)], {}),
+    ],
+    'product_offers': [
+        ([('external_id', 1), ('country', 1)], {'unique': True}),
+    ],
+    'reviews': [
+        ([('product_id', 1), ('date', -1)], {}),
+    ],
+    'comparator_products': [
+        ([('productId', 1)], {}),
+        ([('createdAt', -1), ('_id', -1)], {}),
+        ([('category', 1), ('createdAt', -1), ('_id', -1)], {}),
+        ([('brand', 1), ('createdAt', -1), ('_id', -1)], {}),
+    ],
+    'comparator_price_history': [
+        ([('productId', 1), ('timestamp', -1)], {}),
+    ],
+    'ingestion_leases': [
+        ([('run_id', 1), ('status', 1), ('batch', 1)], {}),
+        # TTL: las ejecuciones antiguas se borran solas
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+    ],
+}
+
+# Colecciones que solo existen con un motor de histórico concreto
+STORAGE_INDEXES: Dict[str, Dict[str, List]] = {
+    'buckets': {
+        'price_history_buckets': [
+            ([('product_id', 1), ('bucket', -1), ('first_ts', -1)], {}),
+            ([('product_id', 1), ('country', 1), ('bucket', -1), ('first_ts', -1)], {}),
+        ],
+    },
+}
+
+# Formas de consulta que el servicio ejecuta: (colección, filtro, orden)
+QUERY_SHAPES = [
+    ('products', {'external_id': 'B08N5WRWNW'}, None),
+    ('products', {'marketplace': 'amazon'}, [('_id', 1)]),
+    ('products', {'category': 'electronics'}, [('_id', 1)]),
+    ('products', {'marketplace': 'amazon', 'category': 'electronics'}, [('_id', 1)]),
+    ('price_history', {'product_id': 'B08N5WRWNW'}, [('timestamp', -1)]),
+    ('price_history', {'product_id': 'B08N5WRWNW', 'country': 'DE'}, [('timestamp', -1)]),
+    ('product_offers', {'external_id': 'B08N5WRWNW'}, None),
+    ('reviews', {'product_id': 'B08N5WRWNW'}, [('date', -1)]),
+    ('comparator_products', {'productId': 'PROD-1'}, None),
+    ('comparator_products', {}, [('createdAt', -1), ('_id', -1)]),
+    ('comparator_products', {'category': 'shoes'}, [('createdAt', -1), ('_id', -1)]),
+    ('comparator_products', {'brand': 'Nike'}, [('createdAt', -1), ('_id', -1)]),
+    ('comparator_price_history', {'productId': 'PROD-1'}, None),
+    ('ingestion_leases', {'run_id': '2024-01-01T10:00', 'status': 'pending'}, [('batch', 1)]),
+]
+
+STORAGE_QUERY_SHAPES = {
+    'buckets': [
+        ('price_history_buckets', {'product_id': 'B08N5WRWNW'}, [('bucket', -1), ('first_ts', -1)]),
+        ('price_history_buckets', {'product_id': 'B08N5WRWNW', 'country': 'DE'}, [('bucket', -1), ('first_ts', -1)]),
+    ],
+}
+
+
+def _covers(existing: Dict, required_key: List, options: Dict) -> bool:
+    """¿Cubre el índice existente (entrada de list_indexes) al requerido?
+
+    Sin opciones basta con que el requerido sea prefijo de sus claves. Un
+    índice único o TTL tiene que coincidir exactamente en claves y opción, y
+    un índice parcial solo cubre a otro con el mismo filtro.
+    """
+    existing_key = list(existing['key'].items())
+    if existing.get('partialFilterExpression') != options.get('partialFilterExpression'):
+        return False
+    if options.get('unique'):
+        return existing_key == list(required_key) and bool(existing.get('unique'))
+    if 'expireAfterSeconds' in options:
+        return existing_key == list(required_key) and existing.get('expireAfterSeconds') == options['expireAfterSeconds']
+    return existing_key[:len(required_key)] == list(required_key)
+
+
+def ensure_indexes(db, storage: str = 'documents') -> Dict:
+    """Crear en segundo plano los índices requeridos que falten
+
+    Un fallo al crear un índice (duplicados que impiden un único, conflicto
+    de opciones con un índice existente...) se registra y no detiene el resto.
+    """
+    created = []
+    failed = []
+    existing_count = 0
+    required = dict(REQUIRED_INDEXES)
+    required.update(STORAGE_INDEXES.get(storage, {}))
+    for collection, indexes in required.items():
+        current = list(db[collection].list_indexes())
+        for keys, options in indexes:
+            if any(_covers(existing, keys, options) for existing in current):
+                existing_count += 1
+                continue
+            try:
+                name = db[collection].create_index(keys, background=True, **options)
+            except Exception as e:
+                failed.append({'collection': collection, 'keys': keys, 'options': options, 'error': str(e)})
+                logger.error("❌ No se pudo crear el índice %s %s %s: %s", collection, keys, options, e)
+                continue
+            created.append(f"{collection}.{name}")
+            logger.info("🗂️ Índice creado: %s.%s", collection, name)
+
+    logger.info(
+        "✅ Índices verificados: %s existentes, %s creados, %s fallidos", existing_count, len(created), len(failed)
+    )
+    return {'existing': existing_count, 'created': created, 'failed': failed}
+
+
+def _winning_stages(plan: Dict) -> List[str]:
+    stages = []
+    while plan:
+        stages.append(plan.get('stage'))
+        if 'inputStage' in plan:
+            plan = plan['inputStage']
+        elif plan.get('inputStages'):
+            for child in plan['inputStages']:
+                stages.extend(_winning_stages(child))
+            break
+        else:
+            break
+    return stages
+
+
+def find_collection_scans(db, storage: str = 'documents') -> List[Dict]:
+    """Ejecutar explain sobre cada forma de consulta y devolver las que hacen COLLSCAN"""
+    scans = []
+    for collection, query, sort in QUERY_SHAPES + STORAGE_QUERY_SHAPES.get(storage, []):
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explain = cursor.limit(1).explain()
+        except Exception as e:
+            logger.warning("⚠️ No se pudo ejecutar explain en %s: %s", collection, e)
+            continue
+        winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+        # Con el motor SBE (MongoDB 7) el plan viene anidado en 'queryPlan'
+        stages = _winning_stages(winning_plan.get('queryPlan', winning_plan))
+        if 'COLLSCAN' in stages:
+            scans.append({'collection': collection, 'filter': list(query.keys()),
+                          'sort': sort, 'stages': stages})
+            logger.warning("⚠️ COLLSCAN en %s filtro=%s orden=%s", collection, list(query.keys()), sort)
+    return scans
+
+
+if __name__ == '__main__':
+    from config import config
+    from database.mongodb import get_mongodb
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Provisión de índices MongoDB')
+    parser.add_argument('--check-only', action='store_true', help='Solo informar, no crear índices')
+    args = parser.parse_args()
+
+    db = get_mongodb()
+    storage = configured_storage()
+    failed = []
+    if not args.check_only:
+        failed = ensure_indexes(db, storage)['failed']
+    scans = find_collection_scans(db, storage)
+    sys.exit(1 if scans or failed else 0)
@@ -0,0 +1,118 @@
+import base64
+import re
+from typing import Dict, List, Optional, Tuple
+
+from bson import json_util
+
+FIELD_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$')
+
+
+class PaginationError(ValueError):
+    """Parámetros de paginación o proyección no válidos"""
+
+
+def encode_cursor(values: Dict) -> str:
+    """Cursor opaco (base64 url-safe) con los valores de ordenación del último documento"""
+    raw = json_util.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Dict:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise PaginationError('Cursor no válido')
+    if not isinstance(values, dict):
+        raise PaginationError('Cursor no válido')
+    return values
+
+
+def _after(field: str, direction: int, value) -> Optional[Dict]:
+    """Condición 'estrictamente después de value' en un campo de la ordenación
+
+    MongoDB ordena null/ausente por debajo de cualquier valor: en orden
+    descendente van al final y en ascendente al principio. None significa que
+    ningún documento va detrás en ese campo.
+    """
+    if direction < 0:
+        if value is None:
+            return None
+        return {'$or': [{field: {'$lt': value}}, {field: None}]}
+    if value is None:
+        return {field: {'$ne': None}}
+    return {field: {'$gt': value}}
+
+
+def keyset_filter(sort: List[Tuple[str, int]], values: Dict) -> Dict:
+    """Filtro 'después de' para una ordenación compuesta (keyset pagination)
+
+    Para [(a, -1), (_id, -1)] genera:
+    {'$or': [{a: {'$lt': va}}, {a: va, _id: {'$lt': vid}}]}
+    Los documentos sin `a` (valor null en el cursor) se desempatan solo por _id.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        if field not in values:
+            raise PaginationError('Cursor no válido')
+        after = _after(field, direction, values[field])
+        if after is None:
+            continue
+        clause = {prev: values[prev] for prev, _ in sort[:i]}
+        clause.update(after)
+        clauses.append(clause)
+    if not clauses:
+        # Solo posible si el último campo (normalmente _id) es null
+        raise PaginationError('Cursor no válido')
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+def parse_limit(raw: Optional[str], default: int, maximum: int) -> int:
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise PaginationError('limit debe ser un entero')
+    if limit < 1:
+        raise PaginationError('limit debe ser mayor que 0')
+    return min(limit, maximum)
+
+
+def parse_fields(raw: Optional[str], sort: List[Tuple[str, int]]) -> Optional[Dict]:
+    """Proyección a partir de `fields=a,b,c` (siempre incluye las claves de ordenación)"""
+    if not raw:
+        return None
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    for field in fields:
+        if not FIELD_PATTERN.match(field):
+            raise PaginationError(f'Campo no válido: {field}')
+    projection = {field: 1 for field in fields}
+    for field, _ in sort:
+        projection[field] = 1
+    return projection
+
+
+def paginate(collection, query: Dict, sort: List[Tuple[str, int]], limit: Optional[int],
+             cursor: Optional[str] = None, projection: Optional[Dict] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Leer una página ordenada por `sort` y devolver (documentos, cursor siguiente)
+
+    Con limit=None se devuelven todos los documentos y no hay cursor siguiente.
+    """
+    if cursor:
+        after = keyset_filter(sort, decode_cursor(cursor))
+        query = {'$and': [query, after]} if query else after
+
+    if limit is None:
+        return list(collection.find(query, projection).sort(sort)), None
+
+    # Se pide un documento de más para saber si hay página siguiente
+    documents = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+
+    next_cursor = None
+    if has_more and documents:
+        last = documents[-1]
+        next_cursor = encode_cursor({field: last.get(field) for field, _ in sort})
+    return documents, next_cursor
@@ -0,0 +1,211 @@
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No hay conexiones libres en el pool dentro del tiempo de espera"""
+
+
+class PostgresPool:
+    """Pool de conexiones PostgreSQL con tamaño mínimo/máximo y timeout de checkout
+
+    ThreadedConnectionPool lanza PoolError en cuanto se agota; aquí un semáforo
+    con `maxconn` permisos hace esperar hasta `checkout_timeout` segundos. Las
+    conexiones que llevan más de `validate_after` segundos ociosas se validan
+    con SELECT 1 antes de entregarlas y se descartan si el servidor las cerró.
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 5, checkout_timeout: float = 5.0,
+                 validate_after: float = 30.0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+        self.connect_kwargs = connect_kwargs
+
+        self._pool = None
+        self._init_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats_lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+        self._in_use = 0
+        self.stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "invalidated": 0,
+            "wait_seconds_total": 0.0
+        }
+
+    def _get_pool(self):
+        # Creación diferida: el servicio arranca aunque PostgreSQL no esté listo
+        if self._pool is None:
+            with self._init_lock:
+                if self._pool is None:
+                    self._pool = pool.ThreadedConnectionPool(self.minconn, self.maxconn, **self.connect_kwargs)
+                    logger.info("✅ Pool PostgreSQL creado (%s-%s conexiones)", self.minconn, self.maxconn)
+        return self._pool
+
+    def _is_valid(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    # ===================================
+    # CHECKOUT / DEVOLUCIÓN
+    # ===================================
+
+    def getconn(self, timeout: Optional[float] = None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            with self._stats_lock:
+                self.stats["timeouts"] += 1
+            raise PoolTimeout(f"Sin conexiones PostgreSQL libres tras {timeout}s")
+
+        try:
+            pg_pool = self._get_pool()
+            conn = pg_pool.getconn()
+            while not self._is_valid(conn):
+                with self._stats_lock:
+                    self.stats["invalidated"] += 1
+                self._last_used.pop(id(conn), None)
+                pg_pool.putconn(conn, close=True)
+                conn = pg_pool.getconn()
+        except Exception:
+            self._slots.release()
+            with self._stats_lock:
+                self.stats["errors"] += 1
+            raise
+
+        with self._stats_lock:
+            self._in_use += 1
+            self.stats["checkouts"] += 1
+            self.stats["wait_seconds_total"] += time.monotonic() - started
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            # Nunca devolver al pool una transacción abierta o abortada
+            if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            close = True
+
+        try:
+            close = close or bool(conn.closed)
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            if self._pool is not None:
+                self._pool.putconn(conn, close=close)
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Conexión del pool; commit al salir sin errores, rollback si falla"""
+        conn = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    # ===================================
+    # MÉTRICAS Y CIERRE
+    # ===================================
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+            in_use = self._in_use
+        idle = len(self._pool._pool) if self._pool is not None else 0
+        stats.update({
+            "min": self.minconn,
+            "max": self.maxconn,
+            "in_use": in_use,
+            "idle": idle,
+            "utilization": round(in_use / self.maxconn, 3) if self.maxconn else 0.0,
+            "avg_wait_ms": round(stats["wait_seconds_total"] / stats["checkouts"] * 1000, 3) if stats["checkouts"] else 0.0
+        })
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 3)
+        return stats
+
+    def close(self):
+        with self._init_lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+                logger.info("🔌 Pool PostgreSQL cerrado")
+            self._pool = None
+            self._last_used.clear()
+
+
+_postgres_pool = None
+_postgres_pool_lock = threading.Lock()
+
+
+def get_postgres_pool() -> PostgresPool:
+    global _postgres_pool
+    if _postgres_pool is None:
+        with _postgres_pool_lock:
+            if _postgres_pool is None:
+                _postgres_pool = PostgresPool(
+                    minconn=config.POSTGRES_POOL_MIN,
+                    maxconn=config.POSTGRES_POOL_MAX,
+                    checkout_timeout=config.POSTGRES_POOL_TIMEOUT,
+                    validate_after=config.POSTGRES_POOL_VALIDATE_AFTER,
+                    host=config.POSTGRES_HOST,
+                    port=config.POSTGRES_PORT,
+                    database=config.POSTGRES_DB,
+                    user=config.POSTGRES_USER,
+                    password=config.POSTGRES_PASSWORD,
+                    connect_timeout=config.POSTGRES_CONNECT_TIMEOUT
+                )
+    return _postgres_pool
+
+
+def get_postgres_stats() -> Dict:
+    if _postgres_pool is None:
+        return {"min": config.POSTGRES_POOL_MIN, "max": config.POSTGRES_POOL_MAX, "in_use": 0, "idle": 0}
+    return _postgres_pool.get_stats()
+
+
+def close_postgres_pool():
+    global _postgres_pool
+    if _postgres_pool is not None:
+        _postgres_pool.close()
+        _postgres_pool = None
+
+
+atexit.register(close_postgres_pool)
@@ -0,0 +1,698 @@
+import argparse
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteMany, InsertOne, UpdateOne
+from pymongo.errors import CollectionInvalid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import config
+from scrapers.amazon_parser import DEFAULT_COUNTRY
+
+logger = logging.getLogger(__name__)
+
+MODE_FULL = 'full'
+MODE_CHANGES = 'changes'
+
+STORAGE_DOCUMENTS = 'documents'
+STORAGE_BUCKETS = 'buckets'
+STORAGE_TIMESERIES = 'timeseries'
+
+RUN_FIELDS = ('samples', 'last_seen')
+
+
+def country_filter(country: Optional[str]) -> Dict:
+    """Filtro de la serie de un país (None = todas)
+
+    Los puntos anteriores al campo `country` pertenecen al país por defecto.
+    """
+    if country is None:
+        return {}
+    if country == DEFAULT_COUNTRY:
+        return {'country': {'$in': [country, None]}}
+    return {'country': country}
+
+
+class HistoryWrites(list):
+    """Operaciones (colección, operación) de una observación
+
+    `new_point` indica si la última operación inserta un punto nuevo (y no
+    extiende el tramo actual), para contarlo cuando la escritura se confirme.
+    """
+
+    def __init__(self, operations=(), new_point: bool = False):
+        super().__init__(operations)
+        self.new_point = new_point
+
+
+# ===================================
+# MOTORES DE ALMACENAMIENTO
+# ===================================
+
+def _price_change_stages() -> List[Dict]:
+    """Etapas que cuentan, por product_id, los puntos cuyo precio difiere del anterior
+
+    Parten de documentos {product_id, timestamp, price}. El anterior se envuelve
+    en un objeto para distinguir "primer punto" (null) de "precio null".
+    """
+    return [
+        {'$setWindowFields': {
+            'partitionBy': '$product_id',
+            'sortBy': {'timestamp': 1},
+            'output': {'previous': {'$shift': {'output': {'price': '$price'}, 'by': -1}}}
+        }},
+        {'$match': {'previous': {'$ne': None}, '$expr': {'$ne': ['$previous.price', '$price']}}},
+        {'$group': {'_id': '$product_id', 'changes': {'$sum': 1}}}
+    ]
+
+
+class DocumentStore:
+    """Un documento por observación en `price_history` (formato original)"""
+
+    name = STORAGE_DOCUMENTS
+    collection = 'price_history'
+    supports_extend = True
+
+    def __init__(self, db):
+        self.db = db
+
+    def insert_ops(self, point: Dict) -> List:
+        if '_id' not in point:
+            point['_id'] = ObjectId()
+        return [(self.collection, InsertOne(point))]
+
+    def extend_ops(self, head: Dict, set_fields: Dict, inc_fields: Dict, fallback: Optional[Dict] = None) -> List:
+        update = {'$set': set_fields}
+        if inc_fields:
+            update['$inc'] = inc_fields
+        if fallback is None:
+            return [(self.collection, UpdateOne({'_id': head['_id']}, update))]
+        # Si el tramo ya no existe (p. ej. lo borró una compactación en otro
+        # proceso) el upsert lo registra como punto nuevo en lugar de perderlo
+        update['$setOnInsert'] = {
+            k: v for k, v in fallback.items() if k != '_id' and k not in set_fields and k not in inc_fields
+        }
+        return [(self.collection, UpdateOne({'_id': head['_id']}, update, upsert=True))]
+
+    def latest(self, product_ids: List[str], country: Optional[str] = DEFAULT_COUNTRY) -> Dict[str, Dict]:
+        pipeline = [
+            {'$match': {'product_id': {'$in': product_ids}, **country_filter(country)}},
+            {'$sort': {'product_id': 1, 'timestamp': -1}},
+            {'$group': {'_id': '$product_id', 'head': {'$first': '$$ROOT'}}}
+        ]
+        return {row['_id']: row['head'] for row in self.db[self.collection].aggregate(pipeline)}
+
+    def recent(self, product_id: str, limit: int, country: Optional[str] = DEFAULT_COUNTRY) -> List[Dict]:
+        return list(
+            self.db[self.collection]
+            .find({'product_id': product_id, **country_filter(country)})
+            .sort('timestamp', -1)
+            .limit(limit)
+        )
+
+    def iter_points(self, query: Dict, batch_size: int = 1000) -> Iterator[Dict]:
+        """Recorrer puntos en streaming (orden temporal si se filtra por producto)"""
+        cursor = self.db[self.collection].find(query, batch_size=batch_size)
+        if 'product_id' in query:
+            cursor = cursor.sort('timestamp', 1)
+        return cursor
+
+    def price_changes(self, since: datetime, country: Optional[str] = DEFAULT_COUNTRY) -> Dict[str, int]:
+        """Cambios de precio por producto desde `since`, agregados en el servidor"""
+        pipeline = [
+            {'$match': {'timestamp': {'$gte': since}, **country_filter(country)}},
+            {'$project': {'_id': 0, 'product_id': 1, 'timestamp': 1, 'price': 1}},
+            *_price_change_stages()
+        ]
+        return {row['_id']: row['changes'] for row in self.db[self.collection].aggregate(pipeline, allowDiskUse=True)}
+
+    def count_points(self) -> int:
+        return self.db[self.collection].count_documents({})
+
+    def estimate_points(self) -> int:
+        """Conteo a partir de los metadatos de la colección (sin escanear)"""
+        return self.db[self.collection].estimated_document_count()
+
+    def bulk_load_ops(self, points: List[Dict]) -> List:
+        return [InsertOne(point) for point in points]
+
+
+class TimeSeriesStore(DocumentStore):
+    """Colección time-series nativa de MongoDB (metaField = product_id)
+
+    Las colecciones time-series no admiten actualizar una medición concreta,
+    así que en modo 'changes' solo se insertan los cambios y no se mantiene
+    `last_seen`/`samples`.
+    """
+
+    name = STORAGE_TIMESERIES
+    collection = 'price_history_ts'
+    supports_extend = False
+
+    def ensure_collection(self):
+        try:
+            self.db.create_collection(
+                self.collection,
+                timeseries={'timeField': 'timestamp', 'metaField': 'product_id', 'granularity': 'hours'}
+            )
+            logger.info("✅ Colección time-series '%s' creada", self.collection)
+        except CollectionInvalid:
+            pass
+
+    def extend_ops(self, head: Dict, set_fields: Dict, inc_fields: Dict, fallback: Optional[Dict] = None) -> List:
+        return []
+
+    def bulk_load_ops(self, points: List[Dict]) -> List:
+        return [InsertOne({k: v for k, v in point.items() if k != '_id'}) for point in points]
+
+
+class BucketStore:
+    """Observaciones agrupadas en documentos por producto y día/mes
+
+    Cada bucket guarda los puntos en orden de llegada junto con el rango de
+    fechas y precios, de modo que leer el histórico de un producto toca unos
+    pocos documentos. Un bucket lleno (max_points) se desborda en otro
+    documento con la misma clave.
+    """
+
+    name = STORAGE_BUCKETS
+    collection = 'price_history_buckets'
+    supports_extend = True
+
+    def __init__(self, db, granularity: str = 'day', max_points: int = 1000):
+        self.db = db
+        self.granularity = granularity
+        self.max_points = max_points
+
+    def bucket_start(self, timestamp: datetime) -> datetime:
+        if self.granularity == 'month':
+            return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def _split(point: Dict):
+        """Separar los campos comunes del bucket de los de cada medición"""
+        measurement = {k: v for k, v in point.items() if k not in ('_id', 'product_id', 'marketplace', 'country')}
+        return point['product_id'], point.get('marketplace'), point.get('country') or DEFAULT_COUNTRY, measurement
+
+    def insert_ops(self, point: Dict) -> List:
+        product_id, marketplace, country, measurement = self._split(point)
+        timestamp = measurement['timestamp']
+        price = measurement.get('price')
+        return [(self.collection, UpdateOne(
+            {
+                'product_id': product_id,
+                'country': country,
+                'bucket': self.bucket_start(timestamp),
+                'count': {'$lt': self.max_points}
+            },
+            {
+                '$push': {'points': measurement},
+                '$inc': {'count': 1},
+                '$min': {'first_ts': timestamp, 'min_price': price},
+                '$max': {'last_ts': timestamp, 'max_price': price},
+                '$setOnInsert': {'marketplace': marketplace}
+            },
+            upsert=True
+        ))]
+
+    def extend_ops(self, head: Dict, set_fields: Dict, inc_fields: Dict, fallback: Optional[Dict] = None) -> List:
+        # Los buckets no se compactan: el punto de cabeza no desaparece
+        update = {'$set': {f'points.$.{k}': v for k, v in set_fields.items()}}
+        if 'last_seen' in set_fields:
+            update['$max'] = {'last_ts': set_fields['last_seen']}
+        if inc_fields:
+            update['$inc'] = {f'points.$.{k}': v for k, v in inc_fields.items()}
+        return [(self.collection, UpdateOne(
+            {
+                'product_id': head['product_id'],
+                **country_filter(head.get('country') or DEFAULT_COUNTRY),
+                'bucket': self.bucket_start(head['timestamp']),
+                'points.timestamp': head['timestamp']
+            },
+            update
+        ))]
+
+    def latest(self, product_ids: List[str], country: Optional[str] = DEFAULT_COUNTRY) -> Dict[str, Dict]:
+        pipeline = [
+            {'$match': {'product_id': {'$in': product_ids}, **country_filter(country)}},
+            {'$sort': {'product_id': 1, 'bucket': -1, 'first_ts': -1}},
+            {'$group': {
+                '_id': '$product_id',
+                'marketplace': {'$first': '$marketplace'},
+                'country': {'$first': '$country'},
+                'head': {'$first': {'$arrayElemAt': ['$points', -1]}}
+            }}
+        ]
+        heads = {}
+        for row in self.db[self.collection].aggregate(pipeline):
+            head = row['head']
+            head.update({'product_id': row['_id'], 'marketplace': row['marketplace'], 'country': row.get('country')})
+            heads[row['_id']] = head
+        return heads
+
+    def _flatten(self, bucket: Dict, reverse: bool) -> List[Dict]:
+        points = []
+        indexed = list(enumerate(bucket.get('points', [])))
+        for index, measurement in (reversed(indexed) if reverse else indexed):
+            point = dict(measurement)
+            point['_id'] = f"{bucket['_id']}:{index}"
+            point['product_id'] = bucket['product_id']
+            point['marketplace'] = bucket.get('marketplace')
+            point['country'] = bucket.get('country') or DEFAULT_COUNTRY
+            points.append(point)
+        return points
+
+    def recent(self, product_id: str, limit: int, country: Optional[str] = DEFAULT_COUNTRY) -> List[Dict]:
+        points = []
+        cursor = (
+            self.db[self.collection]
+            .find({'product_id': product_id, **country_filter(country)})
+            .sort([('bucket', -1), ('first_ts', -1)])
+        )
+        for bucket in cursor:
+            points.extend(self._flatten(bucket, reverse=True))
+            if len(points) >= limit:
+                break
+        points.sort(key=lambda p: p['timestamp'], reverse=True)
+        return points[:limit]
+
+    def iter_points(self, query: Dict, batch_size: int = 100) -> Iterator[Dict]:
+        bucket_query = {k: v for k, v in query.items() if k != 'timestamp'}
+        time_range = query.get('timestamp', {})
+        if '$gte' in time_range:
+            bucket_query['last_ts'] = {'$gte': time_range['$gte']}
+        if '$lte' in time_range:
+            bucket_query['first_ts'] = {'$lte': time_range['$lte']}
+
+        cursor = self.db[self.collection].find(bucket_query, batch_size=batch_size)
+        if 'product_id' in query:
+            cursor = cursor.sort([('bucket', 1), ('first_ts', 1)])
+        for bucket in cursor:
+            for point in self._flatten(bucket, reverse=False):
+                if '$gte' in time_range and point['timestamp'] < time_range['$gte']:
+                    continue
+                if '$lte' in time_range and point['timestamp'] > time_range['$lte']:
+                    continue
+                yield point
+
+    def price_changes(self, since: datetime, country: Optional[str] = DEFAULT_COUNTRY) -> Dict[str, int]:
+        """Cambios de precio por producto desde `since`, agregados en el servidor"""
+        pipeline = [
+            {'$match': {'last_ts': {'$gte': since}, **country_filter(country)}},
+            {'$unwind': '$points'},
+            {'$match': {'points.timestamp': {'$gte': since}}},
+            {'$project': {'_id': 0, 'product_id': 1, 'timestamp': '$points.timestamp', 'price': '$points.price'}},
+            *_price_change_stages()
+        ]
+        return {row['_id']: row['changes'] for row in self.db[self.collection].aggregate(pipeline, allowDiskUse=True)}
+
+    def count_points(self) -> int:
+        result = list(self.db[self.collection].aggregate([{'$group': {'_id': None, 'points': {'$sum': '$count'}}}]))
+        return result[0]['points'] if result else 0
+
+    def estimate_points(self) -> int:
+        """Número de buckets (metadatos) por la media de puntos de una muestra"""
+        buckets = self.db[self.collection].estimated_document_count()
+        if not buckets:
+            return 0
+        sample = list(self.db[self.collection].aggregate([
+            {'$sample': {'size': 100}},
+            {'$group': {'_id': None, 'avg': {'$avg': '$count'}}}
+        ]))
+        return int(buckets * sample[0]['avg']) if sample else 0
+
+    def bulk_load_ops(self, points: List[Dict]) -> List:
+        """Construir buckets completos a partir de puntos ordenados por producto y fecha"""
+        operations = []
+        current = None
+        for point in points:
+            product_id, marketplace, country, measurement = self._split(point)
+            timestamp = measurement['timestamp']
+            price = measurement.get('price')
+            key = (product_id, country, self.bucket_start(timestamp))
+            if current is None or current['key'] != key or len(current['doc']['points']) >= self.max_points:
+                if current is not None:
+                    operations.append(InsertOne(current['doc']))
+                current = {'key': key, 'doc': {
+                    'product_id': product_id,
+                    'country': country,
+                    'bucket': key[2],
+                    'marketplace': marketplace,
+                    'count': 0,
+                    'first_ts': timestamp,
+                    'last_ts': timestamp,
+                    'min_price': price,
+                    'max_price': price,
+                    'points': []
+                }}
+            doc = current['doc']
+            doc['points'].append(measurement)
+            doc['count'] += 1
+            doc['last_ts'] = max(doc['last_ts'], measurement.get('last_seen', timestamp))
+            if price is not None:
+                doc['min_price'] = price if doc['min_price'] is None else min(doc['min_price'], price)
+                doc['max_price'] = price if doc['max_price'] is None else max(doc['max_price'], price)
+        if current is not None:
+            operations.append(InsertOne(current['doc']))
+        return operations
+
+
+def configured_storage() -> str:
+    """Motor de histórico en uso según la configuración
+
+    El servicio analytics (Node) consulta y escribe `price_history` sin pasar
+    por estos motores: con PRICE_HISTORY_SHARED_WITH_ANALYTICS se rechaza
+    cualquier otro motor para no separar las dos escrituras.
+    """
+    storage = config.PRICE_HISTORY_STORAGE
+    if storage != STORAGE_DOCUMENTS and config.PRICE_HISTORY_SHARED_WITH_ANALYTICS:
+        logger.error(
+            "❌ PRICE_HISTORY_STORAGE=%s no es compatible con el servicio analytics, que usa "
+            "'price_history': se mantiene 'documents' (PRICE_HISTORY_SHARED_WITH_ANALYTICS=False para forzarlo)",
+            storage
+        )
+        return STORAGE_DOCUMENTS
+    return storage
+
+
+def get_price_history_store(db, storage: str = STORAGE_DOCUMENTS, bucket: str = 'day',
+                            bucket_max_points: int = 1000):
+    if storage == STORAGE_BUCKETS:
+        return BucketStore(db, granularity=bucket, max_points=bucket_max_points)
+    if storage == STORAGE_TIMESERIES:
+        return TimeSeriesStore(db)
+    return DocumentStore(db)
+
+
+# ===================================
+# REGISTRO DE OBSERVACIONES
+# ===================================
+
+class PriceHistoryRecorder:
+    """Genera las escrituras del histórico de precios para cada actualización de producto
+
+    En modo 'full' cada observación es un punto nuevo. En modo 'changes'
+    solo se inserta un punto cuando cambian precio o stock; mientras no
+    cambian se extiende `last_seen` y se incrementa `samples` del último punto
+    (codificación run-length).
+
+    El último punto de cada serie se guarda en un LRU de `max_heads`
+    entradas; una serie expulsada se vuelve a leer de MongoDB.
+    """
+
+    def __init__(self, db, mode: str = MODE_FULL, store=None, max_heads: int = 100000):
+        self.db = db
+        self.mode = mode
+        self.store = store or DocumentStore(db)
+        self.max_heads = max_heads
+        # Último punto de cada serie (producto, país)
+        self._heads: 'OrderedDict[Tuple[str, str], Optional[Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def change_only(self) -> bool:
+        return self.mode == MODE_CHANGES
+
+    def prime(self, product_ids: Iterable[str], country: str = DEFAULT_COUNTRY):
+        """Cargar en una sola consulta el último punto de cada producto en un país"""
+        if not self.change_only:
+            return
+        product_ids = list(product_ids)
+        heads = {(product_id, country): None for product_id in product_ids}
+        heads.update({(product_id, country): head for product_id, head in self.store.latest(product_ids, country).items()})
+        with self._lock:
+            for key, head in heads.items():
+                self._remember(key, head)
+
+    def _remember(self, key: Tuple[str, str], head: Optional[Dict]):
+        """Guardar la cabeza de una serie (con el lock tomado)"""
+        self._heads[key] = head
+        self._heads.move_to_end(key)
+        while len(self._heads) > self.max_heads:
+            self._heads.popitem(last=False)
+
+    def _get_head(self, product_id: str, country: str) -> Optional[Dict]:
+        key = (product_id, country)
+        with self._lock:
+            if key in self._heads:
+                self._heads.move_to_end(key)
+                return self._heads[key]
+        head = self.store.latest([product_id], country).get(product_id)
+        with self._lock:
+            self._remember(key, head)
+        return head
+
+    def build_writes(self, product_data: Dict, now: Optional[datetime] = None) -> HistoryWrites:
+        """Devuelve las operaciones (colección, operación) para registrar el precio"""
+        now = now or datetime.now()
+        point = {
+            'product_id': product_data['external_id'],
+            'price': product_data['current_price'],
+            'currency': product_data['currency'],
+            'stock_status': product_data.get('stock_status'),
+            'timestamp': now,
+            'marketplace': product_data['marketplace'],
+            'country': product_data.get('country') or DEFAULT_COUNTRY
+        }
+        if not self.change_only:
+            return HistoryWrites(self.store.insert_ops(point), new_point=True)
+
+        product_id = point['product_id']
+        head = self._get_head(product_id, point['country'])
+        if head is not None and _same_observation(head, point):
+            if not self.store.supports_extend:
+                return HistoryWrites()
+            # Sin cambios: extender el tramo actual
+            if 'samples' in head:
+                set_fields, inc_fields = {'last_seen': now}, {'samples': 1}
+                head['samples'] += 1
+            else:
+                set_fields, inc_fields = {'last_seen': now, 'samples': 2}, {}
+                head['samples'] = 2
+            head['last_seen'] = now
+            return HistoryWrites(self.store.extend_ops(head, set_fields, inc_fields, fallback=point))
+
+        if self.store.supports_extend:
+            point.update({'last_seen': now, 'samples': 1})
+        operations = self.store.insert_ops(point)
+        with self._lock:
+            self._remember((product_id, point['country']), dict(point))
+        return HistoryWrites(operations, new_point=True)
+
+    def recent(self, product_id: str, limit: int = 30, country: str = DEFAULT_COUNTRY) -> List[Dict]:
+        return self.store.recent(product_id, limit, country)
+
+    def forget(self, product_id: str, country: str = DEFAULT_COUNTRY):
+        with self._lock:
+            self._heads.pop((product_id, country), None)
+
+
+def _same_observation(a: Dict, b: Dict) -> bool:
+    return (
+        (a.get('country') or DEFAULT_COUNTRY) == (b.get('country') or DEFAULT_COUNTRY)
+        and a.get('price') == b.get('price')
+        and a.get('stock_status') == b.get('stock_status')
+        and a.get('currency') == b.get('currency')
+    )
+
+
+# ===================================
+# LECTURA / EXPANSIÓN DE TRAMOS
+# ===================================
+
+def expand_points(points: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+    """Expandir tramos run-length a una observación por muestra (orden descendente)
+
+    Las muestras de un tramo se reparten uniformemente entre `timestamp` y
+    `last_seen`. Los documentos sin `samples` se devuelven tal cual.
+    """
+    expanded = []
+    for point in points:
+        samples = point.get('samples', 1)
+        first = point['timestamp']
+        last = point.get('last_seen', first)
+        step = (last - first) / (samples - 1) if samples > 1 else None
+        base = {k: v for k, v in point.items() if k not in RUN_FIELDS + ('timestamp',)}
+        for i in range(samples - 1, -1, -1):
+            entry = dict(base)
+            entry['timestamp'] = first + step * i if step is not None else first
+            expanded.append(entry)
+            if limit is not None and len(expanded) >= limit:
+                return expanded
+    return expanded
+
+
+def collapse_runs(points: Iterable[Dict]) -> Iterator[Dict]:
+    """Fusionar puntos consecutivos iguales de un mismo producto (entrada ordenada)"""
+    run = None
+    for point in points:
+        if run is not None and run['product_id'] == point['product_id'] and _same_observation(run, point):
+            run['samples'] = run.get('samples', 1) + point.get('samples', 1)
+            run['last_seen'] = max(run.get('last_seen', run['timestamp']), point.get('last_seen', point['timestamp']))
+            continue
+        if run is not None:
+            yield run
+        run = dict(point)
+    if run is not None:
+        yield run
+
+
+# ===================================
+# COMPACTACIÓN DE HISTÓRICO EXISTENTE
+# ===================================
+
+def compact_product(db, product_id: str, recorder: Optional['PriceHistoryRecorder'] = None) -> Dict:
+    """Colapsar tramos consecutivos con el mismo precio y stock de un producto
+
+    Los puntos sin país (anteriores al multipaís) cuentan como del país por
+    defecto. Si se pasa el `recorder` del proceso, se olvidan sus cabezas del
+    producto: pueden apuntar a documentos borrados.
+    """
+    operations = []
+    removed = 0
+    # Cada país es una serie independiente: un tramo abierto por país
+    runs: Dict[str, List[Dict]] = {}
+
+    def close_run(run):
+        nonlocal removed
+        if len(run) < 2:
+            return
+        keep = run[0]
+        samples = sum(doc.get('samples', 1) for doc in run)
+        last_seen = max(doc.get('last_seen', doc['timestamp']) for doc in run)
+        operations.append(UpdateOne(
+            {'_id': keep['_id']},
+            {'$set': {'samples': samples, 'last_seen': last_seen}}
+        ))
+        operations.append(DeleteMany({'_id': {'$in': [doc['_id'] for doc in run[1:]]}}))
+        removed += len(run) - 1
+
+    cursor = db.price_history.find({'product_id': product_id}).sort('timestamp', 1)
+    for doc in cursor:
+        country = doc.get('country') or DEFAULT_COUNTRY
+        run = runs.setdefault(country, [])
+        if run and not _same_observation(run[-1], doc):
+            close_run(run)
+            run = runs[country] = []
+        run.append(doc)
+    for run in runs.values():
+        close_run(run)
+
+    if operations:
+        db.price_history.bulk_write(operations, ordered=True)
+        if recorder is not None:
+            for country in runs:
+                recorder.forget(product_id, country)
+    return {'product_id': product_id, 'removed': removed}
+
+
+def compact_price_history(db, product_ids: Optional[Iterable[str]] = None,
+                          recorder: Optional['PriceHistoryRecorder'] = None) -> Dict:
+    """Compactar el histórico (storage 'documents') de todos los productos o de los indicados"""
+    if product_ids is None:
+        product_ids = db.price_history.distinct('product_id')
+
+    products = 0
+    removed = 0
+    for product_id in product_ids:
+        result = compact_product(db, product_id, recorder)
+        products += 1
+        removed += result['removed']
+        if result['removed']:
+            logger.info("🗜️ %s: %s puntos duplicados eliminados", product_id, result['removed'])
+
+    logger.info("✅ Compactación completada: %s productos, %s documentos eliminados", products, removed)
+    return {'products': products, 'removed': removed}
+
+
+# ===================================
+# MIGRACIÓN ENTRE MOTORES
+# ===================================
+
+def migrate_price_history(db, target_store, batch_size: int = 5000, collapse: bool = False,
+                          drop_target: bool = False) -> Dict:
+    """Copiar `price_history` al motor indicado (buckets o time-series)"""
+    target = db[target_store.collection]
+    if drop_target:
+        target.drop()
+        if hasattr(target_store, 'ensure_collection'):
+            target_store.ensure_collection()
+    elif target.estimated_document_count() > 0:
+        raise RuntimeError(f"La colección destino '{target_store.collection}' no está vacía (usa --drop)")
+
+    source = (
+        db.price_history.find({}, batch_size=batch_size)
+        .sort([('product_id', 1), ('country', 1), ('timestamp', 1)])
+    )
+    points = collapse_runs(source) if collapse else source
+
+    read = 0
+    written = 0
+    batch = []
+
+    def flush(final=False):
+        nonlocal batch, written
+        if not batch:
+            return
+        # Los buckets no deben partirse entre lotes: conservar el último producto
+        keep = []
+        if not final and isinstance(target_store, BucketStore):
+            last_product = batch[-1]['product_id']
+            split = len(batch)
+            while split > 0 and batch[split - 1]['product_id'] == last_product:
+                split -= 1
+            if split > 0:
+                batch, keep = batch[:split], batch[split:]
+        operations = target_store.bulk_load_ops(batch)
+        if operations:
+            target.bulk_write(operations, ordered=False)
+            written += len(operations)
+        batch = keep
+
+    for point in points:
+        batch.append(point)
+        read += 1
+        if len(batch) >= batch_size:
+            flush()
+            logger.info("🚚 %s puntos migrados a '%s'", read, target_store.collection)
+    flush(final=True)
+
+    logger.info("✅ Migración completada: %s puntos -> %s documentos en '%s'", read, written, target_store.collection)
+    return {'points': read, 'documents': written}
+
+
+if __name__ == '__main__':
+    from database.mongodb import get_mongodb
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Mantenimiento de price_history')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compact_parser = subparsers.add_parser('compact', help='Colapsar tramos de precios repetidos')
+    compact_parser.add_argument('--product', action='append', dest='products',
+                                help='Compactar solo este product_id (repetible)')
+
+    migrate_parser = subparsers.add_parser('migrate', help='Convertir price_history a otro motor')
+    migrate_parser.add_argument('--to', choices=[STORAGE_BUCKETS, STORAGE_TIMESERIES], required=True)
+    migrate_parser.add_argument('--bucket', choices=['day', 'month'], default=config.PRICE_HISTORY_BUCKET)
+    migrate_parser.add_argument('--batch-size', type=int, default=5000)
+    migrate_parser.add_argument('--collapse', action='store_true',
+                                help='Fusionar observaciones repetidas durante la migración')
+    migrate_parser.add_argument('--drop', action='store_true', help='Vaciar la colección destino antes')
+
+    args = parser.parse_args()
+    db = get_mongodb()
+
+    if args.command == 'compact':
+        compact_price_history(db, args.products)
+    else:
+        store = get_price_history_store(db, args.to, args.bucket, config.PRICE_HISTORY_BUCKET_MAX_POINTS)
+        migrate_price_history(db, store, batch_size=args.batch_size, collapse=args.collapse, drop_target=args.drop)
@@ -0,0 +1,280 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_LEASED = 'leased'
+STATUS_DONE = 'done'
+
+
+def utc_now() -> datetime:
+    """Hora UTC sin zona, como la devuelve pymongo y la interpreta el monitor TTL
+
+    Con la hora local, el TTL de `expires_at` se desplazaría el offset de la
+    zona y réplicas con distinto TZ calcularían run_id distintos.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class WorkLeaseManager:
+    """Reparto de una ejecución de ingesta entre réplicas mediante leases en MongoDB
+
+    Cada ejecución (run_id) tiene un documento 'run' y un documento por lote de
+    productos. La primera réplica que crea el 'run' siembra los lotes; si cae
+    antes de terminar, otra retoma la siembra cuando vence `seed_until`. Todas
+    reclaman lotes con find_one_and_update atómico. Un lease caduca a los
+    `lease_seconds` si nadie lo renueva, así el trabajo de una réplica caída
+    vuelve a quedar disponible; mientras se procesa, un heartbeat lo renueva.
+    """
+
+    def __init__(self, db, worker_id: Optional[str] = None, lease_seconds: float = 300,
+                 batch_size: int = 50, retention_hours: float = 48, collection: str = 'ingestion_leases',
+                 seed_seconds: float = 15):
+        self.collection = db[collection]
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        # Plazo para terminar la siembra antes de que otra réplica la retome
+        self.seed_seconds = seed_seconds
+        self.batch_size = batch_size
+        self.retention = timedelta(hours=retention_hours)
+        self.last_run_id = None
+
+    # ===================================
+    # SIEMBRA
+    # ===================================
+
+    def seed_run(self, run_id: str, load_ids: Callable[[], List[str]]) -> bool:
+        """Crear los lotes de la ejecución si nadie lo ha hecho. True si la sembró esta réplica"""
+        run_key = f"run:{run_id}"
+        now = utc_now()
+        run = self.collection.find_one({'_id': run_key}, {'seeded': 1, 'seed_until': 1})
+        if run is None:
+            try:
+                self.collection.insert_one({
+                    '_id': run_key, 'type': 'run', 'run_id': run_id, 'seeded': False,
+                    'owner': self.worker_id, 'created_at': now,
+                    'seed_until': now + timedelta(seconds=self.seed_seconds),
+                    'expires_at': now + self.retention
+                })
+            except DuplicateKeyError:
+                return False
+        elif run.get('seeded') or not self._take_over_seeding(run_key, now):
+            return False
+
+        try:
+            external_ids = list(dict.fromkeys(load_ids()))
+            batches = [
+                {
+                    '_id': f"{run_id}:{index:06d}",
+                    'type': 'batch',
+                    'run_id': run_id,
+                    'batch': index,
+                    'external_ids': external_ids[start:start + self.batch_size],
+                    'status': STATUS_PENDING,
+                    'owner': None,
+                    'lease_until': None,
+                    'attempts': 0,
+                    'expires_at': now + self.retention
+                }
+                for index, start in enumerate(range(0, len(external_ids), self.batch_size))
+            ]
+            if batches:
+                try:
+                    self.collection.insert_many(batches, ordered=False)
+                except BulkWriteError as e:
+                    logger.warning("⚠️ %s lotes ya existían en %s", len(e.details.get('writeErrors', [])), run_id)
+            self.collection.update_one(
+                {'_id': run_key},
+                {'$set': {'seeded': True, 'products': len(external_ids), 'batches': len(batches)}}
+            )
+            logger.info("🌱 Ejecución %s sembrada: %s productos en %s lotes", run_id, len(external_ids), len(batches))
+            return True
+        except Exception:
+            # Sin lotes no hay nada que reclamar: liberar el run para que otra réplica lo siembre
+            self.collection.delete_one({'_id': run_key, 'seeded': False, 'owner': self.worker_id})
+            raise
+
+    def _take_over_seeding(self, run_key: str, now: datetime) -> bool:
+        """Retomar la siembra de un run cuya réplica sembradora no terminó a tiempo
+
+        Los _id de los lotes son deterministas: si la anterior llegó a insertar
+        alguno, se ignora como duplicado.
+        """
+        run = self.collection.find_one_and_update(
+            {'_id': run_key, 'seeded': False, 'seed_until': {'$lt': now}},
+            {'$set': {'owner': self.worker_id, 'seed_until': now + timedelta(seconds=self.seed_seconds)}}
+        )
+        if run is not None:
+            logger.warning("⚠️ Siembra de %s retomada (la inició %s)", run_key, run.get('owner'))
+        return run is not None
+
+    def _run_seeded(self, run_id: str) -> Optional[bool]:
+        run = self.collection.find_one({'_id': f"run:{run_id}"}, {'seeded': 1})
+        return None if run is None else bool(run.get('seeded'))
+
+    # ===================================
+    # LEASES
+    # ===================================
+
+    def claim(self, run_id: str) -> Optional[Dict]:
+        """Reclamar atómicamente el siguiente lote pendiente o con lease caducado"""
+        now = utc_now()
+        return self.collection.find_one_and_update(
+            {
+                'run_id': run_id,
+                'type': 'batch',
+                '$or': [
+                    {'status': STATUS_PENDING},
+                    {'status': STATUS_LEASED, 'lease_until': {'$lt': now}},
+                ]
+            },
+            {
+                '$set': {
+                    'status': STATUS_LEASED,
+                    'owner': self.worker_id,
+                    'lease_until': now + timedelta(seconds=self.lease_seconds),
+                    'claimed_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('batch', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def renew(self, batch: Dict) -> bool:
+        result = self.collection.update_one(
+            {'_id': batch['_id'], 'owner': self.worker_id, 'status': STATUS_LEASED},
+            {'$set': {'lease_until': utc_now() + timedelta(seconds=self.lease_seconds)}}
+        )
+        return result.matched_count == 1
+
+    def complete(self, batch: Dict, refreshed_ids: List[str], errors: int) -> bool:
+        result = self.collection.update_one(
+            {'_id': batch['_id'], 'owner': self.worker_id},
+            {'$set': {
+                'status': STATUS_DONE,
+                'finished_at': utc_now(),
+                'refreshed': len(refreshed_ids),
+                'errors': errors
+            }}
+        )
+        if result.matched_count != 1:
+            logger.warning("⚠️ Lease del lote %s perdido antes de completarlo", batch['_id'])
+            return False
+        return True
+
+    @contextmanager
+    def heartbeat(self, batch: Dict):
+        """Renovar el lease en segundo plano mientras se procesa el lote"""
+        stop = threading.Event()
+
+        def renew_loop():
+            while not stop.wait(self.lease_seconds / 3):
+                if not self.renew(batch):
+                    logger.warning("⚠️ No se pudo renovar el lease de %s", batch['_id'])
+                    return
+
+        thread = threading.Thread(target=renew_loop, name='lease-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    # ===================================
+    # EJECUCIÓN
+    # ===================================
+
+    def process_run(self, run_id: str, load_ids: Callable[[], List[str]],
+                    handler: Callable[[List[str]], Dict], seed_wait: float = 30.0) -> Dict:
+        """Sembrar (si toca) y procesar lotes hasta agotar la ejecución
+
+        `handler` recibe los external_id del lote y devuelve el resumen de
+        refresh_products (con 'refreshed_ids' y 'errors').
+        """
+        self.last_run_id = run_id
+        seeded = self.seed_run(run_id, load_ids)
+        processed_batches = 0
+        processed: List[str] = []
+        refreshed: List[str] = []
+        cached_at: Dict[str, datetime] = {}
+        errors = 0
+        deadline = time.monotonic() + seed_wait
+
+        while True:
+            batch = self.claim(run_id)
+            if batch is None:
+                # Otra réplica puede estar todavía sembrando (o haber caído mientras)
+                if self._run_seeded(run_id) is False and time.monotonic() < deadline:
+                    seeded = self.seed_run(run_id, load_ids) or seeded
+                    time.sleep(0.5)
+                    continue
+                break
+
+            with self.heartbeat(batch):
+                summary = handler(batch['external_ids']) or {}
+            batch_refreshed = summary.get('refreshed_ids', [])
+            batch_errors = summary.get('errors', len(batch['external_ids']) - len(batch_refreshed))
+            self.complete(batch, batch_refreshed, batch_errors)
+            processed_batches += 1
+            processed.extend(batch['external_ids'])
+            refreshed.extend(batch_refreshed)
+            cached_at.update(summary.get('cached_at', {}))
+            errors += batch_errors
+
+        result = {
+            'run_id': run_id,
+            'worker_id': self.worker_id,
+            'seeded': seeded,
+            'batches': processed_batches,
+            'refreshed': len(refreshed),
+            'errors': errors,
+            'processed_ids': processed,
+            'refreshed_ids': refreshed,
+            'cached_at': cached_at
+        }
+        logger.info(
+            "🧩 %s: %s lotes de %s "
+            "(%s productos, %s errores)",
+            self.worker_id, processed_batches, run_id, len(refreshed), errors
+        )
+        return result
+
+    def active_workers(self, window_seconds: float) -> int:
+        """Réplicas que han reclamado algún lote en la ventana (incluida esta)"""
+        since = utc_now() - timedelta(seconds=window_seconds)
+        owners = set(self.collection.distinct('owner', {'type': 'batch', 'claimed_at': {'$gte': since}}))
+        owners.discard(None)
+        owners.add(self.worker_id)
+        return len(owners)
+
+    def run_status(self, run_id: str) -> Dict:
+        counts = {STATUS_PENDING: 0, STATUS_LEASED: 0, STATUS_DONE: 0}
+        workers = {}
+        for batch in self.collection.find(
+            {'run_id': run_id, 'type': 'batch'},
+            {'status': 1, 'owner': 1, 'external_ids': 1, 'lease_until': 1}
+        ):
+            status = batch['status']
+            if status == STATUS_LEASED and batch.get('lease_until') and batch['lease_until'] < utc_now():
+                status = 'expired'
+            counts[status] = counts.get(status, 0) + 1
+            if batch.get('owner'):
+                workers[batch['owner']] = workers.get(batch['owner'], 0) + len(batch['external_ids'])
+        return {'run_id': run_id, 'batches': counts, 'products_by_worker': workers}
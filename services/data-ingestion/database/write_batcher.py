@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBatcher:
+    """Acumula escrituras por colección y las envía como bulk_write desordenados
+
+    El flush se dispara al alcanzar max_batch_size operaciones pendientes o
+    cuando la operación más antigua supera max_latency segundos. Los errores
+    por documento se conservan en `errors` con la clave lógica de cada
+    operación (p.ej. el external_id del producto). `on_success` de una
+    operación se llama solo cuando el flush la ha escrito.
+    """
+
+    def __init__(self, db, max_batch_size: int = 500, max_latency: float = 2.0,
+                 on_error: Optional[Callable[[Dict], None]] = None,
+                 on_result: Optional[Callable[[str, Dict], None]] = None):
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.on_error = on_error
+        self.on_result = on_result
+        self.errors: List[Dict] = []
+        self.stats = {"operations": 0, "flushes": 0, "round_trips": 0, "failed": 0}
+
+        self._pending: Dict[str, List] = {}
+        self._pending_count = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer = None
+        if max_latency and max_latency > 0:
+            self._timer = threading.Thread(target=self._timer_loop, name='write-batcher', daemon=True)
+            self._timer.start()
+
+    # ===================================
+    # ENCOLADO
+    # ===================================
+
+    def add(self, collection: str, operation, key=None, on_success: Optional[Callable[[], None]] = None):
+        with self._lock:
+            self._pending.setdefault(collection, []).append((key, operation, on_success))
+            self._pending_count += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            should_flush = self._pending_count >= self.max_batch_size
+
+        if should_flush:
+            self.flush()
+
+    def upsert(self, collection: str, filter_doc: Dict, update: Dict, key=None):
+        self.add(collection, UpdateOne(filter_doc, update, upsert=True), key)
+
+    def update(self, collection: str, filter_doc: Dict, update: Dict, key=None, **kwargs):
+        self.add(collection, UpdateOne(filter_doc, update, **kwargs), key)
+
+    def insert(self, collection: str, document: Dict, key=None):
+        self.add(collection, InsertOne(document), key)
+
+    # ===================================
+    # FLUSH
+    # ===================================
+
+    def flush(self) -> List[Dict]:
+        """Enviar todas las operaciones pendientes. Devuelve los errores de este flush"""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = {}
+                self._pending_count = 0
+                self._oldest = None
+
+            flush_errors = []
+            for collection, entries in pending.items():
+                if not entries:
+                    continue
+                keys = [key for key, _, _ in entries]
+                operations = [operation for _, operation, _ in entries]
+                self.stats["round_trips"] += 1
+                self.stats["operations"] += len(operations)
+                started = time.perf_counter()
+                try:
+                    result = self.db[collection].bulk_write(operations, ordered=False)
+                    self._report(collection, {
+                        "inserted": result.inserted_count,
+                        "upserted": result.upserted_count,
+                        "modified": result.modified_count,
+                        "seconds": time.perf_counter() - started
+                    })
+                    self._confirm(entries)
+                except BulkWriteError as e:
+                    self._report(collection, {
+                        "inserted": e.details.get('nInserted', 0),
+                        "upserted": e.details.get('nUpserted', 0),
+                        "modified": e.details.get('nModified', 0),
+                        "seconds": time.perf_counter() - started
+                    })
+                    write_errors = e.details.get('writeErrors', [])
+                    # Lote desordenado: el resto de operaciones sí se escribió
+                    failed = {write_error['index'] for write_error in write_errors}
+                    self._confirm(entry for i, entry in enumerate(entries) if i not in failed)
+                    for write_error in write_errors:
+                        flush_errors.append({
+                            "collection": collection,
+                            "key": keys[write_error['index']],
+                            "code": write_error.get('code'),
+                            "error": write_error.get('errmsg')
+                        })
+                except Exception as e:
+                    # Fallo del lote completo (red, servidor...): todas las operaciones fallan
+                    flush_errors.extend(
+                        {"collection": collection, "key": key, "code": None, "error": str(e)}
+                        for key in keys
+                    )
+
+            if pending:
+                self.stats["flushes"] += 1
+            if flush_errors:
+                self.stats["failed"] += len(flush_errors)
+                self.errors.extend(flush_errors)
+                logger.error("❌ %s escrituras fallidas en el flush", len(flush_errors))
+                for error in flush_errors:
+                    logger.error("   %s [%s]: %s", error['collection'], error['key'], error['error'])
+                    if self.on_error:
+                        self.on_error(error)
+
+            return flush_errors
+
+    def _report(self, collection: str, counts: Dict):
+        if self.on_result:
+            try:
+                self.on_result(collection, counts)
+            except Exception as e:
+                logger.warning("⚠️ Error en callback on_result: %s", e)
+
+    def _confirm(self, entries):
+        for _, _, on_success in entries:
+            if on_success is None:
+                continue
+            try:
+                on_success()
+            except Exception as e:
+                logger.warning("⚠️ Error en callback on_success: %s", e)
+
+    def _timer_loop(self):
+        while not self._stop.wait(self.max_latency / 2):
+            with self._lock:
+                expired = self._oldest is not None and time.monotonic() - self._oldest >= self.max_latency
+            if expired:
+                self.flush()
+
+    def close(self):
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+        self.flush()
+
+    @property
+    def failed_keys(self):
+        return {error["key"] for error in self.errors}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
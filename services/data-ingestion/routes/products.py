@@ -1,11 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from datetime import datetime
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from services.price_generator import PriceGenerator
+from services.comparator_refresh import (
+    invalidate_comparator_detail, prime_comparator_events, publish_comparator_change, summarize_store_prices,
+    start_refresh_in_background, progress as refresh_progress
+)
+from services.detail_cache import get_detail_cache
 from database.mongodb import get_mongodb
+from database.pagination import PaginationError, paginate, parse_fields, parse_limit
+from config import config
 
 products_bp = Blueprint('products', __name__)
 price_generator = PriceGenerator()
@@ -35,10 +42,7 @@ def add_product():
             'imageUrl': data.get('imageUrl', ''),
             'basePrice': base_price,
             'storePrices': store_prices,
-            'lowestPrice': min([p['price'] for p in store_prices if p['inStock']]),
-            'highestPrice': max([p['price'] for p in store_prices if p['inStock']]),
-            'averagePrice': sum([p['price'] for p in store_prices if p['inStock']]) / len([p for p in store_prices if p['inStock']]),
-            'availableStores': len([p for p in store_prices if p['inStock']]),
+            **summarize_store_prices(store_prices),
             'totalStores': len(store_prices),
             'createdAt': datetime.now().isoformat(),
             'updatedAt': datetime.now().isoformat()
@@ -47,15 +51,18 @@ def add_product():
         db = get_mongodb()
         result = db.comparator_products.insert_one(product_doc)
         
-        for store_price in store_prices:
-            history_doc = {
-                'productId': product_doc['productId'],
-                'storeId': store_price['storeId'],
-                'price': store_price['price'],
-                'inStock': store_price['inStock'],
-                'timestamp': datetime.now().isoformat()
-            }
-            db.comparator_price_history.insert_one(history_doc)
+        timestamp = datetime.now().isoformat()
+        history_docs = [{
+            'productId': product_doc['productId'],
+            'storeId': store_price['storeId'],
+            'price': store_price['price'],
+            'inStock': store_price['inStock'],
+            'timestamp': timestamp
+        } for store_price in store_prices]
+        if history_docs:
+            db.comparator_price_history.insert_many(history_docs, ordered=False)
+        
+        publish_comparator_change(product_doc['productId'], product_doc, product_name)
         
         return jsonify({
             'success': True,
@@ -76,7 +83,7 @@ def add_product():
 @products_bp.route('/comparator/products', methods=['GET'])
 def get_products():
     try:
-        db = get_mongodb()
+        db = get_mongodb(read_only=True)
         query_filter = {}
         
         if 'category' in request.args:
@@ -84,13 +91,25 @@ def get_products():
         if 'brand' in request.args:
             query_filter['brand'] = request.args['brand']
         
-        products = list(db.comparator_products.find(query_filter).sort('createdAt', -1))
+        sort = [('createdAt', -1), ('_id', -1)]
+        # Sin limit ni cursor se mantiene la respuesta completa de siempre
+        limit = None
+        if 'limit' in request.args or 'cursor' in request.args:
+            limit = parse_limit(request.args.get('limit'), config.PAGINATION_DEFAULT_LIMIT, config.PAGINATION_MAX_LIMIT)
+        projection = parse_fields(request.args.get('fields'), sort)
+        
+        products, next_cursor = paginate(
+            db.comparator_products, query_filter, sort, limit,
+            cursor=request.args.get('cursor'), projection=projection
+        )
         
         for product in products:
             product['_id'] = str(product['_id'])
         
-        return jsonify({'success': True, 'count': len(products), 'data': products}), 200
+        return jsonify({'success': True, 'count': len(products), 'data': products, 'nextCursor': next_cursor}), 200
         
+    except PaginationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -98,14 +117,28 @@ def get_products():
 @products_bp.route('/comparator/products/<product_id>', methods=['GET'])
 def get_product_detail(product_id):
     try:
-        db = get_mongodb()
+        cache = get_detail_cache()
+        token = None
+        if cache is not None:
+            body = cache.get('comparator', product_id)
+            if body is not None:
+                return current_app.response_class(body, status=200, mimetype='application/json',
+                                                  headers={'X-Cache': 'HIT'})
+            token = cache.token()
+        
+        # Con caché se lee del primario: un secundario con retraso cachearía datos previos a la invalidación
+        db = get_mongodb(read_only=cache is None)
         product = db.comparator_products.find_one({'productId': product_id})
         
         if not product:
             return jsonify({'success': False, 'error': 'Producto no encontrado'}), 404
         
         product['_id'] = str(product['_id'])
-        return jsonify({'success': True, 'data': product}), 200
+        response = jsonify({'success': True, 'data': product})
+        if cache is not None:
+            cache.put('comparator', product_id, '', response.get_data(), token)
+            response.headers['X-Cache'] = 'MISS'
+        return response, 200
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -124,26 +157,29 @@ def refresh_product_prices(product_id):
             product['name'], product['basePrice'], product['category']
         )
         
+        summary = summarize_store_prices(store_prices)
         db.comparator_products.update_one(
             {'productId': product_id},
             {'$set': {
                 'storePrices': store_prices,
-                'lowestPrice': min([p['price'] for p in store_prices if p['inStock']]),
-                'highestPrice': max([p['price'] for p in store_prices if p['inStock']]),
-                'averagePrice': sum([p['price'] for p in store_prices if p['inStock']]) / len([p for p in store_prices if p['inStock']]),
-                'availableStores': len([p for p in store_prices if p['inStock']]),
+                **summary,
                 'updatedAt': datetime.now().isoformat()
             }}
         )
-        
-        for store_price in store_prices:
-            db.comparator_price_history.insert_one({
-                'productId': product_id,
-                'storeId': store_price['storeId'],
-                'price': store_price['price'],
-                'inStock': store_price['inStock'],
-                'timestamp': datetime.now().isoformat()
-            })
+        invalidate_comparator_detail([product_id])
+        prime_comparator_events([product])
+        publish_comparator_change(product_id, summary, product['name'])
+        
+        timestamp = datetime.now().isoformat()
+        history_docs = [{
+            'productId': product_id,
+            'storeId': store_price['storeId'],
+            'price': store_price['price'],
+            'inStock': store_price['inStock'],
+            'timestamp': timestamp
+        } for store_price in store_prices]
+        if history_docs:
+            db.comparator_price_history.insert_many(history_docs, ordered=False)
         
         return jsonify({'success': True, 'message': 'Precios actualizados', 'data': {'productId': product_id, 'storePrices': store_prices}}), 200
         
@@ -160,9 +196,34 @@ def delete_product(product_id):
         if result.deleted_count == 0:
             return jsonify({'success': False, 'error': 'Producto no encontrado'}), 404
         
+        invalidate_comparator_detail([product_id])
         db.comparator_price_history.delete_many({'productId': product_id})
         
         return jsonify({'success': True, 'message': 'Producto eliminado exitosamente'}), 200
         
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@products_bp.route('/comparator/refresh-prices', methods=['POST'])
+def refresh_all_prices():
+    try:
+        try:
+            chunk_size = int(request.args.get('chunk_size', config.COMPARATOR_REFRESH_CHUNK_SIZE))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'chunk_size debe ser un entero'}), 400
+        if chunk_size < 1:
+            return jsonify({'success': False, 'error': 'chunk_size debe ser mayor que 0'}), 400
+        chunk_size = min(chunk_size, config.COMPARATOR_REFRESH_MAX_CHUNK_SIZE)
+        
+        db = get_mongodb()
+        status = start_refresh_in_background(db, chunk_size)
+        return jsonify({'success': True, 'message': 'Refresco masivo iniciado', 'data': status}), 202
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@products_bp.route('/comparator/refresh-prices', methods=['GET'])
+def refresh_all_prices_status():
+    return jsonify({'success': True, 'data': refresh_progress.snapshot()}), 200
@@ -0,0 +1,204 @@
+import logging
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===================================
+# TABLAS POR PAÍS
+# ===================================
+
+# Separador decimal, moneda y dominio de cada marketplace de Amazon
+LOCALES = {
+    'ES': {'decimal': ',', 'currency': 'EUR', 'domain': 'amazon.es'},
+    'DE': {'decimal': ',', 'currency': 'EUR', 'domain': 'amazon.de'},
+    'FR': {'decimal': ',', 'currency': 'EUR', 'domain': 'amazon.fr'},
+    'IT': {'decimal': ',', 'currency': 'EUR', 'domain': 'amazon.it'},
+    'NL': {'decimal': ',', 'currency': 'EUR', 'domain': 'amazon.nl'},
+    'US': {'decimal': '.', 'currency': 'USD', 'domain': 'amazon.com'},
+    'UK': {'decimal': '.', 'currency': 'GBP', 'domain': 'amazon.co.uk'},
+    'GB': {'decimal': '.', 'currency': 'GBP', 'domain': 'amazon.co.uk'},
+    'MX': {'decimal': '.', 'currency': 'MXN', 'domain': 'amazon.com.mx'},
+}
+DEFAULT_COUNTRY = 'ES'
+# Códigos que RapidAPI espera cuando difieren del usado en el servicio
+API_COUNTRY_CODES = {'UK': 'GB'}
+
+CURRENCY_SYMBOLS = {'€': 'EUR', '$': 'USD', '£': 'GBP', 'US$': 'USD', 'MX$': 'MXN'}
+
+# ===================================
+# PATRONES PRECOMPILADOS
+# ===================================
+
+# Primer número con posibles separadores de miles/decimales ("1.234,56", "1,234.56", "1 234,56")
+NUMBER_PATTERN = re.compile(r'\d(?:[\d.,\u00a0\u202f ]*\d)?')
+SPACES_PATTERN = re.compile(r'[\u00a0\u202f ]')
+CURRENCY_PATTERN = re.compile(r'US\$|MX\$|[€$£]|\b(?:EUR|USD|GBP|MXN)\b')
+RATING_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+NON_DIGIT_PATTERN = re.compile(r'\D')
+
+
+def normalize_country(country: Optional[str]) -> str:
+    return (country or DEFAULT_COUNTRY).upper()
+
+
+def api_country(country: Optional[str]) -> str:
+    country = normalize_country(country)
+    return API_COUNTRY_CODES.get(country, country)
+
+
+def locale_for(country: Optional[str]) -> Dict:
+    return LOCALES.get(normalize_country(country), LOCALES[DEFAULT_COUNTRY])
+
+
+def _normalize_number(token: str, decimal: str) -> str:
+    token = SPACES_PATTERN.sub('', token)
+    last_dot = token.rfind('.')
+    last_comma = token.rfind(',')
+
+    if last_dot >= 0 and last_comma >= 0:
+        # Ambos separadores: el último es el decimal
+        sep, thousands = ('.', ',') if last_dot > last_comma else (',', '.')
+        return token.replace(thousands, '').replace(sep, '.')
+
+    sep = '.' if last_dot >= 0 else (',' if last_comma >= 0 else None)
+    if sep is None:
+        return token
+    if token.count(sep) > 1:
+        # "1.234.567" / "1,234,567": separador de miles repetido
+        return token.replace(sep, '')
+
+    decimals = len(token) - token.rfind(sep) - 1
+    if decimals == 3 and sep != decimal:
+        # "1.234" en ES o "1,234" en US: miles según el país
+        return token.replace(sep, '')
+    return token.replace(sep, '.')
+
+
+def parse_price(value, country: Optional[str] = None) -> Optional[float]:
+    """Precio como float a partir de textos como "59,99 €", "$1,234.56" o "1.234,56 €" """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return _parse_price_text(str(value), locale_for(country))
+
+
+def _parse_price_text(text: str, locale: Dict) -> Optional[float]:
+    match = NUMBER_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        return float(_normalize_number(match.group(), locale['decimal']))
+    except ValueError:
+        return None
+
+
+def parse_currency(value, country: Optional[str] = None) -> str:
+    return _currency_from_text(str(value) if value else '', locale_for(country))
+
+
+def _currency_from_text(text: str, locale: Dict) -> str:
+    match = CURRENCY_PATTERN.search(text) if text else None
+    if match:
+        symbol = match.group()
+        return CURRENCY_SYMBOLS.get(symbol, symbol)
+    return locale['currency']
+
+
+def parse_rating(value) -> Optional[float]:
+    """"4,5 de 5 estrellas" / "4.5 out of 5 stars" -> 4.5"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = RATING_PATTERN.search(str(value))
+    if not match:
+        return None
+    return float(match.group().replace(',', '.'))
+
+
+def parse_review_count(value) -> int:
+    """"12.450", "12,450" o 12450 -> 12450"""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    digits = NON_DIGIT_PATTERN.sub('', str(value))
+    return int(digits) if digits else 0
+
+
+def parse_in_stock(value) -> bool:
+    # Misma regla que el parser anterior: cualquier texto que mencione 'stock'
+    return bool(value and 'stock' in str(value).lower())
+
+
+# ===================================
+# RESPUESTAS DE RAPIDAPI
+# ===================================
+
+def parse_amazon_data(data: Dict, asin: str, country: Optional[str] = None) -> Optional[Dict]:
+    """Convertir la respuesta de product-details en el documento de producto"""
+    if not isinstance(data, dict) or not isinstance(data.get('data'), dict):
+        logger.error("❌ Respuesta sin campo 'data' para %s: %s", asin, str(data)[:200])
+        return None
+
+    product_data = data['data']
+    locale = locale_for(country)
+
+    price_str = product_data.get('product_price')
+    if isinstance(price_str, str):
+        price = _parse_price_text(price_str, locale) if price_str else None
+    else:
+        price = parse_price(price_str, country)
+    if price is None:
+        logger.warning("⚠️ Sin precio válido para %s: %r", asin, price_str)
+
+    brand = 'Amazon'
+    product_info = product_data.get('product_information')
+    if isinstance(product_info, dict):
+        brand = product_info.get('Brand') or 'Amazon'
+
+    title = product_data.get('product_title') or 'Sin título'
+    in_stock = parse_in_stock(product_data.get('product_availability'))
+
+    parsed = {
+        'external_id': asin,
+        'title': title[:500],
+        'brand': brand[:100],
+        'category': 'electronics',
+        'current_price': price,
+        'currency': product_data.get('currency') or _currency_from_text(price_str if isinstance(price_str, str) else '', locale),
+        'marketplace': 'amazon',
+        'country': normalize_country(country),
+        'rating': parse_rating(product_data.get('product_star_rating')),
+        'review_count': parse_review_count(product_data.get('product_num_ratings')),
+        'stock_status': 'in_stock' if in_stock else 'out_of_stock',
+        'image_url': product_data.get('product_photo') or '',
+        'last_updated': datetime.now(),
+        'url': f"https://www.{locale['domain']}/dp/{asin}"
+    }
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📦 %s: %s %s ⭐ %s 📝 %s", asin, price, parsed['currency'], parsed['rating'], parsed['review_count'])
+    return parsed
+
+
+def parse_amazon_batch(responses: Iterable[Tuple[Dict, str]], country: Optional[str] = None) -> List[Optional[Dict]]:
+    """Parsear muchas respuestas (data, asin); None en las que no se puedan parsear"""
+    results = []
+    failed = 0
+    for data, asin in responses:
+        try:
+            parsed = parse_amazon_data(data, asin, country)
+        except Exception as e:
+            logger.error("❌ Error parseando %s: %s", asin, e)
+            parsed = None
+        if parsed is None:
+            failed += 1
+        results.append(parsed)
+    if failed:
+        logger.warning("⚠️ %s/%s respuestas sin parsear", failed, len(results))
+    return results
@@ -1,19 +1,25 @@
-import requests
 import os
+import sys
 from datetime import datetime
-from pymongo import MongoClient
 import logging
 
-logging.basicConfig(level=logging.INFO)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from config import config
+from services.rate_limiter import get_rate_limiter
+from services.http_client import get_http_session
+from services.response_cache import get_response_cache
+from services.structured_logging import configure_logging
+from scrapers import amazon_parser
+
 logger = logging.getLogger(__name__)
 
 class ProductScraper:
-    def __init__(self, mongo_uri, rapidapi_key):
+    def __init__(self, rapidapi_key):
         self.rapidapi_key = rapidapi_key
-        self.mongo_client = MongoClient(mongo_uri)
-        self.db = self.mongo_client.smartshop
+        self.rate_limiter = get_rate_limiter()
+        self.session = get_http_session()
         
-        self.rapidapi_url = "https://real-time-amazon-data.p.rapidapi.com/product-details"
+        self.rapidapi_url = f"{config.RAPIDAPI_BASE_URL}/product-details"
         self.headers = {
             "x-rapidapi-key": self.rapidapi_key,
             "x-rapidapi-host": "real-time-amazon-data.p.rapidapi.com"
@@ -24,89 +30,79 @@ class ProductScraper:
         try:
             querystring = {
                 "asin": asin,
-                "country": country
+                "country": amazon_parser.api_country(country)
             }
             
-            response = requests.get(
-                self.rapidapi_url,
-                headers=self.headers,
-                params=querystring,
-                timeout=10
-            )
+            cache = get_response_cache()
+            if cache is not None:
+                cached = cache.get(asin, country)
+                if cached is not None:
+                    payload, fetched_at = cached
+                    product = self.parse_amazon_data(payload, asin, country)
+                    if product is not None:
+                        product['last_updated'] = product['cached_at'] = datetime.fromtimestamp(fetched_at)
+                    return product
+            
+            for attempt in range(config.RAPIDAPI_MAX_RETRIES + 1):
+                self.rate_limiter.acquire()
+                response = self.session.get(
+                    self.rapidapi_url,
+                    headers=self.headers,
+                    params=querystring,
+                    timeout=config.HTTP_TIMEOUT
+                )
+                
+                if response.status_code == 429:
+                    # Límite alcanzado: frenar el limitador compartido y reintentar
+                    self.rate_limiter.on_throttled(self._parse_retry_after(response))
+                    logger.warning(
+                        "⚠️ Error 429: Límite de requests alcanzado (intento %d/%d, nueva tasa %.2f req/s)",
+                        attempt + 1, config.RAPIDAPI_MAX_RETRIES + 1, self.rate_limiter.rate
+                    )
+                    continue
+                
+                if response.status_code == 200:
+                    self.rate_limiter.on_success()
+                    data = response.json()
+                    if cache is not None and data.get('status') == 'OK':
+                        cache.put(asin, country, response.content)
+                    return self.parse_amazon_data(data, asin, country)
+                else:
+                    logger.error("❌ Error API: %s", response.status_code)
+                    return None
             
-            if response.status_code == 200:
-                data = response.json()
-                return self.parse_amazon_data(data, asin)
-            else:
-                logger.error(f"❌ Error API: {response.status_code}")
-                return None
+            logger.error("❌ Error 429: reintentos agotados para %s", asin)
+            return None
                 
         except Exception as e:
-            logger.error(f"❌ Error obteniendo producto: {e}")
+            logger.error("❌ Error obteniendo producto: %s", e)
+            return None
+    
+    @staticmethod
+    def _parse_retry_after(response):
+        """Segundos indicados en la cabecera Retry-After (si existe)"""
+        value = response.headers.get('Retry-After')
+        try:
+            return float(value) if value else None
+        except ValueError:
             return None
     
-    def parse_amazon_data(self, data, asin):
+    def parse_amazon_data(self, data, asin, country='ES'):
         """Parsear respuesta de la API"""
         try:
-            product_data = data.get('data', {})
-            
-            # Precio
-            price_info = product_data.get('product_price', '')
-            price = None
-            if price_info:
-                # Extraer número del precio (ej: "59,99 €" -> 59.99)
-                price_str = ''.join(c for c in price_info if c.isdigit() or c in '.,')
-                price = float(price_str.replace(',', '.'))
-            
-            parsed = {
-                'external_id': asin,
-                'title': product_data.get('product_title', ''),
-                'brand': product_data.get('product_information', {}).get('Brand', ''),
-                'category': 'electronics',  # Puedes mejorarlo
-                'current_price': price,
-                'currency': 'EUR',
-                'marketplace': 'amazon',
-                'rating': float(product_data.get('product_star_rating', '0').split()[0]) if product_data.get('product_star_rating') else None,
-                'review_count': product_data.get('product_num_ratings', 0),
-                'stock_status': 'in_stock' if product_data.get('product_availability') else 'out_of_stock',
-                'image_url': product_data.get('product_photo', ''),
-                'last_updated': datetime.now(),
-                'url': f"https://www.amazon.es/dp/{asin}"
-            }
-            
-            return parsed
-            
+            return amazon_parser.parse_amazon_data(data, asin, country)
         except Exception as e:
-            logger.error(f"❌ Error parseando datos: {e}")
+            logger.error("❌ Error parseando datos: %s", e)
             return None
     
     def update_product_in_db(self, product_data):
-        """Actualizar producto en MongoDB"""
-        try:
-            # Actualizar o insertar producto
-            result = self.db.products.update_one(
-                {'external_id': product_data['external_id']},
-                {'$set': product_data},
-                upsert=True
-            )
-            
-            # Guardar historial de precios
-            if product_data.get('current_price'):
-                price_history = {
-                    'product_id': product_data['external_id'],
-                    'price': product_data['current_price'],
-                    'currency': product_data['currency'],
-                    'timestamp': datetime.now(),
-                    'marketplace': product_data['marketplace']
-                }
-                self.db.price_history.insert_one(price_history)
-            
-            logger.info(f"✅ Producto actualizado: {product_data['title']} - {product_data['current_price']}€")
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Error guardando en DB: {e}")
-            return False
+        """Guardar con el mismo camino de escritura que el servicio
+
+        Histórico (motor y modo configurados), lotes, caché de detalle,
+        contadores, eventos y alertas son los de app.ProductScraper: este
+        módulo no escribe en MongoDB por su cuenta.
+        """
+        return _ingestion_scraper(self.rapidapi_key).update_product_in_db(product_data)
     
     def update_all_tracked_products(self):
         """Actualizar todos los productos trackeados"""
@@ -117,25 +113,25 @@ class ProductScraper:
             'B08N5WRWNW',  # Echo Dot
         ]
         
-        for asin in test_products:
-            logger.info(f"🔄 Actualizando producto: {asin}")
-            product_data = self.get_amazon_product(asin)
-            
-            if product_data:
-                self.update_product_in_db(product_data)
-            
-            # Esperar un poco entre requests
-            import time
-            time.sleep(2)
+        logger.info("🔄 Actualizando %s productos", len(test_products))
+        return _ingestion_scraper(self.rapidapi_key).refresh_products(test_products)
+
+
+def _ingestion_scraper(rapidapi_key):
+    """Scraper del servicio (import diferido: app conecta a las bases de datos al importarse)"""
+    import app
+    return app.ProductScraper(rapidapi_key)
 
 # Script principal
 if __name__ == '__main__':
-    MONGO_URI = os.getenv('MONGODB_URI', 'mongodb://mongodb:27017/')
+    configure_logging()
+    # Ejecución puntual: sin los jobs periódicos del servicio
+    config.SCHEDULER_ENABLED = False
     RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY', '')
     
     if not RAPIDAPI_KEY:
         logger.error("❌ RAPIDAPI_KEY no configurada")
         exit(1)
     
-    scraper = ProductScraper(MONGO_URI, RAPIDAPI_KEY)
+    scraper = ProductScraper(RAPIDAPI_KEY)
     scraper.update_all_tracked_products()
\ No newline at end of file
@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+ALERT_QUERY = """
+    SELECT id, product_external_id, alert_type, threshold_price
+    FROM alerts
+    WHERE is_active = true AND id > %s
+    ORDER BY id
+"""
+
+FLUSH_QUERY = """
+    UPDATE alerts AS a
+    SET last_triggered = v.triggered_at
+    FROM (VALUES %s) AS v(id, triggered_at)
+    WHERE a.id = v.id AND a.is_active = true
+"""
+
+# Esquema de services/analytics/init-db.sql; databases/postgres/init.sql define
+# otra tabla `alerts` (UUID, threshold_value, active) que el motor no entiende
+REQUIRED_COLUMNS = ('id', 'product_external_id', 'alert_type', 'threshold_price', 'is_active', 'last_triggered')
+
+SCHEMA_QUERY = """
+    SELECT column_name
+    FROM information_schema.columns
+    WHERE table_name = 'alerts' AND table_schema = current_schema()
+"""
+
+
+def missing_alert_columns(postgres_pool) -> List[str]:
+    """Columnas que necesita el motor y no tiene la tabla `alerts`"""
+    with postgres_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SCHEMA_QUERY)
+            columns = {row[0] for row in cursor.fetchall()}
+    return [column for column in REQUIRED_COLUMNS if column not in columns]
+
+
+def should_trigger(alert_type: str, threshold: Optional[float],
+                   old: Optional[Tuple], new: Tuple) -> bool:
+    """¿Dispara la alerta al pasar de `old` a `new` ((precio, stock_status))?
+
+    Solo se dispara al cruzar la condición, no mientras se mantiene. Si no se
+    conoce el estado anterior se evalúa la condición tal cual, como el
+    simulador de analytics.
+    """
+    old_price, old_stock = old if old else (None, None)
+    new_price, new_stock = new
+
+    if alert_type in ('price_drop', 'price_increase'):
+        if new_price is None:
+            return False
+        if threshold is None:
+            # Sin umbral: cualquier bajada/subida respecto al precio anterior
+            if old_price is None:
+                return False
+            return new_price < old_price if alert_type == 'price_drop' else new_price > old_price
+        if alert_type == 'price_drop':
+            return new_price <= threshold and (old_price is None or old_price > threshold)
+        return new_price >= threshold and (old_price is None or old_price < threshold)
+
+    if alert_type == 'stock_available':
+        return new_stock == 'in_stock' and old_stock != 'in_stock'
+    if alert_type == 'stock_out':
+        return new_stock == 'out_of_stock' and old_stock != 'out_of_stock'
+    return False
+
+
+class AlertEngine:
+    """Evaluación de alertas de precio/stock en la propia ingesta
+
+    Las alertas activas se indexan por product_external_id: cada producto
+    guardado se evalúa en O(alertas del producto) contra su último estado
+    conocido. Los `last_triggered` se acumulan y se escriben en PostgreSQL
+    en un único UPDATE por lote.
+    """
+
+    def __init__(self, postgres_pool, db, refresh_seconds: float = 30, full_reload_seconds: float = 600,
+                 flush_size: int = 100):
+        self.postgres_pool = postgres_pool
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.flush_size = flush_size
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._alerts: Dict[str, List[Dict]] = {}
+        self._state: Dict[str, Tuple] = {}
+        self._pending: Dict[int, datetime] = {}
+        self._max_id = 0
+        self._loaded_at = None
+        self._full_loaded_at = None
+        self._counts = {'triggered': 0, 'flushed': 0, 'flush_errors': 0}
+
+    # ===================================
+    # ÍNDICE DE ALERTAS
+    # ===================================
+
+    def _fetch(self, after_id: int) -> Dict[str, List[Dict]]:
+        with self.postgres_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(ALERT_QUERY, (after_id,))
+                rows = cursor.fetchall()
+        index: Dict[str, List[Dict]] = {}
+        for alert_id, external_id, alert_type, threshold in rows:
+            index.setdefault(external_id, []).append({
+                'id': alert_id,
+                'alert_type': alert_type,
+                'threshold': float(threshold) if threshold is not None else None
+            })
+        return index
+
+    def _load_state(self, external_ids: List[str]) -> Dict[str, Tuple]:
+        """Último precio/stock guardado de los productos con alertas nuevas"""
+        if not external_ids or self.db is None:
+            return {}
+        cursor = self.db.products.find(
+            {'external_id': {'$in': external_ids}},
+            {'external_id': 1, 'current_price': 1, 'stock_status': 1, '_id': 0}
+        )
+        return {doc['external_id']: (doc.get('current_price'), doc.get('stock_status')) for doc in cursor}
+
+    def refresh(self, force_full: bool = False):
+        """Recargar el índice: completo cada `full_reload_seconds` (bajas y
+        desactivaciones), y solo las alertas nuevas (id creciente) entre medias"""
+        now = time.monotonic()
+        full = (force_full or self._full_loaded_at is None
+                or now - self._full_loaded_at >= self.full_reload_seconds)
+        if not full and self._loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+            return
+
+        index = self._fetch(0 if full else self._max_id)
+        with self._lock:
+            known = set(self._state)
+        state = self._load_state([external_id for external_id in index if external_id not in known])
+        max_id = max((alert['id'] for alerts in index.values() for alert in alerts), default=0)
+
+        with self._lock:
+            if full:
+                self._alerts = index
+                # Sin alertas no hace falta recordar su estado
+                self._state = {k: v for k, v in self._state.items() if k in index}
+                self._max_id = max_id
+                self._full_loaded_at = now
+            else:
+                for external_id, alerts in index.items():
+                    self._alerts.setdefault(external_id, []).extend(alerts)
+                self._max_id = max(self._max_id, max_id)
+            for external_id, product_state in state.items():
+                self._state.setdefault(external_id, product_state)
+            self._loaded_at = now
+
+        if full or index:
+            logger.info(
+                "🔔 Alertas %s: "
+                "%s en %s productos",
+                'recargadas' if full else 'nuevas', sum(len(alerts) for alerts in index.values()), len(index)
+            )
+
+    # ===================================
+    # EVALUACIÓN
+    # ===================================
+
+    def observe(self, product_data: Dict) -> List[Dict]:
+        """Evaluar las alertas del producto con su nuevo precio/stock"""
+        external_id = product_data.get('external_id')
+        new = (product_data.get('current_price'), product_data.get('stock_status'))
+        with self._lock:
+            alerts = self._alerts.get(external_id)
+            if not alerts:
+                return []
+            old = self._state.get(external_id)
+            self._state[external_id] = new
+            triggered = [
+                alert for alert in alerts
+                if should_trigger(alert['alert_type'], alert['threshold'], old, new)
+            ]
+            if triggered:
+                now = datetime.now()
+                for alert in triggered:
+                    self._pending[alert['id']] = now
+                self._counts['triggered'] += len(triggered)
+            pending = len(self._pending)
+
+        for alert in triggered:
+            metrics.ALERTS_TRIGGERED.labels(alert_type=alert['alert_type']).inc()
+            logger.info(
+                "🔔 Alerta %s disparada: %s (%s -> %s)", alert['alert_type'], external_id, old, new,
+                extra={"event": "alert_triggered", "alert_id": alert['id'], "external_id": external_id}
+            )
+        if pending >= self.flush_size:
+            self.flush()
+        return triggered
+
+    def flush(self) -> int:
+        """Escribir los last_triggered pendientes en un único UPDATE"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                with metrics.stage_timer('postgres_query'), self.postgres_pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        execute_values(cursor, FLUSH_QUERY, list(pending.items()), page_size=500)
+            except Exception as e:
+                logger.error("❌ Error guardando %s alertas disparadas: %s", len(pending), e)
+                with self._lock:
+                    # Reintentar en el siguiente flush sin pisar disparos más recientes
+                    for alert_id, triggered_at in pending.items():
+                        self._pending.setdefault(alert_id, triggered_at)
+                    self._counts['flush_errors'] += 1
+                return 0
+            with self._lock:
+                self._counts['flushed'] += len(pending)
+            return len(pending)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'alerts': sum(len(alerts) for alerts in self._alerts.values()),
+                'products': len(self._alerts),
+                'pending': len(self._pending),
+                **self._counts
+            }
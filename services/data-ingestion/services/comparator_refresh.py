@@ -0,0 +1,232 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from services import metrics
+from services.detail_cache import get_detail_cache
+from services.price_events import get_price_events
+from services.price_generator import PriceGenerator
+
+logger = logging.getLogger(__name__)
+
+REFRESH_FIELDS = {'productId': 1, 'name': 1, 'basePrice': 1, 'category': 1, 'lowestPrice': 1, 'availableStores': 1}
+
+
+def _stock_status(available_stores) -> str:
+    return 'in_stock' if available_stores else 'out_of_stock'
+
+
+def prime_comparator_events(products: List[Dict]):
+    """Cargar el estado guardado de productos del comparador antes de publicar sus cambios"""
+    get_price_events().prime('comparator', {
+        product['productId']: (product.get('lowestPrice'), _stock_status(product.get('availableStores')))
+        for product in products if product.get('productId') and 'lowestPrice' in product
+    })
+
+
+def publish_comparator_change(product_id: str, summary: Dict, name: Optional[str] = None):
+    """Difundir el nuevo precio mínimo/stock de un producto del comparador"""
+    get_price_events().observe(
+        'comparator', product_id, summary['lowestPrice'], _stock_status(summary['availableStores']),
+        title=name, available_stores=summary['availableStores']
+    )
+
+
+def invalidate_comparator_detail(product_ids: List[str]):
+    """Quitar de la caché de detalle los productos del comparador recién escritos"""
+    cache = get_detail_cache()
+    if cache is not None:
+        cache.invalidate_many('comparator', product_ids)
+
+
+def summarize_store_prices(store_prices: List[Dict]) -> Dict:
+    """Campos agregados de un producto a partir de sus precios por tienda"""
+    available = [p['price'] for p in store_prices if p['inStock']]
+    return {
+        'lowestPrice': min(available) if available else None,
+        'highestPrice': max(available) if available else None,
+        'averagePrice': sum(available) / len(available) if available else None,
+        'availableStores': len(available)
+    }
+
+
+class RefreshProgress:
+    """Estado de la última ejecución del refresco masivo (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {'status': 'idle'}
+
+    def start(self, total: int):
+        with self._lock:
+            self._state = {
+                'status': 'running',
+                'total': total,
+                'processed': 0,
+                'errors': 0,
+                'startedAt': datetime.now().isoformat(),
+                'finishedAt': None,
+                'elapsedSeconds': 0.0,
+                'productsPerSecond': 0.0
+            }
+            self._started = time.monotonic()
+
+    def advance(self, processed: int, errors: int):
+        with self._lock:
+            self._state['processed'] += processed
+            self._state['errors'] += errors
+            self._update_rate()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            self._state['status'] = status
+            self._state['finishedAt'] = datetime.now().isoformat()
+            if error:
+                self._state['error'] = error
+            self._update_rate()
+
+    def _update_rate(self):
+        elapsed = time.monotonic() - self._started
+        self._state['elapsedSeconds'] = round(elapsed, 3)
+        if elapsed > 0:
+            self._state['productsPerSecond'] = round(self._state['processed'] / elapsed, 1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self._state)
+
+    @property
+    def running(self) -> bool:
+        with self._lock:
+            return self._state['status'] == 'running'
+
+
+progress = RefreshProgress()
+_run_lock = threading.Lock()
+
+
+def _refresh_chunk(db, generator: PriceGenerator, products: List[Dict]) -> Dict:
+    valid = [p for p in products if all(field in p for field in ('name', 'basePrice', 'category'))]
+    errors = len(products) - len(valid)
+    if not valid:
+        return {'processed': len(products), 'errors': errors}
+
+    batch = generator.generate_prices_batch(
+        [p['name'] for p in valid],
+        [float(p['basePrice']) for p in valid],
+        [p['category'] for p in valid]
+    )
+
+    timestamp = datetime.now().isoformat()
+    updates = []
+    summaries = []
+    history_docs = []
+    for product, store_prices in zip(valid, batch):
+        fields = summarize_store_prices(store_prices)
+        summaries.append((product, dict(fields)))
+        fields.update({'storePrices': store_prices, 'updatedAt': timestamp})
+        updates.append(UpdateOne({'_id': product['_id']}, {'$set': fields}))
+        history_docs.extend({
+            'productId': product.get('productId'),
+            'storeId': store_price['storeId'],
+            'price': store_price['price'],
+            'inStock': store_price['inStock'],
+            'timestamp': timestamp
+        } for store_price in store_prices)
+
+    try:
+        db.comparator_products.bulk_write(updates, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get('writeErrors', [])
+        errors += len(write_errors)
+        for write_error in write_errors:
+            logger.error("❌ Error actualizando %s: %s", valid[write_error['index']].get('productId'), write_error.get('errmsg'))
+
+    if history_docs:
+        try:
+            db.comparator_price_history.insert_many(history_docs, ordered=False)
+        except BulkWriteError as e:
+            logger.error("❌ %s filas de histórico no insertadas", len(e.details.get('writeErrors', [])))
+
+    invalidate_comparator_detail([product.get('productId') for product in valid])
+    prime_comparator_events(valid)
+    for product, summary in summaries:
+        publish_comparator_change(product.get('productId'), summary, product.get('name'))
+
+    return {'processed': len(products), 'errors': errors}
+
+
+def _begin(db) -> bool:
+    """Reservar la ejecución; False si ya hay un refresco en curso"""
+    if not _run_lock.acquire(blocking=False):
+        return False
+    try:
+        progress.start(db.comparator_products.estimated_document_count())
+    except Exception:
+        _run_lock.release()
+        raise
+    return True
+
+
+def _execute(db, chunk_size: int, on_chunk: Optional[Callable[[Dict], None]] = None) -> Dict:
+    try:
+        # Generador nuevo: la semilla depende del día de la ejecución
+        generator = PriceGenerator()
+        logger.info("🔄 Refresco masivo del comparador iniciado (%s productos aprox.)", progress.snapshot()['total'])
+
+        cursor = db.comparator_products.find({}, REFRESH_FIELDS, batch_size=chunk_size)
+        chunk = []
+        for product in cursor:
+            chunk.append(product)
+            if len(chunk) >= chunk_size:
+                result = _refresh_chunk(db, generator, chunk)
+                progress.advance(result['processed'], result['errors'])
+                chunk = []
+                snapshot = progress.snapshot()
+                logger.info("📦 %s/%s productos (%s productos/s)", snapshot['processed'], snapshot['total'], snapshot['productsPerSecond'])
+                if on_chunk:
+                    on_chunk(snapshot)
+        if chunk:
+            result = _refresh_chunk(db, generator, chunk)
+            progress.advance(result['processed'], result['errors'])
+
+        progress.finish('completed')
+        snapshot = progress.snapshot()
+        metrics.observe_run('comparator', snapshot['elapsedSeconds'], snapshot['processed'])
+        logger.info(
+            "✅ Refresco masivo completado: %s productos en "
+            "%ss (%s productos/s)",
+            snapshot['processed'], snapshot['elapsedSeconds'], snapshot['productsPerSecond']
+        )
+        return snapshot
+
+    except Exception as e:
+        logger.error("❌ Error en el refresco masivo: %s", e)
+        progress.finish('failed', str(e))
+        return progress.snapshot()
+    finally:
+        _run_lock.release()
+
+
+def refresh_all_comparator_prices(db, chunk_size: int = 1000,
+                                  on_chunk: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Regenerar los precios de todo el catálogo del comparador por bloques"""
+    if not _begin(db):
+        logger.warning("⚠️ Ya hay un refresco masivo en curso")
+        return progress.snapshot()
+    return _execute(db, chunk_size, on_chunk)
+
+
+def start_refresh_in_background(db, chunk_size: int = 1000) -> Dict:
+    """Lanzar el refresco en un hilo y devolver el estado inicial"""
+    if _begin(db):
+        threading.Thread(
+            target=_execute, args=(db, chunk_size),
+            name='comparator-refresh', daemon=True
+        ).start()
+    return progress.snapshot()
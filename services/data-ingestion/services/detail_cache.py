@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import config
+from services import metrics
+
+
+class DetailCache:
+    """Caché en memoria (LRU + TTL) de respuestas de detalle ya serializadas
+
+    Cada entrada es el cuerpo JSON en bytes de una respuesta, con clave
+    (espacio, id, variante): un acierto no toca la base de datos ni vuelve a
+    serializar. La capacidad se limita por número de entradas y por bytes.
+
+    Las escrituras invalidan todas las variantes de un id. Para que una
+    lectura lenta no vuelva a cachear datos anteriores a una invalidación,
+    `put` recibe el `token()` tomado antes de consultar y se descarta si el id
+    se invalidó después. Quien llama debe leer los fallos del primario: el
+    token no detecta un secundario con retraso. Las escrituras de otras
+    réplicas solo se ven al caducar el TTL.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 30, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[str, str, str], Tuple[float, bytes]]' = OrderedDict()
+        self._variants: Dict[Tuple[str, str], set] = {}
+        self._bytes = 0
+        # Época de la última invalidación de cada id, para descartar puts obsoletos
+        self._epoch = 0
+        self._invalidated: Dict[Tuple[str, str], int] = {}
+        self._floor = 0
+        self._counts = {'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0, 'stale_puts': 0,
+                        'evictions': 0, 'invalidations': 0}
+
+    # ===================================
+    # LECTURA / ESCRITURA
+    # ===================================
+
+    def get(self, namespace: str, key: str, variant: str = '') -> Optional[bytes]:
+        entry_key = (namespace, key, variant)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                self._counts['misses'] += 1
+                outcome = 'miss'
+            elif entry[0] <= now:
+                self._remove(entry_key)
+                self._counts['expired'] += 1
+                self._counts['misses'] += 1
+                outcome = 'expired'
+            else:
+                self._entries.move_to_end(entry_key)
+                self._counts['hits'] += 1
+                outcome = 'hit'
+        metrics.DETAIL_CACHE.labels(namespace=namespace, result=outcome).inc()
+        return entry[1] if outcome == 'hit' else None
+
+    def token(self) -> int:
+        """Marca a tomar antes de leer de la base de datos y pasar a `put`"""
+        with self._lock:
+            return self._epoch
+
+    def put(self, namespace: str, key: str, variant: str, body: bytes, token: int) -> bool:
+        """Guardar un cuerpo salvo que el id se haya invalidado desde `token`"""
+        if len(body) > self.max_bytes:
+            return False
+        entry_key = (namespace, key, variant)
+        with self._lock:
+            if token < self._floor or self._invalidated.get((namespace, key), -1) > token:
+                self._counts['stale_puts'] += 1
+                return False
+            self._remove(entry_key)
+            self._entries[entry_key] = (time.monotonic() + self.ttl, body)
+            self._variants.setdefault((namespace, key), set()).add(variant)
+            self._bytes += len(body)
+            self._counts['stores'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counts['evictions'] += 1
+        return True
+
+    def _remove(self, entry_key: Tuple[str, str, str]):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[1])
+        variants = self._variants.get(entry_key[:2])
+        if variants is not None:
+            variants.discard(entry_key[2])
+            if not variants:
+                del self._variants[entry_key[:2]]
+
+    # ===================================
+    # INVALIDACIÓN
+    # ===================================
+
+    def invalidate(self, namespace: str, key: str):
+        self.invalidate_many(namespace, [key])
+
+    def invalidate_many(self, namespace: str, keys: Iterable[str]):
+        """Borrar todas las variantes de los ids tras escribir en ellos"""
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                for variant in list(self._variants.get((namespace, key), ())):
+                    self._remove((namespace, key, variant))
+                self._invalidated[(namespace, key)] = self._epoch
+                self._counts['invalidations'] += 1
+            # Acotar el registro: los tokens anteriores al corte dejan de ser válidos
+            if len(self._invalidated) > 4 * self.max_entries:
+                self._invalidated.clear()
+                self._floor = self._epoch
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._variants.clear()
+            self._bytes = 0
+            self._epoch += 1
+            self._floor = self._epoch
+            self._invalidated.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+            entries, size = len(self._entries), self._bytes
+        lookups = counts['hits'] + counts['misses']
+        return {
+            'entries': entries,
+            'size_bytes': size,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl,
+            'hit_ratio': round(counts['hits'] / lookups, 4) if lookups else 0.0,
+            **counts
+        }
+
+
+# ===================================
+# CACHÉ COMPARTIDA
+# ===================================
+
+_detail_cache = None
+_detail_cache_lock = threading.Lock()
+
+
+def get_detail_cache() -> Optional[DetailCache]:
+    """Caché de detalle del proceso, o None si está desactivada"""
+    global _detail_cache
+    if not config.DETAIL_CACHE_ENABLED:
+        return None
+    if _detail_cache is None:
+        with _detail_cache_lock:
+            if _detail_cache is None:
+                _detail_cache = DetailCache(
+                    max_entries=config.DETAIL_CACHE_MAX_ENTRIES,
+                    ttl=config.DETAIL_CACHE_TTL,
+                    max_bytes=config.DETAIL_CACHE_MAX_BYTES
+                )
+    return _detail_cache
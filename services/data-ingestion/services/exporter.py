@@ -0,0 +1,187 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from database.price_history import country_filter
+from scrapers.amazon_parser import DEFAULT_COUNTRY
+
+logger = logging.getLogger(__name__)
+
+SOURCE_PRICE_HISTORY = 'price_history'
+SOURCE_COMPARATOR = 'comparator'
+
+FORMATS = ('ndjson', 'csv')
+
+# Columnas CSV de cada origen
+CSV_COLUMNS = {
+    SOURCE_PRICE_HISTORY: ['product_id', 'marketplace', 'country', 'timestamp', 'price', 'currency',
+                           'stock_status', 'last_seen', 'samples'],
+    SOURCE_COMPARATOR: ['productId', 'storeId', 'timestamp', 'price', 'inStock'],
+}
+
+# Tamaño aproximado de cada bloque enviado al cliente
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+def build_query(source: str, product_id: Optional[str] = None, marketplace: Optional[str] = None,
+                start: Optional[datetime] = None, end: Optional[datetime] = None,
+                country: Optional[str] = None) -> Dict:
+    """Filtro MongoDB para el origen indicado"""
+    query = {}
+    time_range = {}
+    if source == SOURCE_COMPARATOR:
+        # El histórico del comparador guarda timestamps ISO (texto) y la tienda en storeId
+        if product_id:
+            query['productId'] = product_id
+        if marketplace:
+            query['storeId'] = marketplace
+        if start:
+            time_range['$gte'] = start.isoformat()
+        if end:
+            time_range['$lte'] = end.isoformat()
+    else:
+        if product_id:
+            query['product_id'] = product_id
+        if marketplace:
+            query['marketplace'] = marketplace
+        if country:
+            query.update(country_filter(country))
+        if start:
+            time_range['$gte'] = start
+        if end:
+            time_range['$lte'] = end
+    if time_range:
+        query['timestamp'] = time_range
+    return query
+
+
+def iter_documents(db, source: str, query: Dict, history_store=None) -> Iterator[Dict]:
+    """Documentos del origen leídos directamente del cursor de MongoDB"""
+    if source == SOURCE_COMPARATOR:
+        cursor = db.comparator_price_history.find(query, {'_id': 0}, batch_size=1000)
+        if 'productId' in query:
+            cursor = cursor.sort('timestamp', 1)
+        return cursor
+    return (_with_country(point) for point in history_store.iter_points(query))
+
+
+def _with_country(point: Dict) -> Dict:
+    # Los puntos anteriores al multipaís no tienen país: son del país por defecto
+    if not point.get('country'):
+        point['country'] = DEFAULT_COUNTRY
+    return point
+
+
+def ndjson_chunks(documents: Iterable[Dict]) -> Iterator[bytes]:
+    buffer = []
+    size = 0
+    for document in documents:
+        document.pop('_id', None)
+        line = json.dumps(document, default=_json_default, ensure_ascii=False) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def csv_chunks(documents: Iterable[Dict], columns: List[str]) -> Iterator[bytes]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    for document in documents:
+        writer.writerow([
+            _json_default(document[column]) if isinstance(document.get(column), (datetime, ObjectId))
+            else document.get(column, '')
+            for column in columns
+        ])
+        if output.tell() >= CHUNK_SIZE:
+            yield output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate(0)
+    if output.tell():
+        yield output.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprimir en streaming con formato gzip (wbits=31)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(db, source: str, fmt: str, query: Dict, history_store=None,
+                  compress: bool = False) -> Iterator[bytes]:
+    """Generador de bytes con la exportación completa (memoria constante)"""
+    documents = iter_documents(db, source, query, history_store)
+    if fmt == 'csv':
+        chunks = csv_chunks(documents, CSV_COLUMNS[source])
+    else:
+        chunks = ndjson_chunks(documents)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+if __name__ == '__main__':
+    from config import config
+    from database.mongodb import get_mongodb
+    from database.price_history import configured_storage, get_price_history_store
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Exportar histórico de precios en streaming')
+    parser.add_argument('--source', choices=[SOURCE_PRICE_HISTORY, SOURCE_COMPARATOR], default=SOURCE_PRICE_HISTORY)
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--product', help='product_id / productId')
+    parser.add_argument('--marketplace', help='marketplace (o storeId en el comparador)')
+    parser.add_argument('--country', help='País de Amazon (solo price_history)')
+    parser.add_argument('--from', dest='start', help='Fecha inicial ISO 8601')
+    parser.add_argument('--to', dest='end', help='Fecha final ISO 8601')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('-o', '--output', help='Fichero de salida (por defecto stdout)')
+    args = parser.parse_args()
+
+    db = get_mongodb()
+    store = get_price_history_store(db, configured_storage(), config.PRICE_HISTORY_BUCKET,
+                                    config.PRICE_HISTORY_BUCKET_MAX_POINTS)
+    query = build_query(args.source, args.product, args.marketplace,
+                        parse_datetime(args.start), parse_datetime(args.end), args.country)
+
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for chunk in export_stream(db, args.source, args.format, query, store, args.gzip):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            output.close()
+    logger.info("✅ Exportación completada: %s bytes", written)
@@ -0,0 +1,101 @@
+import threading
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import config
+
+
+class _LatencyTracker:
+    """Acumula latencias de respuesta a partir del hook de requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.total_seconds = 0.0
+
+    def hook(self, response, *args, **kwargs):
+        with self._lock:
+            self.responses += 1
+            self.total_seconds += response.elapsed.total_seconds()
+        return response
+
+
+_http_session = None
+_http_adapter = None
+_latency = _LatencyTracker()
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    # Solo se reintentan fallos de conexión: la petición no llegó a RapidAPI y
+    # no consume cuota. Un fallo de lectura ya se ha facturado y reintentarlo
+    # aquí saltaría el token bucket, así que se deja a quien llama.
+    retry = Retry(
+        total=config.HTTP_MAX_RETRIES,
+        connect=config.HTTP_MAX_RETRIES,
+        read=0,
+        other=0,
+        status=0,
+        backoff_factor=config.HTTP_BACKOFF_FACTOR,
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_SIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    session.hooks['response'].append(_latency.hook)
+    return session, adapter
+
+
+def get_http_session() -> requests.Session:
+    """Sesión HTTP compartida con pool keep-alive y reintentos de conexión con backoff"""
+    global _http_session, _http_adapter
+    if _http_session is None:
+        with _session_lock:
+            if _http_session is None:
+                _http_session, _http_adapter = _build_session()
+    return _http_session
+
+
+def get_http_stats() -> Dict:
+    """Estadísticas de reutilización de conexiones del pool"""
+    stats = {
+        "pool_size": config.HTTP_POOL_SIZE,
+        "requests": 0,
+        "connections_opened": 0,
+        "connection_reuse_ratio": 0.0,
+        "avg_latency_ms": 0.0
+    }
+    if _http_adapter is None:
+        return stats
+
+    pools = _http_adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats["requests"] += pool.num_requests
+        stats["connections_opened"] += pool.num_connections
+
+    if stats["requests"]:
+        stats["connection_reuse_ratio"] = round(1 - stats["connections_opened"] / stats["requests"], 4)
+    if _latency.responses:
+        stats["avg_latency_ms"] = round(_latency.total_seconds / _latency.responses * 1000, 2)
+    return stats
+
+
+def close_http_session():
+    global _http_session, _http_adapter
+    if _http_session is not None:
+        _http_session.close()
+        _http_session = None
+        _http_adapter = None
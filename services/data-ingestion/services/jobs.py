@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class Job:
+    """Progreso de un trabajo en segundo plano (thread-safe)"""
+
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self._lock = threading.Lock()
+        self._started = None
+        self._state = {
+            'job_id': self.id,
+            'kind': kind,
+            'status': 'queued',
+            'total': None,
+            'processed': 0,
+            'success': 0,
+            'errors': 0,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+
+    def start(self, total: int):
+        with self._lock:
+            self._started = time.monotonic()
+            self._state.update({'status': 'running', 'total': total, 'started_at': datetime.now().isoformat()})
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._state['processed'] += 1
+            self._state['success' if ok else 'errors'] += 1
+
+    def finish(self, result: Optional[Dict] = None, error: Optional[str] = None):
+        with self._lock:
+            self._state.update({
+                'status': 'failed' if error else 'completed',
+                'finished_at': datetime.now().isoformat(),
+                'result': result,
+                'error': error
+            })
+            # El resumen final manda: incluye escrituras en lote fallidas tras el progreso
+            for field in ('success', 'errors'):
+                if result and field in result:
+                    self._state[field] = result[field]
+            if self._started is None:
+                self._started = time.monotonic()
+            self._state['elapsed_seconds'] = round(time.monotonic() - self._started, 3)
+
+    @property
+    def active(self) -> bool:
+        with self._lock:
+            return self._state['status'] in ACTIVE_STATUSES
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            state = dict(self._state)
+            started = self._started
+        if state['status'] == 'running' and started is not None:
+            elapsed = time.monotonic() - started
+            total = state['total'] or 0
+            rate = state['processed'] / elapsed if elapsed > 0 else 0.0
+            remaining = max(total - state['processed'], 0)
+            state.update({
+                'elapsed_seconds': round(elapsed, 3),
+                'products_per_second': round(rate, 3),
+                'progress': round(state['processed'] / total, 4) if total else 0.0,
+                # Sin ritmo medido todavía no hay estimación
+                'eta_seconds': round(remaining / rate, 1) if rate > 0 else None
+            })
+        elif state['status'] == 'completed':
+            state['progress'] = 1.0
+        return state
+
+
+class JobManager:
+    """Trabajos en segundo plano con deduplicación por clave
+
+    Una petición con la misma clave que un trabajo en cola o en curso se
+    pliega en él en lugar de lanzar otro. Se conservan los últimos
+    `history_size` trabajos para consultar su estado.
+    """
+
+    def __init__(self, history_size: int = 50):
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._active_by_key: Dict[str, Job] = {}
+
+    def submit(self, kind: str, key: str, target: Callable[[Job], Optional[Dict]]) -> Tuple[Job, bool]:
+        """Lanzar `target(job)` en un hilo. Devuelve (trabajo, True si es nuevo)"""
+        with self._lock:
+            existing = self._active_by_key.get(key)
+            if existing is not None and existing.active:
+                return existing, False
+
+            job = Job(kind, key)
+            self._active_by_key[key] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history_size:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.active:
+                    break
+                del self._jobs[oldest_id]
+
+        threading.Thread(target=self._run, args=(job, target), name=f'job-{kind}', daemon=True).start()
+        logger.info("🚀 Trabajo %s %s lanzado", kind, job.id)
+        return job, True
+
+    def _run(self, job: Job, target: Callable[[Job], Optional[Dict]]):
+        try:
+            job.finish(result=target(job))
+        except Exception as e:
+            logger.exception("❌ Trabajo %s %s fallido", job.kind, job.id)
+            job.finish(error=str(e))
+        finally:
+            with self._lock:
+                if self._active_by_key.get(job.key) is job:
+                    del self._active_by_key[job.key]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self, kind: Optional[str] = None, limit: int = 20):
+        with self._lock:
+            jobs = [job for job in reversed(self._jobs.values()) if kind is None or job.kind == kind]
+        return [job.snapshot() for job in jobs[:limit]]
@@ -0,0 +1,206 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+
+# ===================================
+# MÉTRICAS DE INGESTA
+# ===================================
+
+# Etapas: rate_limit_wait, fetch, parse, mongo_write, mongo_bulk_write, postgres_query
+STAGE_SECONDS = Histogram(
+    'ingestion_stage_seconds',
+    'Duración de cada etapa de la ingesta',
+    ['stage'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+RAPIDAPI_RESPONSES = Counter(
+    'rapidapi_responses_total',
+    'Respuestas de RapidAPI por código de estado',
+    ['status']
+)
+
+PRODUCTS_REFRESHED = Counter(
+    'ingestion_products_total',
+    'Productos procesados por resultado',
+    ['job', 'outcome']
+)
+
+RUN_SECONDS = Histogram(
+    'ingestion_run_seconds',
+    'Duración de cada ejecución de refresco',
+    ['job'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+PRODUCTS_PER_SECOND = Gauge(
+    'ingestion_products_per_second',
+    'Productos por segundo de la última ejecución',
+    ['job']
+)
+
+LAST_RUN_TIMESTAMP = Gauge(
+    'ingestion_last_run_timestamp_seconds',
+    'Fin de la última ejecución (epoch)',
+    ['job']
+)
+
+RESPONSE_CACHE = Counter(
+    'rapidapi_cache_lookups_total',
+    'Consultas a la caché local de RapidAPI (hit, miss, expired)',
+    ['result']
+)
+
+DETAIL_CACHE = Counter(
+    'detail_cache_lookups_total',
+    'Consultas a la caché en memoria de detalle de producto (hit, miss, expired)',
+    ['namespace', 'result']
+)
+
+ALERTS_TRIGGERED = Counter(
+    'alerts_triggered_total',
+    'Alertas disparadas durante la ingesta',
+    ['alert_type']
+)
+
+# ===================================
+# MÉTRICAS HTTP (FLASK)
+# ===================================
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Latencia de las peticiones por ruta',
+    ['method', 'route', 'status']
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def observe_trace(trace, outcome: str, job: str = 'amazon'):
+    """Volcar los tiempos de un ProductTrace (en ms) a los histogramas de etapa"""
+    for stage, millis in trace.timings.items():
+        observe_stage(stage, millis / 1000)
+    PRODUCTS_REFRESHED.labels(job=job, outcome=outcome).inc()
+
+
+def observe_run(job: str, seconds: float, products: int):
+    RUN_SECONDS.labels(job=job).observe(seconds)
+    PRODUCTS_PER_SECOND.labels(job=job).set(products / seconds if seconds > 0 else 0.0)
+    LAST_RUN_TIMESTAMP.labels(job=job).set_to_current_time()
+
+
+# ===================================
+# SATURACIÓN DE POOLS
+# ===================================
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Cuenta conexiones en uso y esperas fallidas del pool de pymongo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_out = 0
+        self.open = 0
+        self.checkout_failures = 0
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+mongo_pool_listener = MongoPoolListener()
+
+
+class PoolCollector:
+    """Uso de los pools (PostgreSQL, MongoDB, HTTP) leído en cada scrape"""
+
+    def collect(self):
+        # Import diferido: evita ciclos con los módulos que registran métricas
+        from config import config
+        from database.postgres import get_postgres_stats
+        from services.http_client import get_http_stats
+
+        in_use = GaugeMetricFamily('db_pool_in_use', 'Conexiones en uso', labels=['pool'])
+        size = GaugeMetricFamily('db_pool_max_size', 'Tamaño máximo del pool', labels=['pool'])
+        utilization = GaugeMetricFamily('db_pool_utilization', 'Conexiones en uso / tamaño máximo', labels=['pool'])
+        timeouts = GaugeMetricFamily('db_pool_checkout_timeouts', 'Esperas de conexión agotadas', labels=['pool'])
+
+        postgres = get_postgres_stats()
+        pools = [
+            ('postgres', postgres.get('in_use', 0), postgres.get('max', 0), postgres.get('timeouts', 0)),
+            ('mongodb', mongo_pool_listener.checked_out, config.MONGO_MAX_POOL_SIZE,
+             mongo_pool_listener.checkout_failures),
+        ]
+        for name, used, maximum, failed in pools:
+            in_use.add_metric([name], used)
+            size.add_metric([name], maximum)
+            utilization.add_metric([name], used / maximum if maximum else 0.0)
+            timeouts.add_metric([name], failed)
+
+        http = get_http_stats()
+        size.add_metric(['http'], http.get('pool_size', 0))
+        yield GaugeMetricFamily(
+            'http_pool_connection_reuse_ratio', 'Peticiones HTTP servidas con conexión reutilizada',
+            value=http.get('connection_reuse_ratio', 0.0)
+        )
+
+        yield in_use
+        yield size
+        yield utilization
+        yield timeouts
+
+
+REGISTRY.register(PoolCollector())
+
+
+def render_metrics():
+    """Cuerpo y content-type de /metrics en formato texto de Prometheus"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
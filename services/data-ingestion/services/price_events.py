@@ -0,0 +1,226 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Cola acotada de un suscriptor con sus filtros"""
+
+    def __init__(self, product_ids: Optional[Set[str]], marketplaces: Optional[Set[str]], max_queue: int):
+        self.product_ids = product_ids or None
+        self.marketplaces = marketplaces or None
+        self.queue: 'queue.Queue[Dict]' = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def matches(self, event: Dict) -> bool:
+        if self.product_ids is not None and event['product_id'] not in self.product_ids:
+            return False
+        if self.marketplaces is not None and event['marketplace'] not in self.marketplaces:
+            return False
+        return True
+
+    def offer(self, event: Dict):
+        with self._lock:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                # Cliente lento: se descarta el evento más antiguo, nunca se bloquea la ingesta
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self.dropped += 1
+                self.queue.put_nowait(event)
+
+    def get(self, timeout: float) -> Optional[Dict]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class PriceEventBus:
+    """Difusión de cambios de precio/stock a muchos suscriptores
+
+    Una sola fuente (las escrituras de la ingesta o el change stream de
+    MongoDB) publica cada cambio una vez; el bus lo reparte a las colas de
+    los suscriptores cuyo filtro coincide. Los últimos `history_size`
+    eventos se conservan para reanudar con Last-Event-ID.
+
+    El último (precio, stock) de cada producto se guarda en un LRU de
+    `max_state` entradas. Un producto sin estado conocido (recién arrancado
+    o expulsado del LRU) no publica en su primera observación: solo se
+    registra, para no emitir un falso cambio por cada producto.
+    """
+
+    def __init__(self, history_size: int = 1000, max_queue: int = 500, max_state: int = 100000):
+        self.max_queue = max_queue
+        self.max_state = max_state
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history: deque = deque(maxlen=history_size)
+        self._subscribers: List[Subscription] = []
+        self._state: 'OrderedDict[Tuple[str, str], Tuple]' = OrderedDict()
+        self._published = 0
+        self._first_seen = 0
+
+    # ===================================
+    # PUBLICACIÓN
+    # ===================================
+
+    def prime(self, marketplace: str, states: Dict[str, Tuple]):
+        """Estado conocido (precio, stock) para no emitir eventos falsos tras arrancar"""
+        with self._lock:
+            for product_id, state in states.items():
+                self._state.setdefault((marketplace, product_id), state)
+            self._trim()
+
+    def _trim(self):
+        while len(self._state) > self.max_state:
+            self._state.popitem(last=False)
+
+    def known(self, marketplace: str, product_ids: Iterable[str]) -> Set[str]:
+        with self._lock:
+            return {product_id for product_id in product_ids if (marketplace, product_id) in self._state}
+
+    def observe(self, marketplace: str, product_id: str, price, stock_status, **fields) -> Optional[Dict]:
+        """Publicar solo si el precio o el stock cambian respecto al último valor visto"""
+        key = (marketplace, product_id)
+        new = (price, stock_status)
+        with self._lock:
+            old = self._state.pop(key, None)
+            self._state[key] = new
+            if old is None:
+                self._first_seen += 1
+                self._trim()
+        if old is None or old == new:
+            return None
+        old_price, old_stock = old
+        return self.publish({
+            'type': 'price_change' if old_price != price else 'stock_change',
+            'product_id': product_id,
+            'marketplace': marketplace,
+            'price': price,
+            'previous_price': old_price,
+            'stock_status': stock_status,
+            'previous_stock_status': old_stock,
+            **fields
+        })
+
+    def publish(self, event: Dict) -> Dict:
+        with self._lock:
+            event = {'id': next(self._ids), 'timestamp': datetime.now().isoformat(), **event}
+            self._history.append(event)
+            self._published += 1
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.matches(event):
+                subscription.offer(event)
+        return event
+
+    # ===================================
+    # SUSCRIPCIÓN
+    # ===================================
+
+    def subscribe(self, product_ids: Optional[Set[str]] = None,
+                  marketplaces: Optional[Set[str]] = None) -> Subscription:
+        subscription = Subscription(product_ids, marketplaces, self.max_queue)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def since(self, last_id: int, subscription: Subscription) -> List[Dict]:
+        """Eventos posteriores a `last_id` que aún están en el histórico"""
+        with self._lock:
+            history = list(self._history)
+        return [event for event in history if event['id'] > last_id and subscription.matches(event)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self._published,
+                'last_event_id': self._history[-1]['id'] if self._history else 0,
+                'tracked_products': len(self._state),
+                'max_tracked_products': self.max_state,
+                'first_seen_unpublished': self._first_seen,
+                'dropped': sum(subscription.dropped for subscription in self._subscribers)
+            }
+
+
+def format_sse(event: Dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+# ===================================
+# FUENTE: CHANGE STREAM DE MONGODB
+# ===================================
+
+def watch_product_changes(db, bus: PriceEventBus, stop: threading.Event):
+    """Publicar los cambios de `products` vistos por el change stream
+
+    Necesita replica set. Sirve de fuente única cuando varias réplicas
+    escriben: cada proceso ve todos los cambios, no solo los suyos.
+    """
+    pipeline = [{'$match': {
+        'operationType': {'$in': ['insert', 'update', 'replace']},
+        '$or': [
+            {'operationType': {'$ne': 'update'}},
+            {'updateDescription.updatedFields.current_price': {'$exists': True}},
+            {'updateDescription.updatedFields.stock_status': {'$exists': True}},
+        ]
+    }}]
+    resume_token = None
+    while not stop.is_set():
+        try:
+            with db.products.watch(pipeline, full_document='updateLookup',
+                                   resume_after=resume_token, max_await_time_ms=1000) as stream:
+                while not stop.is_set():
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    resume_token = stream.resume_token
+                    document = change.get('fullDocument') or {}
+                    if document.get('external_id'):
+                        bus.observe(
+                            document.get('marketplace', 'amazon'), document['external_id'],
+                            document.get('current_price'), document.get('stock_status'),
+                            title=document.get('title'), currency=document.get('currency')
+                        )
+        except Exception as e:
+            logger.error("❌ Change stream de products interrumpido: %s", e)
+            stop.wait(5)
+
+
+# ===================================
+# BUS COMPARTIDO
+# ===================================
+
+_price_events = None
+_price_events_lock = threading.Lock()
+
+
+def get_price_events() -> PriceEventBus:
+    global _price_events
+    if _price_events is None:
+        with _price_events_lock:
+            if _price_events is None:
+                _price_events = PriceEventBus(
+                    config.EVENTS_HISTORY_SIZE, config.EVENTS_SUBSCRIBER_QUEUE, config.EVENTS_STATE_MAX_PRODUCTS
+                )
+    return _price_events
@@ -1,8 +1,10 @@
 import random
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
 import hashlib
 
+import numpy as np
+
 class PriceGenerator:
     STORES = [
         {"storeId": "amazon-es", "name": "Amazon España", "priceVariation": 0.95, "stockProbability": 0.95, "deliveryDays": (1, 3)},
@@ -59,6 +61,125 @@ class PriceGenerator:
         prices.sort(key=lambda x: x["price"] if x["inStock"] else float('inf'))
         return prices
     
+    # ===================================
+    # GENERACIÓN VECTORIZADA (PRODUCTO × TIENDA)
+    # ===================================
+    
+    def _random_factor_matrix(self, product_names: Sequence[str], store_ids: Sequence[str]) -> np.ndarray:
+        """Factores deterministas de toda la matriz, equivalentes a _get_deterministic_random"""
+        digests = b"".join(
+            hashlib.md5(f"{name}-{store_id}-{self.seed_base}".encode()).digest()
+            for name in product_names
+            for store_id in store_ids
+        )
+        # MD5 de 128 bits como dos uint64 big-endian: (hi * 2^64 + lo) % 100
+        halves = np.frombuffer(digests, dtype=">u8").reshape(-1, 2)
+        codes = ((halves[:, 0] % 100) * (2 ** 64 % 100) + halves[:, 1] % 100) % 100
+        return (codes / 100.0).reshape(len(product_names), len(store_ids))
+    
+    @staticmethod
+    def _round_like_python(values: np.ndarray, ndigits: int) -> np.ndarray:
+        """Redondeo vectorizado idéntico a round() de Python
+        
+        rint(x * 10^n) / 10^n coincide con round(x, n) salvo cuando x * 10^n
+        está prácticamente en .5 (el error de la multiplicación puede cambiar
+        el sentido del redondeo); esos casos se resuelven con round().
+        """
+        scale = 10.0 ** ndigits
+        scaled = values * scale
+        rounded = np.rint(scaled) / scale
+        ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        if ambiguous.any():
+            rounded[ambiguous] = [round(value, ndigits) for value in values[ambiguous].tolist()]
+        return rounded
+    
+    def generate_price_matrix(self, product_names: Sequence[str], base_prices: Sequence[float],
+                              stores: Optional[List[Dict]] = None) -> Dict[str, np.ndarray]:
+        """Calcular con NumPy todos los campos numéricos de la matriz producto × tienda"""
+        stores = stores if stores is not None else self.STORES
+        base = np.asarray(base_prices, dtype=np.float64)
+        random_factor = self._random_factor_matrix(product_names, [store["storeId"] for store in stores])
+        
+        variation = np.array([store["priceVariation"] for store in stores], dtype=np.float64)
+        stock_probability = np.array([store["stockProbability"] for store in stores], dtype=np.float64)
+        delivery_min = np.array([store["deliveryDays"][0] for store in stores], dtype=np.int64)
+        delivery_max = np.array([store["deliveryDays"][1] for store in stores], dtype=np.int64)
+        
+        price = base[:, None] * variation[None, :]
+        price_variation = price * (random_factor * 0.06 - 0.03)
+        final_price = self._round_like_python(price + price_variation, 2)
+        has_stock = random_factor < stock_probability[None, :]
+        has_discount = random_factor > 0.7
+        
+        return {
+            "random_factor": random_factor,
+            "price": final_price,
+            "previous_price": self._round_like_python(final_price * 1.15, 2),
+            "in_stock": has_stock,
+            "stock_quantity": np.where(has_stock, (random_factor * 50).astype(np.int64) + 10, 0),
+            "delivery_days": delivery_min[None, :] + (random_factor * (delivery_max - delivery_min)[None, :]).astype(np.int64),
+            "rating": self._round_like_python(4.0 + random_factor * 1.0, 1),
+            "has_discount": has_discount,
+            "review_count": (random_factor * 500).astype(np.int64) + 50
+        }
+    
+    def generate_prices_batch(self, product_names: Sequence[str], base_prices: Sequence[float],
+                              categories: Optional[Sequence[str]] = None) -> List[List[Dict]]:
+        """Versión por lotes de generate_prices_for_product (mismo resultado por producto)"""
+        if categories is None:
+            categories = ["shoes"] * len(product_names)
+        
+        # Agrupar productos por conjunto de tiendas según su categoría
+        groups: Dict[tuple, List[int]] = {}
+        group_stores: Dict[tuple, List[Dict]] = {}
+        for index, category in enumerate(categories):
+            stores = self._filter_stores_by_category(category)
+            key = tuple(store["storeId"] for store in stores)
+            groups.setdefault(key, []).append(index)
+            group_stores[key] = stores
+        
+        results: List[Optional[List[Dict]]] = [None] * len(product_names)
+        last_updated = datetime.now().isoformat()
+        
+        for key, indices in groups.items():
+            stores = group_stores[key]
+            names = [product_names[i] for i in indices]
+            matrix = self.generate_price_matrix(names, [base_prices[i] for i in indices], stores)
+            
+            prices = matrix["price"].tolist()
+            previous_prices = matrix["previous_price"].tolist()
+            in_stock = matrix["in_stock"].tolist()
+            stock_quantity = matrix["stock_quantity"].tolist()
+            delivery_days = matrix["delivery_days"].tolist()
+            rating = matrix["rating"].tolist()
+            has_discount = matrix["has_discount"].tolist()
+            review_count = matrix["review_count"].tolist()
+            
+            for row, product_index in enumerate(indices):
+                slug = names[row].lower().replace(' ', '-')
+                product_prices = []
+                for col, store in enumerate(stores):
+                    discount = has_discount[row][col]
+                    product_prices.append({
+                        "storeId": store["storeId"],
+                        "storeName": store["name"],
+                        "price": prices[row][col],
+                        "previousPrice": previous_prices[row][col] if discount else None,
+                        "discountPercentage": 13 if discount else 0,
+                        "currency": "EUR",
+                        "inStock": in_stock[row][col],
+                        "stockQuantity": stock_quantity[row][col],
+                        "deliveryDays": delivery_days[row][col],
+                        "rating": rating[row][col],
+                        "reviewCount": review_count[row][col],
+                        "lastUpdated": last_updated,
+                        "url": f"https://{store['storeId']}.com/product/{slug}"
+                    })
+                product_prices.sort(key=lambda x: x["price"] if x["inStock"] else float('inf'))
+                results[product_index] = product_prices
+        
+        return results
+    
     def _filter_stores_by_category(self, category: str) -> List[Dict]:
         if category.lower() in ["shoes", "sneakers", "deportivos"]:
             return self.STORES
@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from config import config
+
+
+class TokenBucket:
+    """Limitador token-bucket thread-safe con ajuste adaptativo ante 429 (AIMD)"""
+
+    def __init__(self, rate: float, burst: int, min_rate: Optional[float] = None,
+                 decrease_factor: float = 0.5, increase_step: Optional[float] = None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate else max(self.max_rate * 0.05, 0.1)
+        self.capacity = max(int(burst), 1)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step if increase_step else self.max_rate * 0.05
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._acquired = 0
+        self._throttled = 0
+        self._waited = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Bloquea hasta obtener un token. Devuelve False si se agota el timeout"""
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    self._acquired += 1
+                    self._waited += now - start
+                    return True
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """La API ha respondido 429: reducir la tasa y pausar a todos los workers"""
+        with self._lock:
+            now = time.monotonic()
+            self._throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._tokens = 0.0
+            self._updated = now
+            pause = retry_after if retry_after else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+
+    def on_success(self):
+        """Recuperar la tasa poco a poco tras respuestas correctas"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "burst": self.capacity,
+                "acquired": self._acquired,
+                "throttled": self._throttled,
+                "avg_wait_seconds": round(self._waited / self._acquired, 4) if self._acquired else 0.0
+            }
+
+
+# ===================================
+# LIMITADOR COMPARTIDO PARA RAPIDAPI
+# ===================================
+
+_rapidapi_limiter = None
+_rapidapi_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucket:
+    global _rapidapi_limiter
+    if _rapidapi_limiter is None:
+        with _rapidapi_limiter_lock:
+            if _rapidapi_limiter is None:
+                _rapidapi_limiter = TokenBucket(config.RAPIDAPI_RATE_LIMIT, config.RAPIDAPI_BURST)
+    return _rapidapi_limiter
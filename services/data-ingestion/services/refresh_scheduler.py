@@ -0,0 +1,238 @@
+import heapq
+import itertools
+import logging
+import math
+import statistics
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from scrapers.amazon_parser import DEFAULT_COUNTRY
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshPolicy:
+    """Intervalo de refresco por producto a partir de sus señales
+
+    intervalo = base / (1 + w_cambios * cambios_por_día
+                          + w_seguidores * log(1 + seguidores)
+                          + w_alertas * alertas_activas)
+
+    acotado a [min_interval, max_interval]. Un producto sin cambios, sin
+    seguidores y sin alertas se refresca cada `base_interval`.
+    """
+
+    def __init__(self, base_interval: float, min_interval: float, max_interval: float,
+                 volatility_weight: float = 1.0, follower_weight: float = 0.5, alert_weight: float = 1.0):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.volatility_weight = volatility_weight
+        self.follower_weight = follower_weight
+        self.alert_weight = alert_weight
+
+    def interval(self, changes_per_day: float = 0.0, followers: int = 0, alerts: int = 0) -> float:
+        score = (
+            1
+            + self.volatility_weight * changes_per_day
+            + self.follower_weight * math.log1p(followers)
+            + self.alert_weight * alerts
+        )
+        return min(self.max_interval, max(self.min_interval, self.base_interval / score))
+
+
+class RefreshScheduler:
+    """Cola de prioridad (heap por fecha de vencimiento) de productos a refrescar
+
+    Las entradas obsoletas del heap no se borran: cada producto guarda su
+    versión vigente y las entradas con otra versión se descartan al extraer.
+    """
+
+    def __init__(self, policy: RefreshPolicy):
+        self.policy = policy
+        self._heap = []
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._entries: Dict[str, Dict] = {}
+
+    # ===================================
+    # CONSTRUCCIÓN
+    # ===================================
+
+    def rebuild(self, products: Iterable[str], last_refreshed: Dict[str, datetime],
+                signals: Dict[str, Dict], now: Optional[datetime] = None):
+        """Recalcular intervalos y reconstruir la cola con el conjunto actual de productos"""
+        now = now or datetime.now()
+        entries = {}
+        heap = []
+        for external_id in products:
+            product_signals = signals.get(external_id, {})
+            interval = self.policy.interval(
+                product_signals.get('changes_per_day', 0.0),
+                product_signals.get('followers', 0),
+                product_signals.get('alerts', 0)
+            )
+            refreshed_at = last_refreshed.get(external_id)
+            # Nunca refrescado: vence ya
+            due_at = refreshed_at + timedelta(seconds=interval) if refreshed_at else now
+            version = next(self._counter)
+            entries[external_id] = {
+                'interval': interval,
+                'due_at': due_at,
+                'last_refreshed': refreshed_at,
+                'version': version,
+                'watched': bool(product_signals.get('followers') or product_signals.get('alerts')),
+                **{key: product_signals.get(key, 0) for key in ('changes_per_day', 'followers', 'alerts')}
+            }
+            heap.append((due_at, version, external_id))
+        heapq.heapify(heap)
+
+        with self._lock:
+            self._entries = entries
+            self._heap = heap
+        logger.info("📅 Cola de refresco reconstruida: %s productos", len(entries))
+
+    # ===================================
+    # EXTRACCIÓN Y REPROGRAMACIÓN
+    # ===================================
+
+    def pop_due(self, limit: int, now: Optional[datetime] = None) -> List[str]:
+        """Productos vencidos, del más atrasado al menos, hasta `limit`"""
+        now = now or datetime.now()
+        due = []
+        with self._lock:
+            while self._heap and len(due) < limit:
+                due_at, version, external_id = self._heap[0]
+                entry = self._entries.get(external_id)
+                if entry is None or entry['version'] != version:
+                    heapq.heappop(self._heap)
+                    continue
+                if due_at > now:
+                    break
+                heapq.heappop(self._heap)
+                # En vuelo: sin entrada en el heap hasta que se reprograme
+                entry['version'] = None
+                due.append(external_id)
+        return due
+
+    def reschedule(self, external_id: str, success: bool, now: Optional[datetime] = None):
+        """Programar el siguiente refresco; los fallos se reintentan tras el intervalo mínimo"""
+        now = now or datetime.now()
+        with self._lock:
+            entry = self._entries.get(external_id)
+            if entry is None:
+                return
+            if success:
+                entry['last_refreshed'] = now
+                delay = entry['interval']
+            else:
+                delay = self.policy.min_interval
+            entry['due_at'] = now + timedelta(seconds=delay)
+            entry['version'] = next(self._counter)
+            heapq.heappush(self._heap, (entry['due_at'], entry['version'], external_id))
+
+    def drop_refreshed_elsewhere(self, external_ids: List[str], last_refreshed: Dict[str, datetime],
+                                 now: Optional[datetime] = None) -> List[str]:
+        """Reprogramar los productos que otra réplica ya refrescó y devolver los que siguen vencidos"""
+        now = now or datetime.now()
+        pending = []
+        for external_id in external_ids:
+            with self._lock:
+                entry = self._entries.get(external_id)
+                known = entry['last_refreshed'] if entry else None
+                interval = entry['interval'] if entry else 0
+            refreshed_at = last_refreshed.get(external_id)
+            if (entry is not None and refreshed_at and (known is None or refreshed_at > known)
+                    and refreshed_at + timedelta(seconds=interval) > now):
+                self.reschedule(external_id, True, now=refreshed_at)
+            else:
+                pending.append(external_id)
+        return pending
+
+    # ===================================
+    # ESTADO
+    # ===================================
+
+    def stats(self, now: Optional[datetime] = None, upcoming: int = 10) -> Dict:
+        now = now or datetime.now()
+        with self._lock:
+            entries = list(self._entries.items())
+
+        def staleness(entry):
+            if entry['last_refreshed'] is None:
+                return None
+            return (now - entry['last_refreshed']).total_seconds()
+
+        watched = [s for s in (staleness(e) for _, e in entries if e['watched']) if s is not None]
+        everything = [s for s in (staleness(e) for _, e in entries) if s is not None]
+        scheduled = sorted(
+            (entry['due_at'], external_id, entry) for external_id, entry in entries if entry['version'] is not None
+        )
+        return {
+            'products': len(entries),
+            'due_now': sum(1 for due_at, _, _ in scheduled if due_at <= now),
+            'in_flight': sum(1 for _, entry in entries if entry['version'] is None),
+            'watched': sum(1 for _, entry in entries if entry['watched']),
+            'median_staleness_seconds': round(statistics.median(everything), 1) if everything else None,
+            'median_watched_staleness_seconds': round(statistics.median(watched), 1) if watched else None,
+            'upcoming': [
+                {
+                    'external_id': external_id,
+                    'due_at': due_at.isoformat(),
+                    'interval_seconds': round(entry['interval'], 1),
+                    'changes_per_day': round(entry['changes_per_day'], 3),
+                    'followers': entry['followers'],
+                    'alerts': entry['alerts']
+                }
+                for due_at, external_id, entry in scheduled[:upcoming]
+            ]
+        }
+
+
+# ===================================
+# SEÑALES
+# ===================================
+
+def load_price_volatility(history_store, since: datetime) -> Dict[str, float]:
+    """Cambios de precio por día de cada producto desde `since`
+
+    El recuento se hace con una agregación en MongoDB: solo viaja un número
+    por producto con cambios (los que no aparecen tienen volatilidad 0).
+    """
+    days = max((datetime.now() - since).total_seconds() / 86400, 1 / 24)
+    # Solo la serie del país por defecto: es la que refresca la ingesta
+    changes = history_store.price_changes(since, DEFAULT_COUNTRY)
+    return {product_id: count / days for product_id, count in changes.items()}
+
+
+def load_engagement(postgres_pool) -> Dict[str, Dict[str, int]]:
+    """Seguidores (user_products) y alertas activas (alerts) por producto"""
+    engagement: Dict[str, Dict[str, int]] = {}
+    with postgres_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT product_external_id, COUNT(*)
+                FROM user_products
+                GROUP BY product_external_id
+            """)
+            for external_id, followers in cursor.fetchall():
+                engagement.setdefault(external_id, {})['followers'] = followers
+
+            cursor.execute("""
+                SELECT product_external_id, COUNT(*)
+                FROM alerts
+                WHERE is_active = true
+                GROUP BY product_external_id
+            """)
+            for external_id, alerts in cursor.fetchall():
+                engagement.setdefault(external_id, {})['alerts'] = alerts
+    return engagement
+
+
+def load_last_refreshed(db, external_ids: List[str]) -> Dict[str, datetime]:
+    cursor = db.products.find(
+        {'external_id': {'$in': external_ids}},
+        {'external_id': 1, 'last_updated': 1, '_id': 0}
+    )
+    return {doc['external_id']: doc['last_updated'] for doc in cursor if doc.get('last_updated')}
@@ -0,0 +1,216 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from config import config
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    asin TEXT NOT NULL,
+    country TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (asin, country)
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access);
+"""
+
+
+class ResponseCache:
+    """Caché local (SQLite) de respuestas crudas de product-details
+
+    Clave (asin, país). Guarda el JSON original comprimido con zlib: un
+    cambio del parser se aplica a lo cacheado sin volver a pagar la
+    llamada. Las entradas caducan a los `ttl` segundos y, por encima de
+    `max_entries`, se expulsan las de acceso más antiguo (LRU).
+    """
+
+    def __init__(self, path: str, ttl: float = 600, max_entries: int = 50000, evict_every: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Una conexión compartida: SQLite serializa las escrituras de todas formas
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._counts = {'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0, 'evictions': 0,
+                        'bytes_raw': 0, 'bytes_stored': 0}
+
+    # ===================================
+    # LECTURA / ESCRITURA
+    # ===================================
+
+    def get(self, asin: str, country: str) -> Optional[Tuple[Dict, float]]:
+        """(payload, fetched_at) cacheado y vigente, o None
+
+        `fetched_at` (epoch) es el momento de la llamada original: lo cacheado
+        es una observación antigua, no una nueva.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT fetched_at, payload FROM responses WHERE asin = ? AND country = ?', (asin, country)
+            ).fetchone()
+            if row is None:
+                self._counts['misses'] += 1
+                outcome = 'miss'
+            elif now - row[0] > self.ttl:
+                self._counts['expired'] += 1
+                self._counts['misses'] += 1
+                outcome = 'expired'
+            else:
+                self._conn.execute(
+                    'UPDATE responses SET last_access = ? WHERE asin = ? AND country = ?', (now, asin, country)
+                )
+                self._counts['hits'] += 1
+                outcome = 'hit'
+        metrics.RESPONSE_CACHE.labels(result=outcome).inc()
+        if outcome != 'hit':
+            return None
+        return json.loads(zlib.decompress(row[1])), row[0]
+
+    def put(self, asin: str, country: str, raw: bytes):
+        """Guardar el cuerpo de una respuesta 200 tal cual llegó"""
+        payload = zlib.compress(raw, 6)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (asin, country, fetched_at, last_access, size, payload) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (asin, country, now, now, len(payload), payload)
+            )
+            self._counts['stores'] += 1
+            self._counts['bytes_raw'] += len(raw)
+            self._counts['bytes_stored'] += len(payload)
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.evict_every:
+                self._puts_since_evict = 0
+                self._evict()
+
+    def _evict(self):
+        """Borrar lo caducado y, si sigue sobrando, lo menos usado recientemente"""
+        cursor = self._conn.execute('DELETE FROM responses WHERE fetched_at < ?', (time.time() - self.ttl,))
+        evicted = cursor.rowcount
+        count = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        if count > self.max_entries:
+            cursor = self._conn.execute(
+                'DELETE FROM responses WHERE rowid IN '
+                '(SELECT rowid FROM responses ORDER BY last_access LIMIT ?)',
+                (count - self.max_entries,)
+            )
+            evicted += cursor.rowcount
+        self._counts['evictions'] += evicted
+
+    def payloads(self, include_expired: bool = True) -> Iterator[Tuple[str, str, Dict]]:
+        """(asin, país, payload) de todo lo cacheado, para re-parsear sin llamar a la API"""
+        # Conexión propia de solo lectura: se recorre el cursor sin cargar la tabla
+        # entera ni bloquear la conexión compartida (WAL admite lectores concurrentes)
+        conn = sqlite3.connect(self.path)
+        try:
+            now = time.time()
+            for asin, country, fetched_at, payload in conn.execute(
+                    'SELECT asin, country, fetched_at, payload FROM responses'):
+                if include_expired or now - fetched_at <= self.ttl:
+                    yield asin, country, json.loads(zlib.decompress(payload))
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['misses']
+        return {
+            'entries': entries,
+            'size_bytes': size,
+            'ttl_seconds': self.ttl,
+            'max_entries': self.max_entries,
+            'hits': counts['hits'],
+            'misses': counts['misses'],
+            'expired': counts['expired'],
+            'hit_ratio': round(counts['hits'] / lookups, 4) if lookups else 0.0,
+            # Cada acierto es una llamada de pago a RapidAPI que no se hace
+            'quota_saved': counts['hits'],
+            'evictions': counts['evictions'],
+            'compression_ratio': round(counts['bytes_stored'] / counts['bytes_raw'], 3) if counts['bytes_raw'] else None
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ===================================
+# CACHÉ COMPARTIDA
+# ===================================
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Caché de RapidAPI del proceso, o None si está desactivada"""
+    global _response_cache
+    if not config.RAPIDAPI_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    config.RAPIDAPI_CACHE_PATH,
+                    ttl=config.RAPIDAPI_CACHE_TTL,
+                    max_entries=config.RAPIDAPI_CACHE_MAX_ENTRIES
+                )
+    return _response_cache
+
+
+if __name__ == '__main__':
+    from scrapers import amazon_parser
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Caché local de respuestas de RapidAPI')
+    parser.add_argument('--reparse', action='store_true',
+                        help='Re-parsear lo cacheado con el parser actual y actualizar products en MongoDB')
+    args = parser.parse_args()
+
+    cache = ResponseCache(config.RAPIDAPI_CACHE_PATH, ttl=config.RAPIDAPI_CACHE_TTL,
+                          max_entries=config.RAPIDAPI_CACHE_MAX_ENTRIES)
+    if args.reparse:
+        from pymongo import UpdateOne
+        from database.mongodb import get_mongodb
+
+        operations = []
+        failed = 0
+        for asin, country, payload in cache.payloads():
+            product = amazon_parser.parse_amazon_data(payload, asin, country)
+            if product is None:
+                failed += 1
+                continue
+            # last_updated es el momento de la llamada original, no el del re-parseo
+            product.pop('last_updated', None)
+            operations.append(UpdateOne({'external_id': asin}, {'$set': product}, upsert=True))
+        if operations:
+            get_mongodb().products.bulk_write(operations, ordered=False)
+        logger.info("♻️ %s productos re-parseados desde la caché (%s fallidos)", len(operations), failed)
+    print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,80 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Tuple
+
+
+class StatsCache:
+    """Caché con TTL para /stats que las escrituras de ingesta mantienen al día
+
+    Entre recálculos los contadores se ajustan de forma incremental, así el
+    dashboard puede consultar /stats sin lanzar count_documents ni distinct.
+    Un resultado exacto sirve también para peticiones aproximadas, pero no al
+    revés.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._stats = None
+        self._approximate = False
+        self._computed_at = 0.0
+        self._generated_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _fresh(self, approximate: bool) -> bool:
+        if self._stats is None or time.monotonic() - self._computed_at >= self.ttl:
+            return False
+        return approximate or not self._approximate
+
+    def _snapshot(self, cached: bool) -> Tuple[Dict, Dict]:
+        stats = {k: (list(v) if isinstance(v, list) else v) for k, v in self._stats.items()}
+        meta = {
+            "cached": cached,
+            "approximate": self._approximate,
+            "generated_at": self._generated_at.isoformat(),
+            "age_seconds": round(time.monotonic() - self._computed_at, 3)
+        }
+        return stats, meta
+
+    def get(self, loader: Callable[[bool], Dict], approximate: bool = False) -> Tuple[Dict, Dict]:
+        with self._lock:
+            if self._fresh(approximate):
+                return self._snapshot(cached=True)
+
+        # Un único recálculo a la vez; el resto espera y reutiliza el resultado
+        with self._refresh_lock:
+            with self._lock:
+                if self._fresh(approximate):
+                    return self._snapshot(cached=True)
+
+            stats = loader(approximate)
+
+            with self._lock:
+                self._stats = stats
+                self._approximate = approximate
+                self._computed_at = time.monotonic()
+                self._generated_at = datetime.now()
+                return self._snapshot(cached=False)
+
+    # ===================================
+    # ACTUALIZACIONES INCREMENTALES
+    # ===================================
+
+    def increment(self, field: str, amount: int = 1):
+        if not amount:
+            return
+        with self._lock:
+            if self._stats is not None and field in self._stats:
+                self._stats[field] += amount
+
+    def add_value(self, field: str, value):
+        if value is None:
+            return
+        with self._lock:
+            if self._stats is not None and value not in self._stats.get(field, []):
+                self._stats[field].append(value)
+
+    def invalidate(self):
+        with self._lock:
+            self._stats = None
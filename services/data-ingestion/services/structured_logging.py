@@ -0,0 +1,146 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config import config
+
+TEXT_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+JSON_FORMAT = '%(asctime)s %(levelname)s %(name)s %(threadName)s %(message)s'
+
+_listener: Optional[QueueListener] = None
+
+
+class SuccessSampler(logging.Filter):
+    """Deja pasar solo una fracción de los registros marcados con sample=True
+
+    Los avisos y errores nunca se marcan, así que siempre se emiten.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # El marcador solo sirve para decidir: no debe salir en los registros JSON
+        if not record.__dict__.pop('sample', False):
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler que no formatea en el hilo que loguea
+
+    QueueHandler.prepare() aplica msg % args y el traceback antes de encolar;
+    aquí el registro se encola tal cual y el formateo lo hace el hilo del
+    QueueListener. Los args deben ser valores inmutables (ids, números...).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _build_formatter(fmt: str) -> logging.Formatter:
+    if fmt == 'json':
+        from pythonjsonlogger import jsonlogger
+        return jsonlogger.JsonFormatter(
+            JSON_FORMAT,
+            rename_fields={'levelname': 'level', 'asctime': 'time', 'threadName': 'thread'},
+            json_ensure_ascii=False
+        )
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def configure_logging(fmt: Optional[str] = None, level: Optional[str] = None,
+                      sample_rate: Optional[float] = None, use_queue: Optional[bool] = None):
+    """Configurar el logging raíz del servicio (texto o JSON, opcionalmente asíncrono)"""
+    global _listener
+    fmt = fmt or config.LOG_FORMAT
+    level = level or config.LOG_LEVEL
+    sample_rate = config.LOG_SUCCESS_SAMPLE_RATE if sample_rate is None else sample_rate
+    use_queue = config.LOG_ASYNC if use_queue is None else use_queue
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(_build_formatter(fmt))
+    sampler = SuccessSampler(sample_rate)
+
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        # El muestreo se aplica antes de encolar: lo descartado no cuesta nada
+        queue_handler.addFilter(sampler)
+        root.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        output.addFilter(sampler)
+        root.addHandler(output)
+
+
+def stop_logging():
+    """Vaciar la cola y parar el hilo de escritura de logs"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+class ProductTrace:
+    """Tiempos y resultado del refresco de un producto, emitidos en un único registro"""
+
+    __slots__ = ('external_id', 'started', 'timings', 'fields')
+
+    def __init__(self, external_id: str):
+        self.external_id = external_id
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.fields: Dict = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Acumulado: los reintentos suman en la misma etapa
+            self.timings[name] = self.timings.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def absorb(self, child: 'ProductTrace', label: str):
+        """Sumar los tiempos de una sub-consulta (p. ej. un país) y guardar sus campos bajo `label`"""
+        self.started = min(self.started, child.started)
+        for name, value in child.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + value
+        self.fields.setdefault('countries', {})[label] = dict(child.fields)
+
+    def emit(self, logger: logging.Logger, outcome: str = 'ok'):
+        duration_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        extra = {
+            'event': 'product_refresh',
+            'external_id': self.external_id,
+            'outcome': outcome,
+            'duration_ms': duration_ms,
+            'timings_ms': {name: round(value, 2) for name, value in self.timings.items()},
+        }
+        extra.update(self.fields)
+        if outcome == 'ok':
+            extra['sample'] = True
+            logger.info("✅ Producto %s actualizado en %.1f ms", self.external_id, duration_ms, extra=extra)
+        else:
+            logger.warning("❌ Producto %s no actualizado (%s)", self.external_id, outcome, extra=extra)
@@ -0,0 +1,95 @@
+"""Corpus de formatos de precio/rating/reviews/stock del parser de Amazon
+
+Uso: python -m pytest tests/ (desde services/data-ingestion)
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from scrapers.amazon_parser import api_country, parse_in_stock, parse_price, parse_rating, parse_review_count
+
+# (texto, país, esperado)
+PRICE_CORPUS = [
+    ("59,99 €", 'ES', 59.99),
+    ("1.234,56 €", 'ES', 1234.56),
+    ("1.234 €", 'ES', 1234.0),
+    ("12.345.678,90 €", 'ES', 12345678.90),
+    ("1 234,56 €", 'FR', 1234.56),
+    ("1\u00a0234,56 €", 'FR', 1234.56),
+    ("1 234,56 €", 'FR', 1234.56),
+    ("€59.99", 'ES', 59.99),
+    ("$1,234.56", 'US', 1234.56),
+    ("$1,234", 'US', 1234.0),
+    ("$1,234,567.89", 'US', 1234567.89),
+    ("£19.99", 'UK', 19.99),
+    ("19.99", 'US', 19.99),
+    ("19,9", 'DE', 19.9),
+    ("EUR 7,50", 'DE', 7.5),
+    ("Desde 24,95 €", 'ES', 24.95),
+    ("MX$1,299.00", 'MX', 1299.0),
+    ("99", 'ES', 99.0),
+    (59.99, 'ES', 59.99),
+    ("", 'ES', None),
+    (None, 'ES', None),
+    ("No disponible", 'ES', None),
+]
+
+RATING_CORPUS = [
+    ("4,5 de 5 estrellas", 4.5),
+    ("4.5 out of 5 stars", 4.5),
+    ("4,7", 4.7),
+    ("5", 5.0),
+    (4.2, 4.2),
+    ("", None),
+    (None, None),
+]
+
+REVIEWS_CORPUS = [
+    ("12.450", 12450),
+    ("12,450", 12450),
+    ("1 234", 1234),
+    ("12450 valoraciones", 12450),
+    (12450, 12450),
+    (None, 0),
+    ("", 0),
+    ("sin valoraciones", 0),
+]
+
+# Reproduce la regla heredada ('stock' en el texto), incluidos sus falsos positivos
+STOCK_CORPUS = [
+    ("En stock", True),
+    ("In Stock", True),
+    ("Sin stock", True),
+    ("Disponible", False),
+    ("Auf Lager", False),
+    ("Currently unavailable.", False),
+    ("", False),
+    (None, False),
+]
+
+
+@pytest.mark.parametrize('value, country, expected', PRICE_CORPUS)
+def test_parse_price(value, country, expected):
+    assert parse_price(value, country) == expected
+
+
+@pytest.mark.parametrize('value, expected', RATING_CORPUS)
+def test_parse_rating(value, expected):
+    assert parse_rating(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', REVIEWS_CORPUS)
+def test_parse_review_count(value, expected):
+    assert parse_review_count(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', STOCK_CORPUS)
+def test_parse_in_stock(value, expected):
+    assert parse_in_stock(value) is expected
+
+
+@pytest.mark.parametrize('country, expected', [('UK', 'GB'), ('uk', 'GB'), ('ES', 'ES'), (None, 'ES')])
+def test_api_country(country, expected):
+    assert api_country(country) == expected